@@ -0,0 +1,204 @@
+"""
+Memory and CPU cost per monitored user for the process and asyncio engines.
+
+Every run starts the recorder in automatic mode against a local mock
+server (no user is live, so only the polling loop is measured) and
+samples the whole process tree after a warm-up period.
+
+Linux only: PSS and CPU time are read from /proc.
+
+Usage:
+    python benchmarks/bench_engine.py --users 10 50 100 200 --duration 30
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    for child_pid in pids:
+        try:
+            for task in Path(f"/proc/{child_pid}/task").iterdir():
+                children = (task / "children").read_text().split()
+                pids.extend(int(c) for c in children)
+        except OSError:
+            continue
+    return pids
+
+
+def _cpu_seconds(pid: int) -> float:
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0.0
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def _pss_kb(pid: int) -> int:
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def measure(engine, users, mock_url, interval, warmup, duration):
+    with tempfile.TemporaryDirectory() as workdir:
+        child = subprocess.Popen(
+            [
+                sys.executable,
+                str(Path(__file__).resolve()),
+                "--child",
+                "--engine",
+                engine,
+                "--users",
+                str(users),
+                "--interval",
+                str(interval),
+                "--mock-url",
+                mock_url,
+            ],
+            cwd=workdir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        try:
+            time.sleep(warmup)
+            pids = _process_tree(child.pid)
+            cpu_start = sum(_cpu_seconds(pid) for pid in pids)
+            time.sleep(duration)
+            pids = _process_tree(child.pid)
+            cpu_end = sum(_cpu_seconds(pid) for pid in pids)
+            pss_kb = sum(_pss_kb(pid) for pid in pids)
+        finally:
+            os.killpg(child.pid, signal.SIGKILL)
+            child.wait()
+
+    return {
+        "engine": engine,
+        "users": users,
+        "processes": len(pids),
+        "pss_mb": round(pss_kb / 1024, 1),
+        "pss_mb_per_user": round(pss_kb / 1024 / users, 2),
+        "cpu_percent": round((cpu_end - cpu_start) / duration * 100, 1),
+        "cpu_ms_per_user_per_s": round(
+            (cpu_end - cpu_start) / duration / users * 1e3, 3
+        ),
+    }
+
+
+def run_child(engine: str, users: int, mock_url: str, interval: float):
+    import multiprocessing
+
+    from mock_server import patch_tiktok_api
+
+    # the patch below must be inherited by the per-user processes
+    multiprocessing.set_start_method("fork")
+    patch_tiktok_api(mock_url)
+
+    import main
+    from utils.enums import Mode
+
+    args = Namespace(
+        url=None,
+        user=[f"bench_user_{i}" for i in range(users)],
+        room_id=None,
+        automatic_interval=interval / 60,
+        dormant_factor=1,
+        followers_page_size=30,
+        followers_full_sync=360,
+        probe_workers=8,
+        watch_url=None,
+        proxy=None,
+        output=None,
+        duration=None,
+        telegram=False,
+        bitrate=None,
+        rate_limit=1000,
+        remux="post",
+        segment_minutes=None,
+        segment_size=None,
+        redundant=False,
+        protocol="flv",
+        hls_workers=4,
+        bandwidth=None,
+        priority=None,
+        convert_workers=1,
+        upload_workers=4,
+        cache_file=None,
+        http_pool_size=10,
+        http2=False,
+        metrics_port=None,
+        control_port=None,
+        cluster=None,
+        cluster_db="cluster.db",
+        worker_name=None,
+        engine=engine,
+    )
+    main.run_recordings(args, Mode.AUTOMATIC, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--engine", nargs="+", default=["process", "asyncio"])
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds")
+    parser.add_argument("--warmup", type=float, default=15.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--json", dest="json_path", help="write results to file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mock-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.engine[0], args.users[0], args.mock_url, args.interval)
+        return
+
+    from mock_server import MockTikTokServer
+
+    server = MockTikTokServer()
+    mock_url = server.start()
+
+    results = []
+    try:
+        for users in args.users:
+            for engine in args.engine:
+                result = measure(
+                    engine,
+                    users,
+                    mock_url,
+                    args.interval,
+                    args.warmup,
+                    args.duration,
+                )
+                results.append(result)
+                print(json.dumps(result), flush=True)
+    finally:
+        server.stop()
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Time, CPU and peak memory of the FLV to MP4 copy: native remuxer vs ffmpeg.
+
+Each conversion runs in its own child process so that its peak RSS can be
+read with wait4(). The native remuxer is run by a fresh Python interpreter;
+"python_baseline" is the same interpreter importing the modules without
+converting anything.
+
+Without input files, a sample H.264/AAC FLV is generated with ffmpeg.
+
+Usage:
+    python benchmarks/bench_remux.py recording_flv.mp4 --runs 3
+    python benchmarks/bench_remux.py --seconds 600
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+NATIVE = """
+import sys
+sys.path.insert(0, {src!r})
+from utils.video_management import VideoManagement
+if {convert}:
+    assert VideoManagement.remux_flv_to_mp4({input!r}, {output!r})
+"""
+
+
+def generate_sample(path: str, seconds: int) -> None:
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+            "-t", str(seconds),
+            "-c:v", "libx264", "-preset", "ultrafast", "-g", "60", "-b:v", "2M",
+            "-c:a", "aac", "-b:a", "128k",
+            "-f", "flv", path,
+        ],
+        check=True,
+    )  # fmt: skip
+
+
+def run(command: list) -> dict:
+    wall_start = time.perf_counter()
+    process = subprocess.Popen(command)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - wall_start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{command[0]} exited with {process.returncode}")
+
+    return {
+        "wall_s": round(wall, 3),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def measure(name: str, flv: str, output: str) -> dict:
+    if name == "ffmpeg_copy":
+        command = ["ffmpeg", "-v", "error", "-y", "-i", flv, "-c", "copy", output]
+    else:
+        code = NATIVE.format(
+            src=str(SRC), convert=name == "native", input=flv, output=output
+        )
+        command = [sys.executable, "-c", code]
+
+    result = {"method": name, "input_mb": round(os.path.getsize(flv) / 2**20, 1)}
+    result.update(run(command))
+    if name != "python_baseline":
+        result["output_mb"] = round(os.path.getsize(output) / 2**20, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="*", help="FLV recordings to convert")
+    parser.add_argument("--seconds", type=int, default=300, help="generated sample")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", dest="json_path", help="write results to file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        files = args.files
+        if not files:
+            files = [str(Path(tmp) / "sample.flv")]
+            generate_sample(files[0], args.seconds)
+
+        output = str(Path(tmp) / "output.mp4")
+        for flv in files:
+            for _ in range(args.runs):
+                for name in ("python_baseline", "native", "ffmpeg_copy"):
+                    result = measure(name, flv, output)
+                    results.append(result)
+                    print(json.dumps(result), flush=True)
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Reproducible recorder scenarios against the local mock TikTok/CDN server.
+
+Every scenario runs the recorder in a fresh child process while the mock
+server runs in this one, so the CPU time reported is the recorder's own.
+Results are printed as JSON lines and can be saved with --json; --compare
+prints the change of every metric against a saved run.
+
+Scenarios:
+    room_info   get_live_urls() against room/info: request and parsing cost
+    followers   N followers of which M are live: time until every live is
+                recording, and the requests it took
+    lives       M concurrent recordings of a synthetic FLV at --bitrate,
+                optionally with --stall pauses of the main CDN edge
+    throughput  one recording of a stream served as fast as possible
+
+Usage:
+    python benchmarks/bench_scenarios.py --json baseline.json
+    python benchmarks/bench_scenarios.py lives --lives 1 10 --stall 5:3
+    python benchmarks/bench_scenarios.py --compare baseline.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+SCENARIOS = ["room_info", "followers", "lives", "throughput"]
+
+
+def _percentile(values: list, percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class _NoPostProcessing:
+    def convert(self, *args, **kwargs):
+        pass
+
+    def upload(self, *args, **kwargs):
+        pass
+
+
+def _recorder(mode, **kwargs):
+    from core.tiktok_recorder import TikTokRecorder
+    from utils.recorder_config import RecorderConfig
+
+    config = RecorderConfig(mode=mode, output=".", **kwargs)
+    return TikTokRecorder(config, post_processor=_NoPostProcessing())
+
+
+def run_room_info(params: dict) -> dict:
+    from core.tiktok_api import TikTokAPI
+    from mock_server import room_id_for
+
+    api = TikTokAPI(proxy=None, cookies=None)
+    room_id = room_id_for("bench_user_0")
+
+    latencies = []
+    cpu_start = time.process_time()
+    for _ in range(params["calls"]):
+        start = time.perf_counter()
+        assert api.get_live_urls(room_id), "the room is not live"
+        latencies.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+
+    return {
+        "calls_per_s": round(len(latencies) / sum(latencies), 1),
+        "ms_p50": round(_percentile(latencies, 50) * 1e3, 3),
+        "ms_p95": round(_percentile(latencies, 95) * 1e3, 3),
+        "cpu_ms_per_call": round(cpu / len(latencies) * 1e3, 3),
+    }
+
+
+def run_followers(params: dict) -> dict:
+    from core.tiktok_recorder import RECORDINGS
+    from utils.enums import Mode
+
+    recorder = _recorder(
+        Mode.FOLLOWERS,
+        automatic_interval=params["interval"] / 60,
+        followers_page_size=30,
+    )
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    threading.Thread(target=recorder.run, daemon=True).start()
+
+    deadline = start + params["timeout"]
+    while RECORDINGS.value() < params["lives"] and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    detected = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    recorder.stop()
+
+    return {
+        "recordings": RECORDINGS.value(),
+        "all_live_recording_s": round(detected, 2),
+        "cpu_s": round(cpu, 3),
+    }
+
+
+def run_lives(params: dict) -> dict:
+    from core.tiktok_recorder import FIRST_BYTE, RECONNECTS, RECORDED_BYTES
+    from mock_server import room_id_for
+    from utils.enums import Mode
+
+    users = [f"bench_user_{i}" for i in range(params["lives"])]
+    recorder = _recorder(Mode.MANUAL, redundant=params["redundant"])
+
+    threads = [
+        threading.Thread(
+            target=recorder.start_recording, args=(user, room_id_for(user))
+        )
+        for user in users
+    ]
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    for thread in threads:
+        thread.start()
+
+    # the longest time a recording went without data, once started
+    last = {user: (0, None) for user in users}  # bytes, since
+    longest_stall = 0.0
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.1)
+        now = time.perf_counter()
+        for user in users:
+            written = RECORDED_BYTES.value(user=user)
+            before, since = last[user]
+            if written > before or since is None:
+                last[user] = (written, now if written else None)
+            else:
+                longest_stall = max(longest_stall, now - since)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    written = sum(RECORDED_BYTES.value(user=user) for user in users)
+    expected = params["bitrate"] * 1e6 / 8 * params["seconds"] * len(users)
+    first_bytes, first_byte_total = FIRST_BYTE.value()
+    return {
+        "wall_s": round(wall, 2),
+        "mb_written": round(written / 1e6, 2),
+        "completeness": round(written / expected, 3),
+        "first_byte_ms_mean": round(first_byte_total / max(1, first_bytes) * 1e3, 1),
+        "longest_stall_s": round(longest_stall, 1),
+        "reconnects": sum(RECONNECTS.value(user=user) for user in users),
+        "cpu_percent": round(cpu / wall * 100, 1),
+        "cpu_ms_per_mb": round(cpu / max(written / 1e6, 1e-9) * 1e3, 3),
+    }
+
+
+def run_throughput(params: dict) -> dict:
+    from core.tiktok_recorder import RECORDED_BYTES
+    from mock_server import room_id_for
+    from utils.enums import Mode
+
+    recorder = _recorder(Mode.MANUAL)
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    recorder.start_recording("bench_user_0", room_id_for("bench_user_0"))
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    written = RECORDED_BYTES.value(user="bench_user_0") / 1e6
+    return {
+        "mb_written": round(written, 1),
+        "mb_per_s": round(written / wall, 1),
+        "cpu_ms_per_mb": round(cpu / max(written, 1e-9) * 1e3, 3),
+    }
+
+
+def mock_options(scenario: str, params: dict) -> dict:
+    """
+    Arguments of the mock server for a scenario.
+    """
+    if scenario == "room_info":
+        return {"live_users": ["bench_user_0"]}
+
+    if scenario == "followers":
+        users = [f"bench_user_{i}" for i in range(params["users"])]
+        return {
+            "followers": users,
+            "live_users": users[: params["lives"]],
+            "stream_seconds": 5,
+        }
+
+    if scenario == "lives":
+        return {
+            "live_users": [f"bench_user_{i}" for i in range(params["lives"])],
+            "stream_seconds": params["seconds"],
+            "bitrate": int(params["bitrate"] * 1e6),
+            "stalls": params["stalls"],
+        }
+
+    return {
+        "live_users": ["bench_user_0"],
+        # enough stream for --size MB at 8 Mbit/s
+        "stream_seconds": params["size"],
+        "bitrate": 8_000_000,
+        "realtime": False,
+    }
+
+
+def measure(scenario: str, params: dict) -> dict:
+    from mock_server import MockTikTokServer
+
+    server = MockTikTokServer(**mock_options(scenario, params))
+    mock_url = server.start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            result_path = Path(workdir) / "result.json"
+            subprocess.run(
+                [
+                    sys.executable,
+                    str(Path(__file__).resolve()),
+                    "--child",
+                    json.dumps({"scenario": scenario, "params": params}),
+                    "--mock-url",
+                    mock_url,
+                    "--result",
+                    str(result_path),
+                ],
+                cwd=workdir,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=params.get("timeout", 60) + 600,
+                check=True,
+            )
+            result = json.loads(result_path.read_text())
+    finally:
+        server.stop()
+
+    return {
+        "scenario": scenario,
+        "params": params,
+        **result,
+        "requests": dict(server.requests),
+    }
+
+
+def run_child(spec: str, mock_url: str, result_path: str) -> None:
+    from mock_server import patch_tiktok_api
+
+    patch_tiktok_api(mock_url)
+
+    spec = json.loads(spec)
+    run = globals()[f"run_{spec['scenario']}"]
+    result = run(spec["params"])
+    Path(result_path).write_text(json.dumps(result))
+
+
+def scenario_params(scenario: str, args) -> list:
+    if scenario == "room_info":
+        return [{"calls": args.calls}]
+
+    if scenario == "followers":
+        return [
+            {
+                "users": users,
+                "lives": min(lives, users),
+                "interval": args.interval,
+                "timeout": 60,
+            }
+            for users in args.users
+            for lives in args.lives
+        ]
+
+    if scenario == "lives":
+        return [
+            {
+                "lives": lives,
+                "bitrate": args.bitrate,
+                "seconds": args.seconds,
+                "stalls": args.stalls,
+                "redundant": args.redundant,
+            }
+            for lives in args.lives
+        ]
+
+    return [{"size": args.size}]
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(baseline: dict, results: list) -> None:
+    """
+    Prints the relative change of the numeric metrics found in both runs.
+    """
+
+    def key(result):
+        return result["scenario"], json.dumps(result["params"], sort_keys=True)
+
+    previous = {key(result): result for result in baseline["results"]}
+    print(f"\nCompared with {baseline['meta'].get('commit')}:")
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+
+        changes = []
+        for name, value in result.items():
+            before = old.get(name)
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)):
+                change = (value - before) / before * 100 if before else 0.0
+                changes.append(f"{name} {before:g} -> {value:g} ({change:+.1f}%)")
+        print(f"  {result['scenario']} {result['params']}:")
+        for change in changes:
+            print(f"    {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("scenarios", nargs="*", help=f"among {', '.join(SCENARIOS)}")
+    parser.add_argument("--calls", type=int, default=200, help="room_info calls")
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--lives", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds")
+    parser.add_argument("--bitrate", type=float, default=2.0, help="Mbit/s")
+    parser.add_argument("--seconds", type=float, default=10.0, help="live length")
+    parser.add_argument(
+        "--stall",
+        dest="stalls",
+        action="append",
+        default=[],
+        type=lambda value: [float(part) for part in value.split(":")],
+        help="AT:SECONDS pause of the main CDN edge, repeatable",
+    )
+    parser.add_argument("--redundant", action="store_true")
+    parser.add_argument("--size", type=int, default=256, help="throughput MB")
+    parser.add_argument("--json", dest="json_path", help="write results to file")
+    parser.add_argument("--compare", help="results file of a previous run")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mock-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.mock_url, args.result)
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = []
+    for scenario in args.scenarios or SCENARIOS:
+        for params in scenario_params(scenario, args):
+            result = measure(scenario, params)
+            results.append(result)
+            print(json.dumps(result), flush=True)
+
+    report = {"meta": metadata(), "results": results}
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), results)
+
+
+if __name__ == "__main__":
+    main()
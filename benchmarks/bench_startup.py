@@ -0,0 +1,115 @@
+"""
+Time from launch to the first request: interpreter start, dependency check
+and the imports of the recorder.
+
+Every run is a fresh interpreter started with `-X importtime` in a scratch
+working directory, so "cold" runs the full dependency probe and "warm"
+finds the result cached by the previous run. The slowest imports, by
+cumulative time, are reported with the first warm run.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --json startup.json --top 15
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# the steps of main.py before the first request to TikTok
+STARTUP = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+marks = {{}}
+start = time.perf_counter()
+from utils.dependencies import check_and_install_dependencies
+check_and_install_dependencies()
+marks["dependencies_ms"] = time.perf_counter() - start
+from utils.args_handler import validate_and_parse_args
+from check_updates import check_updates
+from core.tiktok_recorder import TikTokRecorder
+from core.tiktok_api import TikTokAPI
+marks["imports_ms"] = time.perf_counter() - start - marks["dependencies_ms"]
+TikTokAPI(proxy=None, cookies=None)
+marks["client_ms"] = time.perf_counter() - start - sum(marks.values())
+print(json.dumps({{name: round(value * 1e3, 1) for name, value in marks.items()}}))
+"""
+
+
+def parse_importtime(stderr: str, top: int) -> list:
+    """
+    Returns the `top` imports with the highest cumulative time.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        # import time:   self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    imports.sort(reverse=True)
+    return [
+        {
+            "module": name.strip(),
+            "cumulative_ms": cumulative / 1e3,
+            "self_ms": own / 1e3,
+        }
+        for cumulative, own, name in imports[:top]
+    ]
+
+
+def measure(workdir: str, top: int) -> tuple:
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP.format(src=str(SRC))],
+        cwd=workdir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+
+    marks = json.loads(process.stdout.strip().splitlines()[-1])
+    return {"wall_ms": round(wall * 1e3, 1), **marks}, parse_importtime(
+        process.stderr, top
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="warm runs")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports shown")
+    parser.add_argument("--json", dest="json_path", help="write results to file")
+    args = parser.parse_args()
+
+    results = []
+    imports = None
+    with tempfile.TemporaryDirectory() as workdir:
+        for run in range(args.runs + 1):
+            result, slowest = measure(workdir, args.top)
+            result = {"start": "warm" if run else "cold", **result}
+            results.append(result)
+            print(json.dumps(result), flush=True)
+            if run == 1:
+                imports = slowest
+
+    for entry in imports or []:
+        print(
+            f"  {entry['cumulative_ms']:8.1f} ms  "
+            f"(self {entry['self_ms']:6.1f} ms)  {entry['module']}"
+        )
+
+    if args.json_path:
+        report = {"runs": results, "slowest_imports": imports}
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
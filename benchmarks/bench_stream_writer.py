@@ -0,0 +1,117 @@
+"""
+Throughput and CPU usage of the recording write path.
+
+Compares the former loop of start_recording (iter_content with 4 KB
+chunks accumulated in a bytearray) with StreamWriter, reading the same
+body from a local HTTP server running in another process.
+
+Usage:
+    python benchmarks/bench_stream_writer.py --size 512 --runs 3
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import requests  # noqa: E402
+
+from utils.stream_writer import StreamWriter  # noqa: E402
+
+PAYLOAD = os.urandom(1024 * 1024)
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        size_mb = int(self.path.strip("/"))
+        self.send_response(200)
+        self.send_header("Content-Type", "video/x-flv")
+        self.send_header("Content-Length", str(size_mb * len(PAYLOAD)))
+        self.end_headers()
+        for _ in range(size_mb):
+            self.wfile.write(PAYLOAD)
+
+
+def _serve(port_queue):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StreamHandler)
+    port_queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+def legacy_copy(session, url, out_file):
+    buffer_size = 512 * 1024
+    buffer = bytearray()
+    response = session.get(url, stream=True)
+    for chunk in response.iter_content(chunk_size=4096):
+        if chunk:
+            buffer.extend(chunk)
+            if len(buffer) >= buffer_size:
+                out_file.write(buffer)
+                buffer.clear()
+    if buffer:
+        out_file.write(buffer)
+
+
+def writer_copy(session, url, out_file):
+    with StreamWriter(out_file) as writer:
+        with session.get(url, stream=True) as response:
+            writer.copy(response)
+
+
+def measure(name, copy, url, size_mb):
+    session = requests.Session()
+    with tempfile.TemporaryFile() as out_file:
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        copy(session, url, out_file)
+        out_file.flush()
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        assert out_file.tell() == size_mb * len(PAYLOAD), "incomplete copy"
+
+    return {
+        "writer": name,
+        "size_mb": size_mb,
+        "mb_per_s": round(size_mb / wall, 1),
+        "cpu_percent": round(cpu / wall * 100, 1),
+        "cpu_ms_per_mb": round(cpu / size_mb * 1e3, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=512, help="MB per run")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", dest="json_path", help="write results to file")
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get()}/{args.size}"
+
+    results = []
+    try:
+        for _ in range(args.runs):
+            for name, copy in (("legacy", legacy_copy), ("stream_writer", writer_copy)):
+                result = measure(name, copy, url, args.size)
+                results.append(result)
+                print(json.dumps(result), flush=True)
+    finally:
+        server.terminate()
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+Local stand-in for the TikTok and tikrec endpoints used by the recorder.
+
+Only meant for benchmarks: every user resolves to a stable fake room id
+and only the users passed as ``live_users`` are reported as live.
+
+A live lasts ``stream_seconds`` from its first CDN request, then its room
+goes offline. The FLV CDN streams synthetic but well-formed H.264/AAC tags
+at ``bitrate``, paced like a live (or as fast as possible without
+``realtime``); a reconnection resumes at the live clock. ``stalls`` are
+(second, duration) pauses of the main CDN edge, the backup edge is never
+stalled.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# sdk_key, level, announced video bitrate
+QUALITIES = [("origin", 10, 4_000_000), ("hd", 5, 2_000_000), ("sd", 3, 1_000_000)]
+HLS_SEGMENT_SECONDS = 1
+HLS_WINDOW = 3  # segments listed by a playlist
+
+# decoder configurations of a 1280x720 H.264 stream and of AAC-LC stereo 44.1 kHz
+AVC_CONFIG = bytes.fromhex(
+    "01f4001fffe1001a67f4001f919b280a00b76022000003000200000300781e30632c"
+    "01000568ce0f1920fff8f800"
+)
+AAC_CONFIG = bytes.fromhex("1210")
+FPS = 30
+GOP = 60  # frames from a keyframe to the next
+KEYFRAME_WEIGHT = 8  # a keyframe is this many times bigger than another frame
+AUDIO_BITRATE = 128_000
+AUDIO_FRAME_MS = 1024 / 44.1
+PACING_INTERVAL = 0.05  # seconds between two writes of a paced stream
+_NOISE = os.urandom(1024 * 1024)
+
+
+def room_id_for(user: str) -> str:
+    return str(7_000_000_000 + zlib.crc32(user.encode()))
+
+
+def _flv_tag(tag_type: int, timestamp: int, data: bytes) -> bytes:
+    size = len(data)
+    header = bytes(
+        (
+            tag_type,
+            size >> 16 & 0xFF,
+            size >> 8 & 0xFF,
+            size & 0xFF,
+            timestamp >> 16 & 0xFF,
+            timestamp >> 8 & 0xFF,
+            timestamp & 0xFF,
+            timestamp >> 24 & 0xFF,
+            0,
+            0,
+            0,
+        )
+    )
+    return header + data + struct.pack(">I", 11 + size)
+
+
+def synthetic_flv(bitrate: int, start_ms: int = 0, end_ms: int | None = None):
+    """
+    Yields (timestamp in ms, bytes) of an H.264/AAC FLV stream whose frames
+    carry random data sized for `bitrate`. The stream starts with its
+    headers and a keyframe at the GOP boundary before `start_ms`.
+    """
+    frame_ms = 1000 / FPS
+    video_bytes = max(64, (bitrate - AUDIO_BITRATE) // 8 // FPS)
+    delta_size = video_bytes * GOP // (KEYFRAME_WEIGHT + GOP - 1)
+    key_size = delta_size * KEYFRAME_WEIGHT
+    audio_size = int(AUDIO_BITRATE / 8 * AUDIO_FRAME_MS / 1000)
+
+    frame = int(start_ms / frame_ms) // GOP * GOP
+    start = round(frame * frame_ms)
+    audio = int(start / AUDIO_FRAME_MS) + 1
+
+    script = b"\x02\x00\x0aonMetaData\x08\x00\x00\x00\x00\x00\x00\x09"
+    yield (
+        start,
+        b"".join(
+            (
+                b"FLV\x01\x05\x00\x00\x00\x09\x00\x00\x00\x00",
+                _flv_tag(18, start, script),
+                _flv_tag(9, start, b"\x17\x00\x00\x00\x00" + AVC_CONFIG),
+                _flv_tag(8, start, b"\xaf\x00" + AAC_CONFIG),
+            )
+        ),
+    )
+
+    offset = 0
+    while True:
+        video_ts = round(frame * frame_ms)
+        audio_ts = round(audio * AUDIO_FRAME_MS)
+        timestamp = min(video_ts, audio_ts)
+        if end_ms is not None and timestamp >= end_ms:
+            return
+
+        if video_ts <= audio_ts:
+            keyframe = frame % GOP == 0
+            size = key_size if keyframe else delta_size
+            header = b"\x17\x01" if keyframe else b"\x27\x01"
+            nalu = (b"\x65" if keyframe else b"\x41") + _noise(offset, size)
+            data = header + b"\x00\x00\x00" + struct.pack(">I", len(nalu)) + nalu
+            yield video_ts, _flv_tag(9, video_ts, data)
+            frame += 1
+        else:
+            data = b"\xaf\x01" + _noise(offset, audio_size)
+            yield audio_ts, _flv_tag(8, audio_ts, data)
+            audio += 1
+        offset = (offset + 7919) % len(_NOISE)
+
+
+def _noise(offset: int, size: int) -> bytes:
+    data = _NOISE[offset : offset + size]
+    while len(data) < size:
+        data += _NOISE[: size - len(data)]
+    return data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes: do not let the body wait for an ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # the recorder went away, e.g. a benchmark child was stopped
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.requests[url.path] += 1
+
+        route = self.server.routes.get(url.path)
+        if route is None:
+            self._send_json({"status_code": 404}, status=404)
+            return
+
+        route(self, query)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, text, status=200):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockTikTokServer:
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        live_users=(),
+        followers=(),
+        stream_seconds=5,
+        bitrate=2_000_000,
+        realtime=True,
+        stalls=(),
+    ):
+        self.live_rooms = {room_id_for(user) for user in live_users}
+        self.followers = list(followers)
+        self.stream_seconds = stream_seconds
+        self.bitrate = bitrate
+        self.realtime = realtime
+        self.stalls = sorted(stalls)  # (second of the live, seconds)
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.requests = Counter()
+        self.events = []  # (user, room_id) announced by the push feed
+        self.live_started = {}  # room_id -> time of the first CDN request
+        self._events_changed = threading.Condition()
+        self.httpd.routes = {
+            "/live": self._live,
+            "/foryou": self._foryou,
+            "/tiktok/room/api/sign": self._sign,
+            "/api-live/user/room/": self._user_room,
+            "/webcast/room/check_alive/": self._check_alive,
+            "/api/user/list/": self._user_list,
+            "/webcast/room/info/": self._room_info,
+            "/cdn/stream.flv": self._cdn_stream,
+            "/cdn/playlist.m3u8": self._cdn_playlist,
+            "/cdn/segment.ts": self._cdn_segment,
+            "/webcast/push/": self._push,
+        }
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> Counter:
+        return self.httpd.requests
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def go_live(self, user: str) -> None:
+        """
+        Marks the user live and announces it on the push feed.
+        """
+        room_id = room_id_for(user)
+        self.live_rooms.add(room_id)
+        with self._events_changed:
+            self.events.append((user, room_id))
+            self._events_changed.notify_all()
+
+    def _live(self, handler, query):
+        handler._send_text("<html>live</html>")
+
+    def _foryou(self, handler, query):
+        handler._send_text('<html>"secUid":"mock-sec-uid",</html>')
+
+    def _sign(self, handler, query):
+        user = query.get("unique_id", "")
+        handler._send_json({"signed_path": f"/api-live/user/room/?uniqueId={user}"})
+
+    def _user_room(self, handler, query):
+        user = query.get("uniqueId", "")
+        handler._send_json({"data": {"user": {"roomId": room_id_for(user)}}})
+
+    def _check_alive(self, handler, query):
+        room_ids = [r for r in query.get("room_ids", "").split(",") if r]
+        handler._send_json(
+            {
+                "data": [
+                    {
+                        "alive": room_id in self.live_rooms,
+                        "room_id": int(room_id),
+                        "room_id_str": room_id,
+                    }
+                    for room_id in room_ids
+                ]
+            }
+        )
+
+    def _user_list(self, handler, query):
+        count = int(query.get("count", 5))
+        cursor = int(query.get("minCursor", 0))
+        page = self.followers[cursor : cursor + count]
+        has_more = cursor + count < len(self.followers)
+
+        body = json.dumps(
+            {
+                "userList": [
+                    {"user": {"uniqueId": user, "secUid": f"sec-{user}"}}
+                    for user in page
+                ],
+                "hasMore": has_more,
+                "minCursor": cursor + len(page),
+            }
+        ).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Set-Cookie", "msToken=mock-ms-token; Path=/")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _room_info(self, handler, query):
+        room_id = query.get("room_id", "")
+        if room_id not in self.live_rooms:
+            handler._send_json({"data": {"status": 4}})
+            return
+
+        stream_data = {"data": {}}
+        for sdk_key, _, bitrate in QUALITIES:
+            flv = f"{self.url}/cdn/stream.flv?room_id={room_id}&quality={sdk_key}"
+            hls = f"{self.url}/cdn/playlist.m3u8?room_id={room_id}&quality={sdk_key}"
+            params = json.dumps({"vbitrate": bitrate})
+            stream_data["data"][sdk_key] = {
+                "main": {"flv": flv, "hls": hls, "sdk_params": params},
+                "backup": {
+                    "flv": f"{flv}&edge=backup",
+                    "hls": f"{hls}&edge=backup",
+                    "sdk_params": params,
+                },
+            }
+        handler._send_json(
+            {
+                "data": {
+                    "owner": {"display_id": f"owner_{room_id}"},
+                    "stream_url": {
+                        "live_core_sdk_data": {
+                            "pull_data": {
+                                "stream_data": json.dumps(stream_data),
+                                "options": {
+                                    "qualities": [
+                                        {"sdk_key": sdk_key, "level": level}
+                                        for sdk_key, level, _ in QUALITIES
+                                    ]
+                                },
+                            }
+                        }
+                    },
+                }
+            }
+        )
+
+    def _push(self, handler, query):
+        """
+        Long poll: answers once an event newer than the cursor concerns
+        one of the users, or after the timeout.
+        """
+        users = set(query.get("users", "").split(","))
+        cursor = int(query.get("cursor", len(self.events)))
+        deadline = time.monotonic() + float(query.get("timeout", 30))
+
+        with self._events_changed:
+            while True:
+                events = [
+                    {"user": user, "room_id": room_id}
+                    for user, room_id in self.events[cursor:]
+                    if user in users
+                ]
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    break
+                self._events_changed.wait(remaining)
+            cursor = len(self.events)
+
+        handler._send_json({"cursor": cursor, "events": events})
+
+    def _live_clock(self, room_id: str) -> float:
+        """
+        Seconds since the live started, from its first CDN request.
+        """
+        started = self.live_started.setdefault(room_id, time.monotonic())
+        return time.monotonic() - started
+
+    def _end_live(self, room_id: str) -> None:
+        self.live_rooms.discard(room_id)
+
+    def _cdn_stream(self, handler, query):
+        """
+        Streams the synthetic FLV from the live clock until the live ends,
+        without length.
+        """
+        room_id = query.get("room_id", "")
+        if room_id not in self.live_rooms:
+            handler._send_json({"status_code": 404}, status=404)
+            return
+
+        start_ms = int(self._live_clock(room_id) * 1000) if self.realtime else 0
+        end_ms = int(self.stream_seconds * 1000)
+        stalls = []
+        if query.get("edge") != "backup":
+            stalls = [stall for stall in self.stalls if stall[0] * 1000 >= start_ms]
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "video/x-flv")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+
+        pending = []
+        try:
+            for timestamp, data in synthetic_flv(self.bitrate, start_ms, end_ms):
+                pending.append(data)
+                if not self.realtime:
+                    if len(pending) >= 64:
+                        handler.wfile.write(b"".join(pending))
+                        pending.clear()
+                    continue
+
+                # tags are sent when the live clock reaches them
+                ahead = timestamp / 1000 - self._live_clock(room_id)
+                if ahead > PACING_INTERVAL:
+                    handler.wfile.write(b"".join(pending))
+                    pending.clear()
+                    time.sleep(ahead)
+
+                while stalls and timestamp / 1000 >= stalls[0][0]:
+                    handler.wfile.write(b"".join(pending))
+                    pending.clear()
+                    time.sleep(stalls.pop(0)[1])
+
+            handler.wfile.write(b"".join(pending))
+            self._end_live(room_id)
+        except OSError:
+            pass
+
+    def _cdn_playlist(self, handler, query):
+        """
+        Live HLS playlist: a segment is added every HLS_SEGMENT_SECONDS from
+        the first request, and the list ends after stream_seconds.
+        """
+        room_id = query.get("room_id", "")
+        total = max(1, int(self.stream_seconds / HLS_SEGMENT_SECONDS))
+        available = int(self._live_clock(room_id) / HLS_SEGMENT_SECONDS) + 1
+        last = min(available, total)
+        first = max(0, last - HLS_WINDOW)
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{HLS_SEGMENT_SECONDS}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first}",
+        ]
+        for sequence in range(first, last):
+            lines.append(f"#EXTINF:{HLS_SEGMENT_SECONDS:.3f},")
+            lines.append(f"segment.ts?room_id={room_id}&seq={sequence}")
+        if available >= total:
+            lines.append("#EXT-X-ENDLIST")
+            self._end_live(room_id)
+
+        body = "\n".join(lines).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/vnd.apple.mpegurl")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _cdn_segment(self, handler, query):
+        """
+        Serves a segment of random bytes at the configured bitrate.
+        """
+        body = os.urandom(self.bitrate // 8 * HLS_SEGMENT_SECONDS)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "video/mp2t")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def patch_tiktok_api(base_url: str) -> None:
+    """
+    Point every TikTokAPI instance created afterwards at the mock server.
+    """
+    from core.tiktok_api import TikTokAPI
+
+    original_init = TikTokAPI.__init__
+
+    def __init__(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.BASE_URL = base_url
+        self.WEBCAST_URL = base_url
+        self.API_URL = f"{base_url}/api-live/user/room/"
+        self.TIKREC_API = base_url
+
+    TikTokAPI.__init__ = __init__
@@ -1,6 +1,5 @@
 import os
 from pathlib import Path
-import requests
 import zipfile
 import shutil
 
@@ -10,6 +9,8 @@ URL_REPO = (
 )
 FILE_TEMP = "enums_temp.py"
 FILE_NAME_UPDATE = URL_REPO.split("/")[-1]
+# update downloaded by a previous run, installed at the next start
+STAGED_DIR = Path(__file__).parent / "update_temp"
 
 
 def delete_tmp_file():
@@ -40,6 +41,8 @@ def download_file(url: str, file_name: str) -> None:
         url (str): URL to download the file from.
         file_name (str): Name of the file to save.
     """
+    import requests
+
     response = requests.get(url, stream=True)
 
     if response.status_code == 200:
@@ -50,12 +53,16 @@ def download_file(url: str, file_name: str) -> None:
         print("Error downloading the file.")
 
 
-def check_updates() -> bool:
+def check_updates(install: bool = True) -> bool:
     """
     Check if there is a new version available and update if necessary.
 
+    Args:
+        install (bool): Install the update now. If False, it is only
+            downloaded, for install_staged_update() at the next start.
+
     Returns:
-        bool: True if the update was successful, False otherwise.
+        bool: True if an update was installed or staged, False otherwise.
     """
     download_file(URL, FILE_TEMP)
 
@@ -93,14 +100,47 @@ def check_updates() -> bool:
     download_file(URL_REPO, FILE_NAME_UPDATE)
 
     dir_path = Path(__file__).parent
-    temp_update_dir = dir_path / "update_temp"
+    partial_dir = STAGED_DIR.with_suffix(".part")
+    shutil.rmtree(partial_dir, ignore_errors=True)
 
-    # Extract content from zip to a temporary update directory
+    # Extract content from zip to a temporary update directory, only named
+    # STAGED_DIR once complete so an interrupted download is never installed
     with zipfile.ZipFile(dir_path / FILE_NAME_UPDATE, "r") as zip_ref:
-        zip_ref.extractall(temp_update_dir)
+        zip_ref.extractall(partial_dir)
+    shutil.rmtree(STAGED_DIR, ignore_errors=True)
+    partial_dir.rename(STAGED_DIR)
+
+    if install:
+        install_staged_update()
+
+    try:
+        Path(FILE_TEMP).unlink()
+    except Exception as e:
+        print(f"Failed to remove the temporary file {FILE_TEMP}: {e}")
+
+    delete_tmp_file()
+
+    try:
+        Path(FILE_NAME_UPDATE).unlink()
+    except Exception as e:
+        print(f"Failed to remove the temporary file {FILE_NAME_UPDATE}: {e}")
+
+    return True
+
 
+def install_staged_update() -> bool:
+    """
+    Install the update downloaded by check_updates(), if any.
+
+    Returns:
+        bool: True if an update was installed, False otherwise.
+    """
     # Find the extracted folder (it will have the name 'tiktok-live-recorder-main')
-    extracted_folder = temp_update_dir / "tiktok-live-recorder-main" / "src"
+    extracted_folder = STAGED_DIR / "tiktok-live-recorder-main" / "src"
+    if not extracted_folder.is_dir():
+        return False
+
+    dir_path = Path(__file__).parent
 
     # Copy all files and folders from the extracted folder to the main directory
     files_to_preserve = {"check_updates.py", "cookies.json", "telegram.json"}
@@ -123,18 +163,6 @@ def check_updates() -> bool:
                     sub_destination.parent.mkdir(parents=True, exist_ok=True)
                     shutil.copy2(sub_item, sub_destination)
 
-    # Delete the temporary files and folders
-    shutil.rmtree(temp_update_dir)
-    try:
-        Path(FILE_TEMP).unlink()
-    except Exception as e:
-        print(f"Failed to remove the temporary file {FILE_TEMP}: {e}")
-
-    delete_tmp_file()
-
-    try:
-        Path(FILE_NAME_UPDATE).unlink()
-    except Exception as e:
-        print(f"Failed to remove the temporary file {FILE_NAME_UPDATE}: {e}")
-
+    # Delete the temporary folder
+    shutil.rmtree(STAGED_DIR)
     return True
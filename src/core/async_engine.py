@@ -0,0 +1,526 @@
+import asyncio
+import dataclasses
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import ProxyError
+
+from core.live_scheduler import LiveStatusScheduler
+from core.live_watcher import LiveWatcher
+from core.quality_policy import QualityPolicy
+from core.tiktok_api import TikTokAPI
+from core.tiktok_recorder import RECORDED_BYTES, TikTokRecorder
+from http_utils.async_http_client import AsyncHttpClient
+from http_utils.http_client import proxy_usable
+from http_utils.client_pool import HttpClientPool
+from http_utils.proxy_pool import ProxyPool
+from utils.cache import SQLiteStore
+from utils.custom_exceptions import LiveNotFound, UserLiveError, TikTokRecorderError
+from utils.enums import Error, Mode, TikTokError, TimeOut
+from utils.logger_manager import logger
+from utils.rate_limiter import RateLimiter
+from utils.recorder_config import RecorderConfig
+
+MAX_RECORDINGS = 256  # users monitored by a daemon, threads start when needed
+CONTROL_TIMEOUT = 10  # seconds a control call waits for the event loop
+
+
+class AsyncTikTokAPI:
+    """
+    Coroutine versions of the TikTokAPI polling calls.
+
+    URL building and response parsing are delegated to the wrapped
+    TikTokAPI so that both engines stay in sync, including the routing
+    over its proxy pool.
+    """
+
+    def __init__(
+        self, api: TikTokAPI, proxy=None, cookies=None, max_clients=10, http2=False
+    ):
+        self.api = api
+        self.cookies = cookies
+        self.max_clients = max_clients
+        self.http2 = http2
+        self.http_client = AsyncHttpClient(
+            proxy, cookies, max_clients=max_clients, http2=http2
+        )
+        self._proxy_clients = {}  # proxy -> AsyncHttpClient
+
+    async def _get(self, url: str, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._send(url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self.api._observe(url, status, start)
+
+    async def _send(self, url: str, **kwargs):
+        pool = self.api.proxy_pool
+        if pool is None:
+            return await self.http_client.get(url, **kwargs)
+
+        # a failing proxy hands the request over to the next one
+        tried = set()
+        error = ProxyError("No usable proxy in the pool.")
+        while (proxy := pool.choose(exclude=tried)) is not None:
+            tried.add(proxy)
+            start = time.monotonic()
+            try:
+                client = await self._proxy_client(proxy)
+                if client is None:
+                    pool.report_error(proxy)
+                    continue
+
+                response = await client.get(url, **kwargs)
+            except Exception as ex:
+                pool.report_error(proxy)
+                logger.debug(f"Request through {proxy} failed: {ex}")
+                error = ex
+                continue
+
+            pool.report(proxy, response, time.monotonic() - start)
+            return response
+
+        raise error
+
+    async def _proxy_client(self, proxy: str) -> AsyncHttpClient | None:
+        if proxy not in self._proxy_clients:
+            # the first test of a proxy blocks, keep it off the event loop
+            if not await asyncio.to_thread(proxy_usable, proxy):
+                return None
+            self._proxy_clients[proxy] = AsyncHttpClient(
+                proxy, self.cookies, max_clients=self.max_clients, http2=self.http2
+            )
+        return self._proxy_clients[proxy]
+
+    async def is_room_alive(self, room_id: str) -> bool:
+        """
+        Checking whether the user is live.
+        """
+        if not room_id:
+            raise UserLiveError(TikTokError.USER_NOT_CURRENTLY_LIVE)
+
+        alive = await self.check_rooms_alive([room_id])
+        return alive.get(str(room_id), False)
+
+    async def check_rooms_alive(self, room_ids: list, chunk_size: int = 50) -> dict:
+        """
+        Checking whether many rooms are live, `chunk_size` rooms per request.
+        """
+        room_ids = list(dict.fromkeys(str(room_id) for room_id in room_ids if room_id))
+        chunks = self.api._chunks(room_ids, chunk_size)
+
+        responses = await asyncio.gather(
+            *(self._check_chunk(chunk) for chunk in chunks)
+        )
+
+        alive = {}
+        for chunk, response in zip(chunks, responses):
+            alive.update(self.api._parse_rooms_alive(response.json(), chunk))
+
+        return alive
+
+    async def _check_chunk(self, room_ids: list):
+        await self._throttle()
+        return await self._get(self.api._check_alive_url(room_ids))
+
+    async def _throttle(self, requests: int = 1) -> None:
+        if self.api.rate_limiter is not None:
+            await self.api.rate_limiter.acquire_async(requests)
+
+    async def get_room_id_from_user(self, user: str) -> str | None:
+        """Given a username, get the room_id."""
+        room_id = self.api.room_id_cache.get(user)
+        if room_id is not None:
+            return room_id
+
+        await self._throttle(2)
+        response = await self._get(
+            f"{self.api.TIKREC_API}/tiktok/room/api/sign",
+            params={"unique_id": user},
+        )
+        signed_url = self.api._parse_signed_url(response.json())
+
+        response = await self._get(signed_url)
+
+        room_id = self.api._parse_room_id(response.text)
+        if room_id:
+            self.api.room_id_cache.set(user, room_id)
+
+        return room_id
+
+    async def close(self) -> None:
+        for client in (self.http_client, *self._proxy_clients.values()):
+            await client.close()
+
+
+class AsyncRecorderEngine:
+    """
+    Monitors many users from a single process and event loop.
+
+    Live-status polling is done with non-blocking HTTP and driven by a
+    single LiveStatusScheduler, so an idle user costs one queue entry
+    instead of one interpreter, and due users are checked together with
+    batched check_alive requests. Once a user goes live, the regular
+    TikTokRecorder.start_recording runs in a worker thread: the stream
+    download is I/O bound and releases the GIL, and keeping a single
+    recording code path avoids diverging behaviour between engines.
+
+    With a `control_port`, the engine runs as a daemon: it keeps running
+    without users, and users are added, removed, paused and resumed at
+    runtime through the control API, sharing the sessions and caches of
+    the running engine. `template` holds the settings of added users.
+    With a `cluster_db`, the daemon is a cluster worker whose users are
+    the ones assigned to it by the coordinator.
+    """
+
+    def __init__(
+        self, configs: list[RecorderConfig], template: RecorderConfig | None = None
+    ):
+        self.configs = configs
+        self.template = template or configs[0]
+        self.mode = self.template.mode
+        self.daemon = (
+            self.template.control_port is not None
+            or self.template.cluster_db is not None
+        )
+        self._cookies = self.template.cookies
+
+        template = self.template
+        rate_limit = template.rate_limit
+        cache_file = template.cache_file
+        proxies = template.proxy
+        self.tiktok = TikTokAPI(
+            proxy=None,
+            cookies=self._cookies,
+            rate_limiter=RateLimiter(rate_limit) if rate_limit else None,
+            cache_store=SQLiteStore(cache_file) if cache_file else None,
+            client_pool=HttpClientPool.shared(template.http_pool_size, template.http2),
+            proxy_pool=ProxyPool(proxies) if proxies else None,
+            # the budget is shared by the recordings of every user
+            quality_policy=(
+                QualityPolicy(template.bandwidth * 1_000_000, template.priorities)
+                if template.bandwidth
+                else None
+            ),
+        )
+        self.async_tiktok = None
+        self.scheduler = LiveStatusScheduler(
+            template.automatic_interval * TimeOut.ONE_MINUTE,
+            max_dormant_factor=template.dormant_factor,
+        )
+        self.recorders = {}  # user -> TikTokRecorder
+        self.recordings = {}  # user -> Future of the recording thread
+        self.started = {}  # user -> (room_id, time) of its recording
+        self.paused = set()  # monitored users not being checked
+        self._loop = None
+        self._cluster = None
+
+        # one recording thread per monitored user at most
+        self._executor = ThreadPoolExecutor(
+            max_workers=MAX_RECORDINGS if self.daemon else len(configs),
+            thread_name_prefix="recording",
+        )
+
+    def run(self):
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt:
+            print("\n[!] Ctrl-C detected. Stopping active recordings...")
+        finally:
+            for recorder in self.recorders.values():
+                recorder.stop()
+            self._executor.shutdown(wait=True)
+            # the users are handed over once their recordings ended
+            if self._cluster is not None:
+                self._cluster.stop()
+
+    async def _run(self):
+        # same prerequisites as TikTokRecorder._setup, checked once for all users
+        recorder = TikTokRecorder(self.template, tiktok=self.tiktok)
+        await asyncio.to_thread(recorder.check_country_blacklisted)
+
+        max_clients = self.template.http_pool_size
+        if not self.daemon:
+            max_clients = min(len(self.configs), max_clients)
+        self.async_tiktok = AsyncTikTokAPI(
+            self.tiktok,
+            cookies=self._cookies,
+            max_clients=max_clients,
+            http2=self.template.http2,
+        )
+
+        for config in self.configs:
+            self.recorders[config.user] = TikTokRecorder(config, tiktok=self.tiktok)
+            self.scheduler.add(config.user)
+
+        watcher = None
+        if self.template.watch_url and self.mode != Mode.MANUAL:
+            watcher = LiveWatcher(
+                self.template.watch_url, lambda: self.scheduler.users, self._on_live
+            )
+            watcher.start()
+
+        self._loop = asyncio.get_running_loop()
+        control = None
+        if self.template.control_port is not None:
+            from core.control_server import ControlServer
+
+            control = ControlServer(self, self.template.control_port).start()
+        if self.template.cluster_db is not None:
+            from core.cluster import ClusterWorker, LeaseTable, default_worker_name
+
+            self._cluster = ClusterWorker(
+                self,
+                LeaseTable(self.template.cluster_db),
+                self.template.worker_name or default_worker_name(),
+            ).start()
+
+        try:
+            await self._poll_loop()
+        finally:
+            if control is not None:
+                control.stop()
+            if watcher is not None:
+                watcher.stop()
+            await self.async_tiktok.close()
+
+    def control(self, method, *args):
+        """
+        Runs an engine method on the event loop and returns its result.
+        Called from the threads of the control server.
+        """
+
+        async def call():
+            return method(*args)
+
+        future = asyncio.run_coroutine_threadsafe(call(), self._loop)
+        return future.result(CONTROL_TIMEOUT)
+
+    def add_user(self, user: str) -> bool:
+        """
+        Starts monitoring a user. Returns False if it already is.
+        """
+        if user in self.recorders:
+            return False
+        if len(self.recorders) >= MAX_RECORDINGS:
+            raise TikTokRecorderError(
+                f"Already monitoring {MAX_RECORDINGS} users, remove one first."
+            )
+
+        config = dataclasses.replace(self.template, user=user)
+        self.recorders[user] = TikTokRecorder(config, tiktok=self.tiktok)
+        # a recording stopped by a previous removal reschedules it when done
+        if user not in self.recordings:
+            self.scheduler.add(user)
+        logger.info(f"@{user}: added to the monitored users.")
+        return True
+
+    def remove_user(self, user: str) -> bool:
+        """
+        Stops monitoring a user and ends its recording, which is then
+        converted as usual. Returns False if it was not monitored.
+        """
+        recorder = self.recorders.pop(user, None)
+        if recorder is None:
+            return False
+
+        self.paused.discard(user)
+        self.scheduler.remove(user)
+        recorder.stop()
+        logger.info(f"@{user}: removed from the monitored users.")
+        return True
+
+    def pause_user(self, user: str) -> bool:
+        """
+        Stops checking a user. A recording in progress goes on until the
+        live ends. Returns False if the user is not monitored.
+        """
+        if user not in self.recorders:
+            return False
+
+        self.paused.add(user)
+        self.scheduler.remove(user)
+        logger.info(f"@{user}: paused.")
+        return True
+
+    def resume_user(self, user: str) -> bool:
+        """
+        Checks a paused user again. Returns False if it is not monitored.
+        """
+        if user not in self.recorders:
+            return False
+
+        if user in self.paused:
+            self.paused.discard(user)
+            if user not in self.recordings:
+                self.scheduler.add(user)
+            logger.info(f"@{user}: resumed.")
+        return True
+
+    def status(self) -> dict:
+        """
+        Returns the monitored users and the recordings in progress.
+        """
+        now = time.time()
+        users = []
+        for user in sorted(self.recorders):
+            if user in self.recordings:
+                state = "recording"
+            elif user in self.paused:
+                state = "paused"
+            else:
+                state = "waiting"
+            next_check = self.scheduler.due_in(user, now)
+            users.append(
+                {
+                    "user": user,
+                    "state": state,
+                    "next_check_s": None if next_check is None else round(next_check),
+                }
+            )
+
+        recordings = [
+            {
+                "user": user,
+                "room_id": room_id,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(since)),
+                "seconds": round(now - since),
+                "bytes": int(RECORDED_BYTES.value(user=user)),
+            }
+            for user, (room_id, since) in sorted(self.started.items())
+        ]
+        return {"users": users, "recordings": recordings}
+
+    def _monitored(self, user: str) -> bool:
+        # removed or paused while its check was in flight
+        return user in self.recorders and user not in self.paused
+
+    async def _poll_loop(self):
+        while self.daemon or len(self.scheduler) or self.recordings:
+            due = self.scheduler.pop_due()
+            if due:
+                await self._check_users(due)
+                continue
+
+            next_check = self.scheduler.next_due_in()
+            await asyncio.sleep(1 if next_check is None else min(next_check, 1))
+
+    async def _check_users(self, users: list):
+        results = await asyncio.gather(
+            *(self.async_tiktok.get_room_id_from_user(user) for user in users),
+            return_exceptions=True,
+        )
+
+        room_ids = {}  # user -> room_id
+        for user, result in zip(users, results):
+            if not self._monitored(user):
+                continue
+            if isinstance(result, Exception):
+                self._on_error(user, result)
+            elif not result:
+                self._on_offline(user)
+            else:
+                room_ids[user] = str(result)
+
+        try:
+            alive_rooms = await self.async_tiktok.check_rooms_alive(
+                list(room_ids.values())
+            )
+        except Exception as ex:
+            for user in room_ids:
+                self._on_error(user, ex)
+            return
+
+        for user, room_id in room_ids.items():
+            if not self._monitored(user):
+                continue
+            if alive_rooms.get(room_id):
+                self._start_recording(user, room_id)
+            else:
+                self._on_offline(user)
+
+    def _on_live(self, user: str, room_id) -> None:
+        # called from the watcher thread: the scheduler has its own lock
+        if user in self.recordings or not self._monitored(user):
+            return
+        if room_id:
+            self.tiktok.room_id_cache.set(user, str(room_id))
+        self.scheduler.add(user)
+
+    def _on_offline(self, user: str, message=None):
+        message = message or f"@{user}: {TikTokError.USER_NOT_CURRENTLY_LIVE}"
+
+        if self.mode == Mode.MANUAL:
+            logger.error(message)
+            self.scheduler.remove(user)
+            return
+
+        # only a live that just ended leaves a stale room_id
+        if self.scheduler.was_live(user):
+            self.tiktok.invalidate_room_id(user)
+        interval = self.scheduler.report(user, is_live=False)
+        logger.info(message)
+        logger.info(
+            f"@{user}: waiting {interval / TimeOut.ONE_MINUTE:g} "
+            "minutes before recheck\n"
+        )
+
+    def _on_error(self, user: str, ex: Exception):
+        if isinstance(ex, (UserLiveError, LiveNotFound)):
+            self._on_offline(user, message=f"@{user}: {ex}")
+
+        elif isinstance(ex, ConnectionError):
+            logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
+            self.scheduler.add(
+                user, delay=TimeOut.CONNECTION_CLOSED * TimeOut.ONE_MINUTE
+            )
+
+        else:
+            if isinstance(ex, TikTokRecorderError):
+                logger.error(f"@{user}: {ex}")
+            else:
+                logger.error(f"@{user}: {ex}", exc_info=ex)
+
+            if self.mode == Mode.MANUAL:
+                self.scheduler.remove(user)
+            else:
+                self.scheduler.report(user, is_live=False)
+
+    def _start_recording(self, user: str, room_id: str):
+        if user in self.recordings:
+            # the recording of a removed and added again user is ending
+            return
+
+        logger.info(f"@{user} is live. Starting recording...")
+        self.scheduler.report(user, is_live=True, room_id=room_id)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, self.recorders[user].start_recording, user, room_id
+        )
+        future.add_done_callback(lambda f: self._on_recording_done(user, f))
+        self.recordings[user] = future
+        self.started[user] = (room_id, time.time())
+
+    def _on_recording_done(self, user: str, future):
+        del self.recordings[user]
+        del self.started[user]
+
+        # cancelled on shutdown: exception() would raise CancelledError
+        if future.cancelled():
+            return
+
+        ex = future.exception()
+        if not self._monitored(user):
+            if ex is not None:
+                logger.error(f"@{user}: {ex}")
+        elif ex is not None:
+            self._on_error(user, ex)
+        elif self.mode == Mode.MANUAL:
+            self.scheduler.remove(user)
+        else:
+            # check again right away, as automatic_mode does
+            self.scheduler.add(user)
@@ -0,0 +1,320 @@
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from utils.logger_manager import logger
+
+HEARTBEAT_INTERVAL = 5  # seconds between two rounds of a worker or coordinator
+LEASE_TTL = 20  # seconds a silent worker keeps its workers row and leases
+RING_REPLICAS = 64  # points of a worker on the hash ring
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class HashRing:
+    """
+    Consistent hashing of users onto workers: when a worker joins or
+    leaves, only the users of the ring arcs it owns change hands.
+    """
+
+    def __init__(self, nodes, replicas: int = RING_REPLICAS):
+        self.nodes = sorted(set(nodes))
+        self._points = sorted(
+            (self._hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._points)
+        return self._points[index][1]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class LeaseTable:
+    """
+    Cluster state in a SQLite file shared by the coordinator and the
+    workers of one machine (or of a shared filesystem with working locks).
+
+    workers      name -> last heartbeat
+    assignments  user -> worker chosen by the coordinator
+    leases       user -> worker monitoring it, until `expires`
+
+    A worker only monitors a user while it holds its lease, so a user
+    moved to another worker is never recorded twice: the new owner takes
+    the lease once the previous one released it or stopped renewing it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers "
+                "(name TEXT PRIMARY KEY, heartbeat REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS assignments "
+                "(user TEXT PRIMARY KEY, worker TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases "
+                "(user TEXT PRIMARY KEY, worker TEXT, expires REAL)"
+            )
+
+    def heartbeat(self, worker: str, held: set) -> None:
+        """
+        Marks the worker alive and renews the leases it holds.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workers VALUES (?, ?)", (worker, now)
+            )
+            self._conn.executemany(
+                "UPDATE leases SET expires = ? WHERE user = ? AND worker = ?",
+                [(now + LEASE_TTL, user, worker) for user in held],
+            )
+
+    def leave(self, worker: str) -> None:
+        """
+        Removes a stopping worker and frees its leases right away.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM workers WHERE name = ?", (worker,))
+            self._conn.execute("DELETE FROM leases WHERE worker = ?", (worker,))
+
+    def live_workers(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM workers WHERE heartbeat > ? ORDER BY name",
+                (time.time() - LEASE_TTL,),
+            ).fetchall()
+        return [name for (name,) in rows]
+
+    def forget_workers(self) -> list:
+        """
+        Deletes the workers silent for longer than LEASE_TTL. Returns them.
+        """
+        with self._lock, self._conn:
+            limit = time.time() - LEASE_TTL
+            rows = self._conn.execute(
+                "SELECT name FROM workers WHERE heartbeat <= ?", (limit,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM workers WHERE heartbeat <= ?", (limit,))
+        return [name for (name,) in rows]
+
+    def assign(self, assignments: dict) -> None:
+        """
+        Replaces the assignments with the user -> worker map.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM assignments")
+            self._conn.executemany(
+                "INSERT INTO assignments VALUES (?, ?)", assignments.items()
+            )
+
+    def assignments(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT user, worker FROM assignments").fetchall()
+        return dict(rows)
+
+    def assigned_to(self, worker: str) -> set:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user FROM assignments WHERE worker = ?", (worker,)
+            ).fetchall()
+        return {user for (user,) in rows}
+
+    def acquire(self, user: str, worker: str) -> bool:
+        """
+        Takes the lease of a user if it is free, expired or already ours.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO leases VALUES (?, ?, ?) "
+                "ON CONFLICT (user) DO UPDATE SET "
+                "worker = excluded.worker, expires = excluded.expires "
+                "WHERE leases.worker = excluded.worker OR leases.expires <= ?",
+                (user, worker, now + LEASE_TTL, now),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, user: str, worker: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM leases WHERE user = ? AND worker = ?", (user, worker)
+            )
+
+    def held_by(self, worker: str) -> set:
+        """
+        Returns the users whose lease is the worker's, expired or not.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user FROM leases WHERE worker = ?", (worker,)
+            ).fetchall()
+        return {user for (user,) in rows}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class Coordinator:
+    """
+    Spreads the users over the live workers with a HashRing, and spreads
+    them again whenever a worker joins or stops sending heartbeats.
+    """
+
+    def __init__(self, table: LeaseTable, users: list):
+        self.table = table
+        self.users = list(dict.fromkeys(users))
+        self._workers = None
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        logger.info(f"Coordinating {len(self.users)} users on {self.table.path}")
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.rebalance()
+                except sqlite3.Error as ex:
+                    logger.error(f"Unable to update the cluster state: {ex}")
+                self._stop.wait(HEARTBEAT_INTERVAL)
+        finally:
+            self.table.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def rebalance(self) -> bool:
+        """
+        Assigns the users again if the live workers changed.
+        Returns True if they were.
+        """
+        for worker in self.table.forget_workers():
+            logger.warning(f"Worker {worker} stopped sending heartbeats.")
+
+        workers = self.table.live_workers()
+        if workers == self._workers:
+            return False
+
+        ring = HashRing(workers)
+        assignments = {user: ring.owner(user) for user in self.users} if workers else {}
+        previous = self.table.assignments()
+        self.table.assign(assignments)
+        self._workers = workers
+
+        moved = sum(
+            1 for user, worker in assignments.items() if previous.get(user) != worker
+        )
+        if not workers:
+            logger.warning("No live worker, waiting for one to join.")
+        else:
+            shares = ", ".join(
+                f"{worker}: {sum(1 for w in assignments.values() if w == worker)}"
+                for worker in workers
+            )
+            logger.info(f"Users assigned ({moved} moved). {shares}")
+        return True
+
+
+class ClusterWorker:
+    """
+    Keeps the users monitored by a daemon AsyncRecorderEngine in line with
+    the users assigned to this worker, holding a lease for each of them.
+
+    A user moved to another worker is paused at once, so that no new
+    recording starts, and handed over when its recording in progress ends.
+    """
+
+    def __init__(self, engine, table: LeaseTable, name: str):
+        self.engine = engine
+        self.table = table
+        self.name = name
+
+        self.held = set()  # users whose lease is ours
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "ClusterWorker":
+        self._thread = threading.Thread(
+            target=self._run, name="cluster-worker", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Cluster worker {self.name} joined {self.table.path}")
+        return self
+
+    def stop(self) -> None:
+        """
+        Leaves the cluster, so that the users are handed over right away.
+        Call it once the recordings ended.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.table.leave(self.name)
+        except sqlite3.Error as ex:
+            logger.error(f"Unable to leave the cluster: {ex}")
+        self.table.close()
+
+    def sync(self) -> None:
+        """
+        One round: heartbeat, then hand over and take over users.
+        """
+        self.table.heartbeat(self.name, self.held)
+        assigned = self.table.assigned_to(self.name)
+        engine = self.engine
+        recording, paused = engine.control(
+            lambda: (set(engine.recordings), set(engine.paused))
+        )
+
+        # taken over by another worker while this one was silent
+        for user in self.held - self.table.held_by(self.name):
+            engine.control(engine.remove_user, user)
+            self.held.discard(user)
+            logger.warning(f"@{user}: lease lost to another worker.")
+
+        for user in self.held & assigned & paused:
+            # assigned back before its recording ended
+            engine.control(engine.resume_user, user)
+
+        for user in self.held - assigned:
+            if user in recording:
+                if user not in paused:
+                    engine.control(engine.pause_user, user)
+                continue
+
+            engine.control(engine.remove_user, user)
+            self.table.release(user, self.name)
+            self.held.discard(user)
+            logger.info(f"@{user}: handed over to another worker.")
+
+        for user in assigned - self.held:
+            if self.table.acquire(user, self.name):
+                self.held.add(user)
+                engine.control(engine.add_user, user)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as ex:
+                logger.error(f"Cluster sync failed: {ex}")
+            self._stop.wait(HEARTBEAT_INTERVAL)
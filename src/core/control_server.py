@@ -0,0 +1,143 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from utils.custom_exceptions import TikTokRecorderError
+from utils.logger_manager import logger
+
+USER_PATH = re.compile(r"^/users/([^/]+)(?:/(pause|resume))?$")
+MAX_BODY = 64 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    GET    /users               monitored users and their state
+    GET    /recordings          recordings in progress
+    POST   /users               {"user": "name"} starts monitoring a user
+    DELETE /users/<name>        stops monitoring it and ends its recording
+    POST   /users/<name>/pause  stops checking it, a recording goes on
+    POST   /users/<name>/resume checks it again
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path not in ("/users", "/recordings"):
+            self._reply(404, {"error": "Not found."})
+            return
+
+        status = self._control(self.server.engine.status)
+        if status is not None:
+            self._reply(200, {path[1:]: status[path[1:]]})
+
+    def do_POST(self):
+        engine = self.server.engine
+        path = self.path.split("?", 1)[0]
+
+        if path == "/users":
+            user = self._read_user()
+            if user is None:
+                return
+            added = self._control(engine.add_user, user)
+            if added is True:
+                self._reply(201, {"user": user})
+            elif added is False:
+                self._reply(409, {"error": f"@{user} is already monitored."})
+            return
+
+        match = USER_PATH.match(path)
+        if match is None or match.group(2) is None:
+            self._reply(404, {"error": "Not found."})
+            return
+
+        user, action = unquote(match.group(1)).lstrip("@"), match.group(2)
+        method = engine.pause_user if action == "pause" else engine.resume_user
+        self._user_reply(user, self._control(method, user))
+
+    def do_DELETE(self):
+        match = USER_PATH.match(self.path.split("?", 1)[0])
+        if match is None or match.group(2) is not None:
+            self._reply(404, {"error": "Not found."})
+            return
+
+        user = unquote(match.group(1)).lstrip("@")
+        self._user_reply(user, self._control(self.server.engine.remove_user, user))
+
+    def _read_user(self) -> str | None:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                raise ValueError("body too large")
+            body = json.loads(self.rfile.read(length) or b"{}")
+            user = str(body.get("user") or "").lstrip("@").strip()
+        except (ValueError, AttributeError) as ex:
+            self._reply(400, {"error": f"Invalid request: {ex}"})
+            return None
+
+        if not user:
+            self._reply(400, {"error": 'Expected {"user": "name"}.'})
+            return None
+        return user
+
+    def _control(self, method, *args):
+        """
+        Runs an engine method on its event loop, replying with the error it
+        raised, if any.
+        """
+        try:
+            return self.server.engine.control(method, *args)
+        except TikTokRecorderError as ex:
+            self._reply(409, {"error": str(ex)})
+        except Exception as ex:
+            logger.error(f"Control request failed: {ex}", exc_info=ex)
+            self._reply(500, {"error": str(ex)})
+        return None
+
+    def _user_reply(self, user: str, found) -> None:
+        if found is True:
+            self._reply(200, {"user": user})
+        elif found is False:
+            self._reply(404, {"error": f"@{user} is not monitored."})
+
+    def _reply(self, code: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class ControlServer:
+    """
+    Serves the control API of a daemon engine from a daemon thread: JSON
+    over HTTP, on the loopback interface only by default.
+    """
+
+    def __init__(self, engine, port: int, host: str = "127.0.0.1"):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.engine = engine
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self) -> "ControlServer":
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="control", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            f"Control API served on http://{self.httpd.server_address[0]}:{self.port}"
+        )
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,219 @@
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from utils.custom_exceptions import TikTokRecorderError
+from utils.logger_manager import logger
+
+FOLLOWERS_FILE = "followers.json"
+
+
+class FollowersSync:
+    """
+    Accounts followed by the authenticated user, kept on disk and refreshed
+    by a background thread.
+
+    The followers list is ordered by follow date, so a refresh only reads
+    pages until it meets a known account. Unfollowed accounts only show up
+    in a full walk of the list, done every `full_sync` seconds; the cursor
+    of that walk is saved so that an interrupted walk resumes where it
+    stopped.
+
+    Changes are queued as (added, removed) sets and collected by changes(),
+    starting with the whole saved list.
+    """
+
+    SAVE_EVERY = 10  # pages of a full walk
+
+    def __init__(
+        self,
+        tiktok,
+        sec_uid: str,
+        interval: float,
+        full_sync: float,
+        page_size: int = 30,
+        path: str | None = FOLLOWERS_FILE,
+        changed: threading.Event | None = None,
+    ):
+        self.tiktok = tiktok
+        self.sec_uid = sec_uid
+        self.interval = interval
+        self.full_sync = full_sync
+        self.page_size = page_size
+        self.path = path
+
+        state = self._load().get(sec_uid, {})
+        self.followers = state.get("followers", {})  # username -> sec_uid
+        self._walk = state.get("walk")  # {"cursor", "seen"} of a full walk
+        self._last_full = state.get("last_full", 0)
+
+        self._changes = queue.Queue()
+        self._changed = changed or threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        if self.followers:
+            self._publish(set(self.followers), set())
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="followers-sync", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def wait(self, timeout: float) -> None:
+        """
+        Sleeps until the list changes, the `changed` event is set by someone
+        else or the timeout expires.
+        """
+        self._changed.wait(timeout)
+
+    def changes(self) -> tuple:
+        """
+        Returns the (added, removed) followers since the last call.
+        """
+        self._changed.clear()
+        added, removed = set(), set()
+        while True:
+            try:
+                new, gone = self._changes.get_nowait()
+            except queue.Empty:
+                return added, removed
+
+            added = (added - gone) | new
+            removed = (removed - new) | gone
+
+    def refresh(self) -> None:
+        full = (
+            not self.followers
+            or self._walk is not None
+            or time.time() - self._last_full >= self.full_sync
+        )
+        if full:
+            self._full_walk()
+        else:
+            self._incremental()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as ex:
+                logger.error(f"Unable to refresh the followers list: {ex}")
+            self._stop.wait(self.interval)
+
+    def _incremental(self) -> None:
+        added = {}
+        cursor = 0
+        while not self._stop.is_set():
+            page, has_more, next_cursor = self.tiktok.get_followers_page(
+                self.sec_uid, cursor, self.page_size
+            )
+            new = {
+                user: uid for user, uid in page.items() if user not in self.followers
+            }
+            added.update(new)
+
+            # the rest of the list is already known
+            if len(new) < len(page) or not has_more or next_cursor == cursor:
+                break
+            cursor = next_cursor
+
+        if added:
+            self.followers = {**added, **self.followers}
+            self._save()
+            self._publish(set(added), set())
+            logger.info(f"{len(added)} new followed accounts.")
+
+    def _full_walk(self) -> None:
+        if self._walk is None:
+            self._walk = {"cursor": 0, "seen": {}}
+        elif self._walk["cursor"]:
+            logger.info("Resuming the sync of the followers list...")
+
+        walk = self._walk
+        pages = 0
+        while True:
+            if self._stop.is_set():
+                self._save()
+                return
+
+            page, has_more, next_cursor = self.tiktok.get_followers_page(
+                self.sec_uid, walk["cursor"], self.page_size
+            )
+            walk["seen"].update(page)
+
+            # accounts met for the first time are checked right away
+            new = {
+                user: uid for user, uid in page.items() if user not in self.followers
+            }
+            if new:
+                self.followers.update(new)
+                self._publish(set(new), set())
+
+            pages += 1
+            if not page or not has_more or next_cursor == walk["cursor"]:
+                break
+
+            walk["cursor"] = next_cursor
+            if pages % self.SAVE_EVERY == 0:
+                self._save()
+
+        seen = walk["seen"]
+        self._walk = None
+        if not seen:
+            self._save()
+            raise TikTokRecorderError("Followers list is empty.")
+
+        removed = set(self.followers) - set(seen)
+        self.followers = {user: self.followers[user] for user in seen}
+        self._last_full = time.time()
+        self._save()
+
+        if removed:
+            self._publish(set(), removed)
+        logger.info(
+            f"Followers list synced: {len(self.followers)} accounts, "
+            f"{len(removed)} unfollowed."
+        )
+
+    def _publish(self, added: set, removed: set) -> None:
+        self._changes.put((added, removed))
+        self._changed.set()
+
+    def _load(self) -> dict:
+        if not self.path or not Path(self.path).exists():
+            return {}
+
+        try:
+            return json.loads(Path(self.path).read_text())
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Unable to read {self.path}: {ex}")
+            return {}
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+
+        # other accounts may share the file: merge before replacing it
+        data = self._load()
+        data[self.sec_uid] = {
+            "followers": self.followers,
+            "walk": self._walk,
+            "last_full": self._last_full,
+        }
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            Path(tmp_path).write_text(json.dumps(data))
+            os.replace(tmp_path, self.path)
+        except OSError as ex:
+            logger.warning(f"Unable to write {self.path}: {ex}")
@@ -0,0 +1,229 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils.logger_manager import logger
+from utils.utils import file_lock
+
+HISTORY_FILE = "live_history.json"
+HOURS_PER_WEEK = 7 * 24
+
+
+class LiveStatusScheduler:
+    """
+    Priority queue of monitored users keyed by their next check time.
+
+    Every user is polled at the base interval, more often around the hours
+    of the week in which they usually go live, and, with a
+    `max_dormant_factor` above 1, up to that many times less often while
+    they are dormant. The hours at which lives start are kept in a small JSON
+    history so that the schedule survives restarts.
+    """
+
+    MIN_INTERVAL = 30  # seconds
+    HOT_FACTOR = 0.5
+    HOT_SHARE = 0.1  # share of past lives started in the surrounding hours
+    DORMANT_AFTER = 7 * 24 * 3600  # seconds without lives
+    DORMANT_STEP = 12  # offline checks before the interval grows by one base
+
+    def __init__(
+        self,
+        base_interval: float,
+        history_path: str | None = HISTORY_FILE,
+        max_dormant_factor: int = 1,
+    ):
+        self.base_interval = base_interval
+        self.history_path = history_path
+        self.max_dormant_factor = max_dormant_factor
+
+        self._users = set()
+        self._queue = []  # (due, seq, user)
+        self._due = {}  # user -> due time of its valid queue entry
+        self._seq = itertools.count()
+        self._offline_checks = {}  # user -> consecutive offline checks
+        self._history = self._load_history()  # user -> {"starts", "last_live"}
+        self._lock = threading.Lock()
+
+    def __contains__(self, user: str) -> bool:
+        return user in self._users
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @property
+    def users(self) -> set:
+        return set(self._users)
+
+    def add(self, user: str, delay: float = 0, now: float | None = None) -> None:
+        """
+        Starts tracking a user (or reschedules it) with a check in `delay` seconds.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._users.add(user)
+            self._push(user, now + delay)
+
+    def remove(self, user: str) -> None:
+        with self._lock:
+            self._users.discard(user)
+            self._due.pop(user, None)
+
+    def pop_due(self, now: float | None = None) -> list:
+        """
+        Returns the users whose check is due. They stay tracked but are not
+        queued again until report() or add() is called for them.
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                due_time, _, user = heapq.heappop(self._queue)
+                if self._due.get(user) == due_time:
+                    del self._due[user]
+                    due.append(user)
+        return due
+
+    def next_due_in(self, now: float | None = None) -> float | None:
+        """
+        Seconds until the next check, None if nothing is queued.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._queue:
+                due_time, _, user = self._queue[0]
+                if self._due.get(user) == due_time:
+                    return max(0.0, due_time - now)
+                heapq.heappop(self._queue)
+        return None
+
+    def due_in(self, user: str, now: float | None = None) -> float | None:
+        """
+        Seconds until the next check of a user, None if it is not queued.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due_time = self._due.get(user)
+        return None if due_time is None else max(0.0, due_time - now)
+
+    def report(
+        self,
+        user: str,
+        is_live: bool,
+        room_id: str | None = None,
+        now: float | None = None,
+    ) -> float:
+        """
+        Records the result of a check. Offline users are queued again and the
+        delay before their next check is returned; live users are left out of
+        the queue until their recording ends.
+        """
+        now = time.time() if now is None else now
+
+        if is_live:
+            with self._lock:
+                self._offline_checks[user] = 0
+                history = self._record_live_start(user, room_id, now)
+            self._save_history(user, history)
+            return 0.0
+
+        with self._lock:
+            self._offline_checks[user] = self._offline_checks.get(user, 0) + 1
+            interval = self._interval_for(user, now)
+            if user in self._users:
+                self._push(user, now + interval)
+
+        return interval
+
+    def was_live(self, user: str) -> bool:
+        """
+        True if the last check reported for the user found it live.
+        """
+        with self._lock:
+            return self._offline_checks.get(user) == 0
+
+    def interval_for(self, user: str, now: float | None = None) -> float:
+        """
+        Polling interval in seconds for the user at the given time.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._interval_for(user, now)
+
+    def _interval_for(self, user: str, now: float) -> float:
+        history = self._history.get(user)
+
+        if history and self._is_hot(history["starts"], now):
+            return max(self.MIN_INTERVAL, self.base_interval * self.HOT_FACTOR)
+
+        if history and now - history["last_live"] < self.DORMANT_AFTER:
+            return self.base_interval
+
+        offline_checks = self._offline_checks.get(user, 0)
+        factor = min(self.max_dormant_factor, 1 + offline_checks // self.DORMANT_STEP)
+        return self.base_interval * factor
+
+    def _push(self, user: str, due_time: float) -> None:
+        self._due[user] = due_time
+        heapq.heappush(self._queue, (due_time, next(self._seq), user))
+
+    def _is_hot(self, starts: list, now: float) -> bool:
+        total = sum(starts)
+        if not total:
+            return False
+
+        hour = self._hour_of_week(now)
+        window = [(hour + offset) % HOURS_PER_WEEK for offset in (-1, 0, 1)]
+        hits = sum(starts[slot] for slot in window)
+
+        return hits >= max(1, total * self.HOT_SHARE)
+
+    @staticmethod
+    def _hour_of_week(timestamp: float) -> int:
+        local = time.localtime(timestamp)
+        return local.tm_wday * 24 + local.tm_hour
+
+    def _record_live_start(self, user: str, room_id: str | None, now: float) -> dict:
+        """
+        Updates the history of the user, under self._lock. Returns a copy
+        to save.
+        """
+        history = self._history.setdefault(
+            user, {"starts": [0] * HOURS_PER_WEEK, "last_live": 0, "room_id": None}
+        )
+
+        # a recording resumed on the same room is not a new live
+        if room_id is None or history.get("room_id") != room_id:
+            history["starts"][self._hour_of_week(now)] += 1
+        history["last_live"] = now
+        history["room_id"] = room_id
+        return {**history, "starts": list(history["starts"])}
+
+    def _load_history(self) -> dict:
+        if not self.history_path or not Path(self.history_path).exists():
+            return {}
+
+        try:
+            return json.loads(Path(self.history_path).read_text())
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Unable to read {self.history_path}: {ex}")
+            return {}
+
+    def _save_history(self, user: str, entry: dict) -> None:
+        if not self.history_path:
+            return
+
+        tmp_path = f"{self.history_path}.{os.getpid()}.tmp"
+        try:
+            # other processes may share the file: merge before replacing it,
+            # without letting them write in between
+            with file_lock(self.history_path):
+                history = self._load_history()
+                history[user] = entry
+                Path(tmp_path).write_text(json.dumps(history))
+                os.replace(tmp_path, self.history_path)
+        except OSError as ex:
+            logger.warning(f"Unable to write {self.history_path}: {ex}")
@@ -0,0 +1,80 @@
+import threading
+
+import requests
+
+from utils.logger_manager import logger
+
+
+class LiveWatcher:
+    """
+    Long-polls an event feed to learn about live starts within seconds,
+    instead of waiting for the next scheduled check.
+
+    The feed is asked with GET `url`?users=a,b&cursor=N&timeout=T and is
+    expected to hold the request until an event arrives or T seconds pass,
+    then answer {"cursor": N, "events": [{"user": ..., "room_id": ...}]}.
+    Events of the users returned by `users()` are passed to
+    `on_live(user, room_id)`.
+
+    The watcher only makes checks happen sooner: polling keeps running, so
+    an unreachable feed costs nothing but a retry every minute at most.
+    """
+
+    MIN_RETRY = 1  # seconds
+    MAX_RETRY = 60
+
+    def __init__(self, url: str, users, on_live, timeout: int = 30):
+        self.url = url
+        self.users = users
+        self.on_live = on_live
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="live-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        # a pending long poll is abandoned to the daemon thread
+        self._stop.set()
+
+    def _run(self) -> None:
+        cursor = None
+        retry = self.MIN_RETRY
+        while not self._stop.is_set():
+            try:
+                cursor = self._poll(cursor)
+                retry = self.MIN_RETRY
+            except (requests.RequestException, ValueError) as ex:
+                logger.warning(
+                    f"Live event feed unavailable ({ex}), retrying in {retry}s."
+                )
+                self._stop.wait(retry)
+                retry = min(retry * 2, self.MAX_RETRY)
+
+    def _poll(self, cursor):
+        users = self.users()
+        if not users:
+            self._stop.wait(self.MIN_RETRY)
+            return cursor
+
+        params = {"users": ",".join(sorted(users)), "timeout": self.timeout}
+        if cursor is not None:
+            params["cursor"] = cursor
+
+        response = self._session.get(self.url, params=params, timeout=self.timeout + 10)
+        response.raise_for_status()
+        data = response.json()
+
+        for event in data.get("events", []):
+            user = event.get("user")
+            if user in users and not self._stop.is_set():
+                logger.info(f"@{user} went live (event feed).")
+                self.on_live(user, event.get("room_id"))
+
+        return data.get("cursor", cursor)
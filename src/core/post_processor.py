@@ -0,0 +1,361 @@
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from utils.logger_manager import logger
+from utils.video_management import VideoManagement
+
+JOBS_FILE = "post_processing.db"
+JOB_LEASE = 60  # seconds a job stays with its process after its last renewal
+
+
+def _convert(file: str, bitrate: str | None) -> str | None:
+    # runs in a worker process
+    return VideoManagement.convert_flv_to_mp4(file, bitrate)
+
+
+class JobStore:
+    """
+    Post-processing jobs not completed yet, kept on disk so that they
+    survive a restart.
+
+    The file may be shared by several processes, e.g. one per user or two
+    instances started in the same directory: a job belongs to the process
+    that added or claimed it (`owner`, its host and pid) for as long as
+    that process renews its lease, and is only claimed by another one
+    after the lease expired.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, file TEXT, "
+                "bitrate TEXT, upload INTEGER, attempts INTEGER DEFAULT 0, "
+                "owner TEXT, expires REAL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                # a file written before the leases: its jobs are free
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN expires REAL DEFAULT 0")
+
+    def add(self, kind: str, file: str, bitrate=None, upload=False) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, file, bitrate, upload, owner, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, file, bitrate, int(upload), self.owner, self._expires()),
+            )
+        return cursor.lastrowid
+
+    def replace(self, job_id: int, kind: str, file: str) -> int:
+        """
+        Removes a job and adds the one that follows it, atomically.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, file, owner, expires) VALUES (?, ?, ?, ?)",
+                (kind, file, self.owner, self._expires()),
+            )
+        return cursor.lastrowid
+
+    def failed(self, job_id: int) -> int:
+        """
+        Counts a failed attempt and returns the number of attempts so far.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET attempts = attempts + 1 WHERE id = ?", (job_id,)
+            )
+            row = self._conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def remove(self, job_id: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def claim(self) -> list:
+        """
+        Takes over the jobs whose lease expired and returns them.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            jobs = self._conn.execute(
+                "SELECT id, kind, file, bitrate, upload FROM jobs "
+                "WHERE expires IS NULL OR expires <= ? ORDER BY id",
+                (now,),
+            ).fetchall()
+            claimed = []
+            for job in jobs:
+                # another process may have claimed it since the select
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET owner = ?, expires = ? "
+                    "WHERE id = ? AND (expires IS NULL OR expires <= ?)",
+                    (self.owner, self._expires(), job[0], now),
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(job)
+        return claimed
+
+    def renew(self) -> None:
+        """
+        Extends the lease of the jobs of this process.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET expires = ? WHERE owner = ?",
+                (self._expires(), self.owner),
+            )
+
+    def release(self) -> None:
+        """
+        Frees the jobs of this process, for the next start to take them.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET expires = 0 WHERE owner = ?", (self.owner,)
+            )
+
+    @staticmethod
+    def _expires() -> float:
+        return time.time() + JOB_LEASE
+
+
+class PostProcessor:
+    """
+    Converts and uploads finished recordings in the background, so that a
+    recording thread hands its files off and goes back to monitoring.
+
+    Conversions run in a bounded process pool, uploads in an event loop of
+    their own. Every job stays in the job store until it is done: the ones
+    interrupted by an exit are picked up by resume() at the next start, or
+    by a running process once their lease expired.
+    """
+
+    MAX_UPLOADS = 2
+    MAX_UPLOAD_ATTEMPTS = 3
+
+    _shared = None
+
+    def __init__(
+        self,
+        convert_workers: int = 1,
+        upload_workers: int | None = None,
+        jobs_file: str = JOBS_FILE,
+    ):
+        self.convert_workers = convert_workers
+        self.upload_workers = upload_workers
+        self.store = JobStore(jobs_file)
+
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._running = 0
+        self._convert_pool = None
+        self._loop = None
+        self._loop_thread = None
+        self._upload_slots = None
+        self._telegram = None
+        self._closed = threading.Event()
+        self._lease_thread = None
+
+    @classmethod
+    def shared(
+        cls, convert_workers: int = 1, upload_workers: int | None = None
+    ) -> "PostProcessor":
+        """
+        Instance shared by the recorders of this process.
+        """
+        # a forked child cannot use the pools of its parent
+        if cls._shared is None or cls._shared._pid != os.getpid():
+            cls._shared = cls(convert_workers, upload_workers)
+        return cls._shared
+
+    @classmethod
+    def shutdown_shared(cls, wait: bool = True) -> None:
+        if cls._shared is not None and cls._shared._pid == os.getpid():
+            cls._shared.shutdown(wait)
+            cls._shared = None
+
+    def convert(self, file: str, bitrate=None, upload=False) -> None:
+        job_id = self.store.add("convert", file, bitrate, upload)
+        self._submit_convert(job_id, file, bitrate, upload)
+
+    def upload(self, file: str) -> None:
+        job_id = self.store.add("upload", file)
+        self._submit_upload(job_id, file)
+
+    def resume(self) -> int:
+        """
+        Restarts the jobs left over by a previous run, or by another process
+        that stopped renewing them, and keeps looking for such jobs.
+        Returns the number of jobs restarted now.
+        """
+        resumed = self._resume()
+        self._keep_leases()
+        return resumed
+
+    def _resume(self) -> int:
+        jobs = self.store.claim()
+        for job_id, kind, file, bitrate, upload in jobs:
+            if not Path(file).exists():
+                logger.warning(f"Dropping the {kind} job of {file}: file not found.")
+                self.store.remove(job_id)
+            elif kind == "convert":
+                self._submit_convert(job_id, file, bitrate, bool(upload))
+            else:
+                self._submit_upload(job_id, file)
+
+        if jobs:
+            logger.info(f"Resumed {len(jobs)} post-processing jobs.")
+        return len(jobs)
+
+    def _keep_leases(self) -> None:
+        with self._lock:
+            if self._lease_thread is None:
+                self._lease_thread = threading.Thread(
+                    target=self._renew_leases, name="job-leases", daemon=True
+                )
+                self._lease_thread.start()
+
+    def _renew_leases(self) -> None:
+        while not self._closed.wait(JOB_LEASE / 3):
+            try:
+                self.store.renew()
+                self._resume()
+            except sqlite3.Error as ex:
+                logger.error(f"Unable to renew the post-processing jobs: {ex}")
+
+    def wait(self) -> None:
+        """
+        Blocks until every submitted job is done.
+        """
+        with self._lock:
+            if self._running:
+                logger.info(f"Waiting for {self._running} post-processing jobs...")
+            self._lock.wait_for(lambda: not self._running)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Without waiting, the running jobs are abandoned and resumed at the
+        next start.
+        """
+        if wait:
+            self.wait()
+
+        # what is left is for the next start
+        self._closed.set()
+        try:
+            self.store.release()
+        except sqlite3.Error as ex:
+            logger.warning(f"Unable to release the post-processing jobs: {ex}")
+
+        if self._convert_pool is not None:
+            self._convert_pool.shutdown(wait=wait, cancel_futures=not wait)
+
+        if self._loop is not None:
+            if self._telegram is not None:
+                future = self._run_in_loop(self._telegram.close())
+                try:
+                    future.result(timeout=10)
+                except Exception as ex:
+                    logger.warning(f"Unable to close the Telegram client: {ex}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _started(self) -> None:
+        with self._lock:
+            self._running += 1
+        self._keep_leases()
+
+    def _finished(self) -> None:
+        with self._lock:
+            self._running -= 1
+            self._lock.notify_all()
+
+    def _submit_convert(self, job_id, file, bitrate, upload) -> None:
+        if self._convert_pool is None:
+            # spawn: forking a process with recording threads is not safe
+            self._convert_pool = ProcessPoolExecutor(
+                self.convert_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+        self._started()
+        future = self._convert_pool.submit(_convert, file, bitrate)
+        future.add_done_callback(lambda f: self._on_converted(f, job_id, file, upload))
+
+    def _on_converted(self, future, job_id, file, upload) -> None:
+        interrupted = future.cancelled()
+        output = None
+        if not interrupted:
+            try:
+                output = future.result()
+            except BrokenProcessPool:
+                interrupted = True  # the worker was killed, e.g. by Ctrl-C
+            except Exception as ex:
+                logger.error(f"Conversion of {file} failed: {ex}")
+
+        try:
+            if interrupted:
+                return  # resumed at the next start
+
+            if output and upload:
+                upload_id = self.store.replace(job_id, "upload", output)
+                self._submit_upload(upload_id, output)
+            else:
+                # a failed conversion keeps its FLV file, nothing to retry
+                self.store.remove(job_id)
+        finally:
+            self._finished()
+
+    def _submit_upload(self, job_id, file) -> None:
+        self._started()
+        self._run_in_loop(self._upload(job_id, file))
+
+    def _run_in_loop(self, coroutine):
+        # asyncio is only loaded by the first upload, not at startup
+        import asyncio
+
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._upload_slots = asyncio.Semaphore(self.MAX_UPLOADS)
+            self._loop_thread = threading.Thread(
+                target=self._loop.run_forever, name="uploads", daemon=True
+            )
+            self._loop_thread.start()
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _upload(self, job_id, file) -> None:
+        try:
+            async with self._upload_slots:
+                if self._telegram is None:
+                    from upload.telegram import UPLOAD_WORKERS, Telegram
+
+                    self._telegram = Telegram(self.upload_workers or UPLOAD_WORKERS)
+
+                if await self._telegram.upload_async(file):
+                    self.store.remove(job_id)
+                elif self.store.failed(job_id) >= self.MAX_UPLOAD_ATTEMPTS:
+                    logger.error(f"Giving up uploading {file}.")
+                    self.store.remove(job_id)
+                else:
+                    logger.warning(f"Upload of {file} will be retried at next start.")
+
+        except Exception as ex:
+            logger.error(f"Upload of {file} failed: {ex}", exc_info=True)
+
+        finally:
+            self._finished()
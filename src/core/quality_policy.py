@@ -0,0 +1,207 @@
+import threading
+import time
+from typing import NamedTuple
+
+from utils.logger_manager import logger
+
+SMOOTHING = 0.3  # weight of the last sample in the measured throughput
+MEASURE_INTERVAL = 5  # seconds between throughput samples
+REALLOCATE_CHANGE = 0.2  # relative throughput change that triggers a new plan
+UPGRADE_INTERVAL = 60  # seconds a stream keeps its quality before an upgrade
+
+# bits per second of a quality neither measured nor announced
+DEFAULT_BITRATES = {
+    "origin": 4_000_000,
+    "uhd": 3_000_000,
+    "hd": 2_000_000,
+    "sd": 1_000_000,
+    "ld": 500_000,
+    "ao": 100_000,
+}
+DEFAULT_BITRATE = 2_000_000
+
+
+class StreamOption(NamedTuple):
+    sdk_key: str
+    level: int  # higher is better
+    bitrate: int | None  # bits per second announced by TikTok
+    urls: list  # FLV streams, main CDN edge first
+    hls_urls: list = []  # HLS playlists, main CDN edge first
+
+
+class _Stream:
+    def __init__(self, user: str, priority: int):
+        self.user = user
+        self.priority = priority
+        self.options = []  # best first
+        self.choice = None  # sdk_key assigned by the last plan
+        self.current = None  # sdk_key being recorded
+        self.switched_at = 0.0
+
+        self.bitrate = None  # measured bits per second
+        self.planned_bitrate = None  # measured bitrate the plan was made with
+        self._bytes = None
+        self._sampled_at = 0.0
+
+    def level(self, sdk_key) -> int:
+        return next((o.level for o in self.options if o.sdk_key == sdk_key), -1)
+
+
+class QualityPolicy:
+    """
+    Shares a download bandwidth budget among the recorded streams by
+    picking a quality for each of them.
+
+    Every stream starts from its lowest quality, then the budget left is
+    spent on upgrades one level at a time: highest priority first, in
+    turns among equal priorities. The cost of a quality is the throughput
+    measured while it was recorded, else the bitrate announced by TikTok,
+    else a typical value for its name.
+
+    The plan is made again when a stream starts or ends and when a measured
+    throughput changes, and should_switch() tells the recorders of running
+    streams to reconnect at their new quality: downgrades right away,
+    upgrades once the quality was kept for a while.
+    """
+
+    def __init__(self, budget: float, priorities: dict | None = None):
+        self.budget = budget  # bits per second
+        self.priorities = priorities or {}
+
+        self._streams = {}  # user -> _Stream
+        self._measured = {}  # (user, sdk_key) -> bits per second
+        self._lock = threading.Lock()
+
+    def choose(self, user: str, options: list, switch: bool = True) -> StreamOption:
+        """
+        Returns the option to record for the user. Without `switch`, the
+        quality being recorded is kept if it is still offered.
+        """
+        with self._lock:
+            stream = self._streams.get(user)
+            if stream is None:
+                stream = _Stream(user, self.priorities.get(user, 1))
+                self._streams[user] = stream
+
+            stream.options = sorted(options, key=lambda o: o.level, reverse=True)
+            self._plan()
+
+            sdk_key = stream.choice
+            if not switch and stream.level(stream.current) >= 0:
+                sdk_key = stream.current
+            option = next(o for o in stream.options if o.sdk_key == sdk_key)
+
+            if option.sdk_key != stream.current:
+                if stream.current is not None:
+                    logger.info(
+                        f"@{user}: switching quality from {stream.current} to "
+                        f"{option.sdk_key} to fit the bandwidth budget."
+                    )
+                stream.current = option.sdk_key
+                stream.switched_at = time.monotonic()
+                stream.bitrate = stream._bytes = None
+            return option
+
+    def release(self, user: str) -> None:
+        """
+        Gives the bandwidth of a finished recording back to the others.
+        """
+        with self._lock:
+            if self._streams.pop(user, None) is not None:
+                self._plan()
+
+    def update(self, user: str, bytes_received: int) -> None:
+        """
+        Samples the throughput of a stream from its byte counter.
+        """
+        with self._lock:
+            stream = self._streams.get(user)
+            if stream is None:
+                return
+
+            now = time.monotonic()
+            if stream._bytes is None or bytes_received < stream._bytes:
+                stream._bytes, stream._sampled_at = bytes_received, now
+                return
+
+            elapsed = now - stream._sampled_at
+            if elapsed < MEASURE_INTERVAL:
+                return
+
+            rate = (bytes_received - stream._bytes) * 8 / elapsed
+            stream._bytes, stream._sampled_at = bytes_received, now
+            if stream.bitrate is None:
+                stream.bitrate = rate
+            else:
+                stream.bitrate += SMOOTHING * (rate - stream.bitrate)
+            self._measured[(user, stream.current)] = stream.bitrate
+
+            planned = stream.planned_bitrate
+            if planned is None or abs(stream.bitrate - planned) > (
+                REALLOCATE_CHANGE * planned
+            ):
+                self._plan()
+
+    def should_switch(self, user: str) -> bool:
+        """
+        True when the stream should be reopened at the quality of the plan.
+        """
+        with self._lock:
+            stream = self._streams.get(user)
+            if stream is None or stream.choice == stream.current:
+                return False
+
+            if stream.level(stream.choice) < stream.level(stream.current):
+                return True
+            return time.monotonic() - stream.switched_at >= UPGRADE_INTERVAL
+
+    def stats(self) -> dict:
+        """
+        Returns the quality and measured bitrate of every stream.
+        """
+        with self._lock:
+            return {
+                user: {
+                    "quality": stream.current,
+                    "planned": stream.choice,
+                    "priority": stream.priority,
+                    "kbps": None
+                    if stream.bitrate is None
+                    else round(stream.bitrate / 1e3),
+                }
+                for user, stream in self._streams.items()
+            }
+
+    def _cost(self, stream: _Stream, index: int) -> float:
+        option = stream.options[index]
+        measured = self._measured.get((stream.user, option.sdk_key))
+        return (
+            measured
+            or option.bitrate
+            or DEFAULT_BITRATES.get(option.sdk_key, DEFAULT_BITRATE)
+        )
+
+    def _plan(self) -> None:
+        streams = [stream for stream in self._streams.values() if stream.options]
+        choice = {stream.user: len(stream.options) - 1 for stream in streams}
+        used = sum(self._cost(stream, choice[stream.user]) for stream in streams)
+
+        for priority in sorted({stream.priority for stream in streams}, reverse=True):
+            group = [stream for stream in streams if stream.priority == priority]
+            upgraded = True
+            while upgraded:
+                upgraded = False
+                for stream in group:
+                    index = choice[stream.user]
+                    if index == 0:
+                        continue
+
+                    extra = self._cost(stream, index - 1) - self._cost(stream, index)
+                    if used + extra <= self.budget:
+                        choice[stream.user] = index - 1
+                        used += extra
+                        upgraded = True
+
+        for stream in streams:
+            stream.choice = stream.options[choice[stream.user]].sdk_key
+            stream.planned_bitrate = stream.bitrate
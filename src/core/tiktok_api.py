@@ -1,29 +1,191 @@
+import hashlib
 import json
 import re
+import time
+from urllib.parse import urlparse
 
-from http_utils.http_client import HttpClient
+from requests.exceptions import ProxyError
+
+from core.quality_policy import QualityPolicy, StreamOption
+from http_utils.client_pool import HttpClientPool
+from http_utils.proxy_pool import ProxyPool
 from utils.enums import StatusCode, TikTokError
+from utils.cache import SQLiteStore, TTLCache
 from utils.logger_manager import logger
+from utils.metrics import REGISTRY
+from utils.rate_limiter import RateLimiter
 from utils.custom_exceptions import (
     UserLiveError,
     TikTokRecorderError,
     LiveNotFound,
 )
 
+API_REQUESTS = REGISTRY.counter(
+    "tiktok_api_requests_total",
+    "Requests sent to TikTok, by endpoint and HTTP status.",
+    ("endpoint", "status"),
+)
+API_LATENCY = REGISTRY.histogram(
+    "tiktok_api_request_seconds",
+    "Latency of the requests sent to TikTok, by endpoint.",
+    ("endpoint",),
+)
+
 
 class TikTokAPI:
-    def __init__(self, proxy, cookies):
+    ROOM_ID_TTL = 60 * 60
+    SEC_UID_TTL = 7 * 24 * 60 * 60
+    OWNER_TTL = 24 * 60 * 60
+
+    def __init__(
+        self,
+        proxy,
+        cookies,
+        rate_limiter: RateLimiter | None = None,
+        cache_store: SQLiteStore | None = None,
+        client_pool: HttpClientPool | None = None,
+        proxy_pool: ProxyPool | None = None,
+        quality_policy: QualityPolicy | None = None,
+    ):
         self.BASE_URL = "https://www.tiktok.com"
         self.WEBCAST_URL = "https://webcast.tiktok.com"
         self.API_URL = "https://www.tiktok.com/api-live/user/room/"
         self.EULER_API = "https://tiktok.eulerstream.com"
         self.TIKREC_API = "https://tikrec.com"
 
-        self.http_client = HttpClient(proxy, cookies).req
-        self._http_client_stream = HttpClient(proxy, cookies).req_stream
+        self.cookies = cookies
+        # sessions shared with the other instances using the same proxy and
+        # cookies, so that their connections are reused
+        self.client_pool = client_pool or HttpClientPool.shared()
+        client = self.client_pool.get(proxy, cookies)
+        self.http_client = client.req
+        self._http_client_stream = client.req_stream
+
+        # when set, the polling requests are routed over these proxies
+        # while the stream is downloaded directly
+        self.proxy_pool = proxy_pool
+        self._ms_token = None
+
+        # when set, the quality of every stream fits a shared bandwidth budget
+        self.quality_policy = quality_policy
+
+        # shared budget for the live-status polling requests
+        self.rate_limiter = rate_limiter
+
+        # username -> room_id, username -> sec_uid, room_id -> owner username.
+        # A cached room_id must be invalidated once its room is no longer live
+        self.room_id_cache = TTLCache("room_id", self.ROOM_ID_TTL, store=cache_store)
+        self.sec_uid_cache = TTLCache("sec_uid", self.SEC_UID_TTL, store=cache_store)
+        self.owner_cache = TTLCache("owner", self.OWNER_TTL, store=cache_store)
+        self._session_key = hashlib.sha1(
+            json.dumps(cookies or {}, sort_keys=True).encode()
+        ).hexdigest()
+
+    def _throttle(self, requests: int = 1) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(requests)
+
+    def clone(self, proxy=None) -> "TikTokAPI":
+        """
+        Returns an API going through another proxy (or a direct connection)
+        that shares the rate limiter and the caches of this one.
+        """
+        api = TikTokAPI(
+            proxy=proxy,
+            cookies=self.cookies,
+            rate_limiter=self.rate_limiter,
+            client_pool=self.client_pool,
+            quality_policy=self.quality_policy,
+        )
+        api.room_id_cache = self.room_id_cache
+        api.sec_uid_cache = self.sec_uid_cache
+        api.owner_cache = self.owner_cache
+        return api
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the hit/miss counters of every cache.
+        """
+        return {
+            cache.name: cache.stats()
+            for cache in (self.room_id_cache, self.sec_uid_cache, self.owner_cache)
+        }
+
+    def connection_stats(self) -> dict:
+        """
+        Returns the reuse counters of the shared HTTP clients.
+        """
+        return self.client_pool.stats()
+
+    def proxy_stats(self) -> dict:
+        """
+        Returns the latency, error and WAF counters of every proxy.
+        """
+        return self.proxy_pool.stats() if self.proxy_pool is not None else {}
+
+    def quality_stats(self) -> dict:
+        """
+        Returns the quality and measured bitrate of every recorded stream.
+        """
+        return self.quality_policy.stats() if self.quality_policy is not None else {}
+
+    def _get(self, url: str, **kwargs):
+        """
+        Sends a request through the best proxy of the pool, if there is one.
+        """
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = self._send(url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self._observe(url, status, start)
+
+    def _observe(self, url: str, status, start: float) -> None:
+        """
+        Records a request in the API metrics, for both engines.
+        """
+        endpoint = self._endpoint(url)
+        API_REQUESTS.inc(endpoint=endpoint, status=status)
+        API_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+
+    @staticmethod
+    def _endpoint(url: str) -> str:
+        # one series for all the user pages
+        path = urlparse(url).path
+        return re.sub(r"^/@[^/]+", "/@user", path)
+
+    def _send(self, url: str, **kwargs):
+        if self.proxy_pool is None:
+            return self.http_client.get(url, **kwargs)
+
+        # a failing proxy hands the request over to the next one
+        tried = set()
+        error = ProxyError("No usable proxy in the pool.")
+        while (proxy := self.proxy_pool.choose(exclude=tried)) is not None:
+            tried.add(proxy)
+            start = time.monotonic()
+            try:
+                client = self.client_pool.get(proxy, self.cookies)
+                if not client.proxy_usable:
+                    self.proxy_pool.report_error(proxy)
+                    continue
+
+                response = client.req.get(url, **kwargs)
+            except Exception as ex:
+                self.proxy_pool.report_error(proxy)
+                logger.debug(f"Request through {proxy} failed: {ex}")
+                error = ex
+                continue
+
+            self.proxy_pool.report(proxy, response, time.monotonic() - start)
+            return response
+
+        raise error
 
     def _is_authenticated(self) -> bool:
-        response = self.http_client.get(f"{self.BASE_URL}/foryou")
+        response = self._get(f"{self.BASE_URL}/foryou")
         response.raise_for_status()
 
         content = response.text
@@ -33,36 +195,80 @@ class TikTokAPI:
         """
         Checks if the user is in a blacklisted country that requires login
         """
-        response = self.http_client.get(f"{self.BASE_URL}/live", allow_redirects=False)
+        response = self._get(f"{self.BASE_URL}/live", allow_redirects=False)
 
         return response.status_code == StatusCode.REDIRECT
 
-    def is_room_alive(self, room_id: str) -> bool:
+    def is_room_alive(self, room_id: str, throttle: bool = True) -> bool:
         """
         Checking whether the user is live.
         """
         if not room_id:
             raise UserLiveError(TikTokError.USER_NOT_CURRENTLY_LIVE)
 
-        data = self.http_client.get(
+        alive = self.check_rooms_alive([room_id], throttle=throttle)
+        return alive.get(str(room_id), False)
+
+    def check_rooms_alive(
+        self, room_ids: list, chunk_size: int = 50, throttle: bool = True
+    ) -> dict:
+        """
+        Checking whether many rooms are live, `chunk_size` rooms per request.
+        Returns a dict room_id -> alive. The rate limit is meant for the
+        polling: a recording checking its own room passes throttle=False.
+        """
+        room_ids = list(dict.fromkeys(str(room_id) for room_id in room_ids if room_id))
+
+        alive = {}
+        for chunk in self._chunks(room_ids, chunk_size):
+            if throttle:
+                self._throttle()
+            data = self._get(self._check_alive_url(chunk)).json()
+            alive.update(self._parse_rooms_alive(data, chunk))
+
+        return alive
+
+    @staticmethod
+    def _chunks(items: list, size: int) -> list:
+        return [items[i : i + size] for i in range(0, len(items), size)]
+
+    def _check_alive_url(self, room_ids: list) -> str:
+        return (
             f"{self.WEBCAST_URL}/webcast/room/check_alive/"
-            f"?aid=1988&region=CH&room_ids={room_id}&user_is_login=true"
-        ).json()
+            f"?aid=1988&region=CH&room_ids={','.join(room_ids)}&user_is_login=true"
+        )
+
+    @staticmethod
+    def _parse_rooms_alive(data: dict, room_ids: list) -> dict:
+        alive = dict.fromkeys(room_ids, False)
+
+        entries = data.get("data") or []
+        for position, entry in enumerate(entries):
+            room_id = entry.get("room_id_str") or str(entry.get("room_id") or "")
+            if not room_id and position < len(room_ids):
+                # entries without id are returned in request order
+                room_id = room_ids[position]
 
-        if "data" not in data or len(data["data"]) == 0:
-            return False
+            if room_id in alive:
+                alive[room_id] = entry.get("alive", False)
 
-        return data["data"][0].get("alive", False)
+        return alive
 
     def get_sec_uid(self):
         """
         Returns the sec_uid of the authenticated user.
         """
-        response = self.http_client.get(f"{self.BASE_URL}/foryou")
+        # the authenticated user is identified by its cookies
+        sec_uid = self.sec_uid_cache.get(self._session_key)
+        if sec_uid is not None:
+            return sec_uid
+
+        response = self._get(f"{self.BASE_URL}/foryou")
 
         sec_uid = re.search('"secUid":"(.*?)",', response.text)
         if sec_uid:
             sec_uid = sec_uid.group(1)
+            self.sec_uid_cache.set(self._session_key, sec_uid)
 
         return sec_uid
 
@@ -70,7 +276,11 @@ class TikTokAPI:
         """
         Given a room_id, I get the username
         """
-        data = self.http_client.get(
+        display_id = self.owner_cache.get(str(room_id))
+        if display_id is not None:
+            return display_id
+
+        data = self._get(
             f"{self.WEBCAST_URL}/webcast/room/info/?aid=1988&room_id={room_id}"
         ).json()
 
@@ -84,13 +294,14 @@ class TikTokAPI:
         if display_id is None:
             raise TikTokRecorderError(TikTokError.USERNAME_ERROR)
 
+        self.owner_cache.set(str(room_id), display_id)
         return display_id
 
     def get_room_and_user_from_url(self, live_url: str):
         """
         Given a url, get user and room_id.
         """
-        response = self.http_client.get(live_url, allow_redirects=False)
+        response = self._get(live_url, allow_redirects=False)
         content = response.text
 
         if response.status_code == StatusCode.REDIRECT:
@@ -115,7 +326,7 @@ class TikTokAPI:
     def _old_get_room_id_from_user(self, user: str) -> str:
         params = {"uniqueId": user, "giftInfo": "false"}
 
-        response = self.http_client.get(
+        response = self._get(
             f"{self.EULER_API}/webcast/room_info",
             params=params,
             headers={"x-api-key": ""},
@@ -133,103 +344,172 @@ class TikTokAPI:
         return room_id
 
     def _tikrec_get_room_id_signed_url(self, user: str) -> str:
-        response = self.http_client.get(
+        response = self._get(
             f"{self.TIKREC_API}/tiktok/room/api/sign",
             params={"unique_id": user},
         )
 
-        data = response.json()
+        return self._parse_signed_url(response.json())
 
+    def _parse_signed_url(self, data: dict) -> str:
         signed_path = data.get("signed_path")
         return f"{self.BASE_URL}{signed_path}"
 
     def get_room_id_from_user(self, user: str) -> str | None:
         """Given a username, get the room_id."""
+        room_id = self.room_id_cache.get(user)
+        if room_id is not None:
+            return room_id
+
+        self._throttle(2)
         signed_url = self._tikrec_get_room_id_signed_url(user)
 
-        response = self.http_client.get(signed_url)
-        content = response.text
+        response = self._get(signed_url)
 
+        room_id = self._parse_room_id(response.text)
+        if room_id:
+            self.room_id_cache.set(user, room_id)
+
+        return room_id
+
+    def invalidate_room_id(self, user: str) -> None:
+        """
+        Forgets the cached room_id of a user whose live just ended,
+        the next live will have a new one.
+        """
+        self.room_id_cache.invalidate(user)
+
+    @staticmethod
+    def _parse_room_id(content: str) -> str | None:
         if not content or "Please wait" in content:
             raise UserLiveError(TikTokError.WAF_BLOCKED)
 
-        data = response.json()
+        data = json.loads(content)
         return (data.get("data") or {}).get("user", {}).get("roomId")
 
-    def get_followers_list(self, sec_uid) -> list:
+    def get_followers_list(self, sec_uid, page_size: int = 5) -> list:
         """
         Returns all followers for the authenticated user by paginating
         """
-        followers = []
+        followers = {}  # username -> sec_uid
         cursor = 0
         has_more = True
 
-        ms_token = self.http_client.get(
-            f"{self.BASE_URL}/api/user/list/?"
-            "WebIdLastTime=1747672102&aid=1988&app_language=it-IT&app_name=tiktok_web&"
-            "browser_language=it-IT&browser_name=Mozilla&browser_online=true&"
-            "browser_platform=Linux%20x86_64&"
-            "browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F140.0.0.0%20Safari%2F537.36&"
-            "channel=tiktok_web&cookie_enabled=true&count=5&data_collection_enabled=true&"
-            "device_id=7506194516308166166&device_platform=web_pc&focus_state=true&"
-            "from_page=user&history_len=3&is_fullscreen=false&is_page_visible=true&"
-            "maxCursor=0&minCursor=0&odinId=7246312836442604570&os=linux&priority_region=IT&"
-            "referer=&region=IT&root_referer=https%3A%2F%2Fwww.tiktok.com%2Flive&scene=21&"
-            "screen_height=1080&screen_width=1920&tz_name=Europe%2FRome&user_is_login=true&"
-            "verifyFp=verify_mh4yf0uq_rdjp1Xwt_OoTk_4Jrf_AS8H_sp31opbnJFre&webcast_language=it-IT&"
-            "msToken=GphHoLvRR4QxA5AWVwDkrs3AbumoK5H8toE8LVHtj6cce3ToGdXhMfvDWzOXG-0GXUWoaGVHrwGNA4k_NnjuFFnHgv2S5eMjsvtkAhwMPa13xLmvP7tumx0KreFjPwTNnOj-BvAkPdO5Zrev3hoFBD9lHVo=&X-Bogus=&X-Gnarly="
-        ).cookies["msToken"]
-
         while has_more:
-            url = (
-                "https://www.tiktok.com/api/user/list/?"
-                "WebIdLastTime=1747672102&aid=1988&app_language=it-IT&app_name=tiktok_web"
-                "&browser_language=it-IT&browser_name=Mozilla&browser_online=true"
-                "&browser_platform=Linux%20x86_64&browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F140.0.0.0%20Safari%2F537.36&channel=tiktok_web&"
-                "cookie_enabled=true&count=5&data_collection_enabled=true&device_id=7506194516308166166"
-                "&device_platform=web_pc&focus_state=true&from_page=user&history_len=3&"
-                f"is_fullscreen=false&is_page_visible=true&maxCursor={cursor}&minCursor={cursor}&"
-                "odinId=7246312836442604570&os=linux&priority_region=IT&referer=&"
-                "region=IT&scene=21&screen_height=1080&screen_width=1920"
-                "&tz_name=Europe%2FRome&user_is_login=true&"
-                f"secUid={sec_uid}&verifyFp=verify_mh4yf0uq_rdjp1Xwt_OoTk_4Jrf_AS8H_sp31opbnJFre&"
-                f"webcast_language=it-IT&msToken={ms_token}&X-Bogus=&X-Gnarly="
+            page, has_more, new_cursor = self.get_followers_page(
+                sec_uid, cursor, page_size
             )
+            followers.update(page)
 
-            response = self.http_client.get(url)
+            if new_cursor == cursor:
+                break
 
-            if response.status_code != StatusCode.OK:
-                raise TikTokRecorderError("Failed to retrieve followers list.")
+            cursor = new_cursor
 
-            if not response.content:
-                raise TikTokRecorderError("Empty response from TikTok followers API.")
+        if not followers:
+            raise TikTokRecorderError("Followers list is empty.")
 
-            data = response.json()
-            user_list = data.get("userList", [])
+        return list(followers)
 
-            for user in user_list:
-                username = user.get("user", {}).get("uniqueId")
-                if username:
-                    followers.append(username)
+    def get_followers_page(self, sec_uid, cursor: int = 0, count: int = 5):
+        """
+        Returns a page of the followers list, most recent follows first:
+        ({username: sec_uid}, has_more, next cursor).
+        """
+        url = (
+            f"{self.BASE_URL}/api/user/list/?"
+            "WebIdLastTime=1747672102&aid=1988&app_language=it-IT&app_name=tiktok_web"
+            "&browser_language=it-IT&browser_name=Mozilla&browser_online=true"
+            "&browser_platform=Linux%20x86_64&browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F140.0.0.0%20Safari%2F537.36&channel=tiktok_web&"
+            f"cookie_enabled=true&count={count}&data_collection_enabled=true&device_id=7506194516308166166"
+            "&device_platform=web_pc&focus_state=true&from_page=user&history_len=3&"
+            f"is_fullscreen=false&is_page_visible=true&maxCursor={cursor}&minCursor={cursor}&"
+            "odinId=7246312836442604570&os=linux&priority_region=IT&referer=&"
+            "region=IT&scene=21&screen_height=1080&screen_width=1920"
+            "&tz_name=Europe%2FRome&user_is_login=true&"
+            f"secUid={sec_uid}&verifyFp=verify_mh4yf0uq_rdjp1Xwt_OoTk_4Jrf_AS8H_sp31opbnJFre&"
+            f"webcast_language=it-IT&msToken={self._get_ms_token()}&X-Bogus=&X-Gnarly="
+        )
 
-            has_more = data.get("hasMore", False)
-            new_cursor = data.get("minCursor", 0)
+        response = self._get(url)
 
-            if new_cursor == cursor:
-                break
+        if response.status_code != StatusCode.OK:
+            self._ms_token = None  # may have expired
+            raise TikTokRecorderError("Failed to retrieve followers list.")
 
-            cursor = new_cursor
+        if not response.content:
+            self._ms_token = None
+            raise TikTokRecorderError("Empty response from TikTok followers API.")
 
-        if not followers:
-            raise TikTokRecorderError("Followers list is empty.")
+        data = response.json()
+
+        followers = {}
+        for user in data.get("userList", []):
+            username = user.get("user", {}).get("uniqueId")
+            if username:
+                followers[username] = user.get("user", {}).get("secUid")
 
-        return followers
+        self.sec_uid_cache.set_many(
+            {username: uid for username, uid in followers.items() if uid}
+        )
+
+        return followers, data.get("hasMore", False), data.get("minCursor", 0)
+
+    def _get_ms_token(self) -> str:
+        # fetched once, then reused by every page until a request fails
+        if self._ms_token is None:
+            self._ms_token = self._get(
+                f"{self.BASE_URL}/api/user/list/?"
+                "WebIdLastTime=1747672102&aid=1988&app_language=it-IT&app_name=tiktok_web&"
+                "browser_language=it-IT&browser_name=Mozilla&browser_online=true&"
+                "browser_platform=Linux%20x86_64&"
+                "browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F140.0.0.0%20Safari%2F537.36&"
+                "channel=tiktok_web&cookie_enabled=true&count=5&data_collection_enabled=true&"
+                "device_id=7506194516308166166&device_platform=web_pc&focus_state=true&"
+                "from_page=user&history_len=3&is_fullscreen=false&is_page_visible=true&"
+                "maxCursor=0&minCursor=0&odinId=7246312836442604570&os=linux&priority_region=IT&"
+                "referer=&region=IT&root_referer=https%3A%2F%2Fwww.tiktok.com%2Flive&scene=21&"
+                "screen_height=1080&screen_width=1920&tz_name=Europe%2FRome&user_is_login=true&"
+                "verifyFp=verify_mh4yf0uq_rdjp1Xwt_OoTk_4Jrf_AS8H_sp31opbnJFre&webcast_language=it-IT&"
+                "msToken=GphHoLvRR4QxA5AWVwDkrs3AbumoK5H8toE8LVHtj6cce3ToGdXhMfvDWzOXG-0GXUWoaGVHrwGNA4k_NnjuFFnHgv2S5eMjsvtkAhwMPa13xLmvP7tumx0KreFjPwTNnOj-BvAkPdO5Zrev3hoFBD9lHVo=&X-Bogus=&X-Gnarly="
+            ).cookies["msToken"]
+        return self._ms_token
 
     def get_live_url(self, room_id: str) -> str | None:
         """
         Return the cdn (flv or m3u8) of the streaming
         """
-        data = self.http_client.get(
+        live_urls = self.get_live_urls(room_id)
+        return live_urls[0] if live_urls else None
+
+    def get_live_urls(
+        self, room_id: str, user=None, switch: bool = True, protocol: str = "flv"
+    ) -> list:
+        """
+        Returns the pull URLs of a quality of the room, FLV streams or HLS
+        playlists according to `protocol`: the main CDN edge first, then
+        the backup one when the room has it.
+
+        The best quality is picked, unless a quality policy shares the
+        bandwidth among the recordings: it then picks for `user`, see
+        QualityPolicy.choose().
+        """
+        options = self.get_stream_options(room_id)
+        if protocol == "hls":
+            options = [option._replace(urls=option.hls_urls) for option in options]
+        options = [option for option in options if option.urls]
+        if not options:
+            return []
+
+        if self.quality_policy is not None and user is not None:
+            return self.quality_policy.choose(user, options, switch=switch).urls
+        return options[0].urls
+
+    def get_stream_options(self, room_id: str) -> list:
+        """
+        Returns the qualities offered by the room, best first.
+        """
+        data = self._get(
             f"{self.WEBCAST_URL}/webcast/room/info/?aid=1988&room_id={room_id}"
         ).json()
 
@@ -247,13 +527,25 @@ class TikTokAPI:
             logger.warning(
                 "No SDK stream data found. Falling back to legacy URLs. Consider contacting the developer to update the code."
             )
-            return (
+            live_url = (
                 stream_url.get("flv_pull_url", {}).get("FULL_HD1")
                 or stream_url.get("flv_pull_url", {}).get("HD1")
                 or stream_url.get("flv_pull_url", {}).get("SD2")
                 or stream_url.get("flv_pull_url", {}).get("SD1")
                 or stream_url.get("rtmp_pull_url", "")
             )
+            hls_url = stream_url.get("hls_pull_url")
+            if not live_url and not hls_url:
+                return []
+            return [
+                StreamOption(
+                    "legacy",
+                    0,
+                    None,
+                    [live_url] if live_url else [],
+                    [hls_url] if hls_url else [],
+                )
+            ]
 
         # Extract stream options
         sdk_data = json.loads(sdk_data_str).get("data", {})
@@ -264,27 +556,54 @@ class TikTokAPI:
             .get("qualities", [])
         )
         if not qualities:
-            logger.warning("No qualities found in the stream data. Returning None.")
-            return None
+            logger.warning("No qualities found in the stream data.")
+            return []
         level_map = {q["sdk_key"]: q["level"] for q in qualities}
 
-        best_level = -1
-        best_flv = None
+        options = []
         for sdk_key, entry in sdk_data.items():
-            level = level_map.get(sdk_key, -1)
-            stream_main = entry.get("main", {})
-            if level > best_level:
-                best_level = level
-                best_flv = stream_main.get("flv")
-
-        if not best_flv and data.get("status_code") == 4003110:
+            main, backup = entry.get("main", {}), entry.get("backup", {})
+            options.append(
+                StreamOption(
+                    sdk_key,
+                    level_map.get(sdk_key, -1),
+                    self._parse_bitrate(main),
+                    [url for url in (main.get("flv"), backup.get("flv")) if url],
+                    [url for url in (main.get("hls"), backup.get("hls")) if url],
+                )
+            )
+        options.sort(key=lambda option: option.level, reverse=True)
+
+        if (
+            options
+            and not options[0].urls
+            and not options[0].hls_urls
+            and data.get("status_code") == 4003110
+        ):
             raise UserLiveError(TikTokError.LIVE_RESTRICTION)
 
-        return best_flv
+        return [option for option in options if option.urls or option.hls_urls]
+
+    @staticmethod
+    def _parse_bitrate(stream: dict) -> int | None:
+        """
+        Returns the video bitrate announced in the sdk_params of a stream.
+        """
+        try:
+            params = json.loads(stream.get("sdk_params") or "{}")
+            return int(params["vbitrate"]) or None
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    def open_live_stream(self, live_url: str, timeout: float | None = None):
+        """
+        Opens the live stream and returns the response with the body unread.
+        """
+        return self._http_client_stream.get(live_url, stream=True, timeout=timeout)
 
     def download_live_stream(self, live_url: str):
         """Generator that returns the live stream for a given room_id."""
-        stream = self._http_client_stream.get(live_url, stream=True)
+        stream = self.open_live_stream(live_url)
         for chunk in stream.iter_content(chunk_size=4096):
             if chunk:
                 yield chunk
@@ -1,33 +1,117 @@
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from http.client import HTTPException
 from pathlib import Path
-from threading import Thread
+from threading import Event, Thread
 
 from requests import RequestException
 
+from core.live_scheduler import LiveStatusScheduler
+from core.live_watcher import LiveWatcher
+from core.post_processor import PostProcessor
+from core.quality_policy import QualityPolicy
 from core.tiktok_api import TikTokAPI
+from http_utils.client_pool import HttpClientPool
+from http_utils.proxy_pool import ProxyPool
+from utils.cache import SQLiteStore
 from utils.logger_manager import logger
+from utils.metrics import REGISTRY
+from utils.rate_limiter import RateLimiter
 from utils.recorder_config import RecorderConfig
-from utils.video_management import VideoManagement
-from utils.custom_exceptions import LiveNotFound, UserLiveError, TikTokRecorderError
+from utils.segment_writer import SegmentWriter
+from utils.stream_writer import StreamPrefetch, StreamWriter
+from utils.video_management import LiveRemuxer, NativeRemuxer
+from utils.custom_exceptions import (
+    LiveNotFound,
+    UnsupportedStreamError,
+    UserLiveError,
+    TikTokRecorderError,
+)
 from utils.enums import Mode, Error, TimeOut, TikTokError
+from utils.flv_stitcher import FlvStitcher
+
+CHECK_ALIVE_BATCH = 50  # rooms per check_alive request
+CHECK_ALIVE_DELAY = 2  # seconds a resolved room waits for its batch to fill
+CHECK_RETRY_DELAY = 60  # seconds before the followers of a failed batch are checked
+RECONNECT_DELAY = 0.5  # seconds, doubled after every reconnection without data
+MAX_RECONNECT_DELAY = 30
+
+ACTIVE_RECORDINGS = REGISTRY.gauge(
+    "recorder_active_recordings", "Lives being recorded."
+)
+RECORDINGS = REGISTRY.counter("recorder_recordings_total", "Recordings started.")
+RECORDED_BYTES = REGISTRY.counter(
+    "recorder_bytes_total", "Bytes of live stream written, by user.", ("user",)
+)
+RECONNECTS = REGISTRY.counter(
+    "recorder_reconnects_total", "Reconnections to a live stream, by user.", ("user",)
+)
+FIRST_BYTE = REGISTRY.histogram(
+    "recorder_first_byte_seconds",
+    "Time from the live detection to the first byte of its stream.",
+)
+STREAM_GAPS = REGISTRY.histogram(
+    "recorder_stream_gap_seconds",
+    "Time without data while a broken stream was reopened.",
+)
+RECORDING_TIME = REGISTRY.histogram(
+    "recorder_recording_seconds",
+    "Duration of the recordings.",
+    buckets=(60, 300, 900, 1800, 3600, 7200, 14400, 28800),
+)
 
 
 class TikTokRecorder:
-    def __init__(self, config: RecorderConfig):
-        self.tiktok = TikTokAPI(proxy=config.proxy, cookies=config.cookies)
+    def __init__(
+        self,
+        config: RecorderConfig,
+        tiktok: TikTokAPI | None = None,
+        post_processor: PostProcessor | None = None,
+    ):
+        if tiktok is None:
+            rate_limiter = RateLimiter(config.rate_limit) if config.rate_limit else None
+            cache_store = SQLiteStore(config.cache_file) if config.cache_file else None
+            tiktok = TikTokAPI(
+                proxy=None,
+                cookies=config.cookies,
+                rate_limiter=rate_limiter,
+                cache_store=cache_store,
+                client_pool=HttpClientPool.shared(config.http_pool_size, config.http2),
+                proxy_pool=ProxyPool(config.proxy) if config.proxy else None,
+                quality_policy=(
+                    QualityPolicy(config.bandwidth * 1_000_000, config.priorities)
+                    if config.bandwidth
+                    else None
+                ),
+            )
+        self.tiktok = tiktok
+        self.post_processor = post_processor or PostProcessor.shared(
+            config.convert_workers, config.upload_workers
+        )
 
         self.url = config.url
         self.user = config.user
         self.room_id = config.room_id
         self.mode = config.mode
         self.automatic_interval = config.automatic_interval
+        self.dormant_factor = config.dormant_factor
         self.duration = config.duration
         self.output = config.output
         self.bitrate = config.bitrate
+        self.remux = config.remux
+        self.segment_minutes = config.segment_minutes
+        self.segment_size = config.segment_size
+        self.redundant = config.redundant
+        self.protocol = config.protocol
+        self.hls_workers = config.hls_workers
         self.use_telegram = config.use_telegram
-        self._proxy = config.proxy
+        self.followers_page_size = config.followers_page_size
+        self.followers_full_sync = config.followers_full_sync
+        self.probe_workers = config.probe_workers
+        self.watch_url = config.watch_url
         self._cookies = config.cookies
+        self._stop_event = Event()
+        self._wake = Event()  # set by the live event feed
 
     def _setup(self):
         """Resolve user/room data and validate prerequisites via network calls."""
@@ -53,15 +137,8 @@ class TikTokRecorder:
 
             logger.info(f"USERNAME: {self.user}" + ("\n" if not self.room_id else ""))
             if self.room_id:
-                logger.info(
-                    f"ROOM_ID:  {self.room_id}"
-                    + ("\n" if not self.tiktok.is_room_alive(self.room_id) else "")
-                )
-
-        # If proxy was used for the initial checks, switch to a direct connection
-        # for the actual stream download to avoid proxy bottlenecks
-        if self._proxy:
-            self.tiktok = TikTokAPI(proxy=None, cookies=self._cookies)
+                live = self.tiktok.is_room_alive(self.room_id, throttle=False)
+                logger.info(f"ROOM_ID:  {self.room_id}" + ("\n" if not live else ""))
 
     def run(self):
         """
@@ -90,23 +167,48 @@ class TikTokRecorder:
             self.followers_mode()
 
     def manual_mode(self):
-        if not self.tiktok.is_room_alive(self.room_id):
+        if not self.tiktok.is_room_alive(self.room_id, throttle=False):
             raise UserLiveError(f"@{self.user}: {TikTokError.USER_NOT_CURRENTLY_LIVE}")
 
         self.start_recording(self.user, self.room_id)
 
     def automatic_mode(self):
+        scheduler = LiveStatusScheduler(
+            self.automatic_interval * TimeOut.ONE_MINUTE,
+            max_dormant_factor=self.dormant_factor,
+        )
+
+        watcher = self._start_watcher(lambda: {self.user}, self._on_live_event)
+        try:
+            self._automatic_loop(scheduler)
+        finally:
+            if watcher is not None:
+                watcher.stop()
+
+    def _automatic_loop(self, scheduler):
         while True:
             try:
                 self.room_id = self.tiktok.get_room_id_from_user(self.user)
-                self.manual_mode()
+                if not self.tiktok.is_room_alive(self.room_id):
+                    raise UserLiveError(
+                        f"@{self.user}: {TikTokError.USER_NOT_CURRENTLY_LIVE}"
+                    )
+
+                scheduler.report(self.user, is_live=True, room_id=self.room_id)
+                self.start_recording(self.user, self.room_id)
 
             except (UserLiveError, LiveNotFound) as ex:
+                # an offline user keeps its room_id until it expires
+                if scheduler.was_live(self.user):
+                    self.tiktok.invalidate_room_id(self.user)
+                interval = scheduler.report(self.user, is_live=False)
                 logger.info(ex)
+                logger.debug(f"Connection stats: {self.tiktok.connection_stats()}")
+                logger.debug(f"Proxy stats: {self.tiktok.proxy_stats()}")
                 logger.info(
-                    f"Waiting {self.automatic_interval} minutes before recheck\n"
+                    f"Waiting {interval / TimeOut.ONE_MINUTE:g} minutes before recheck\n"
                 )
-                time.sleep(self.automatic_interval * TimeOut.ONE_MINUTE)
+                self._wait(interval)
 
             except ConnectionError:
                 logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
@@ -114,53 +216,73 @@ class TikTokRecorder:
 
     def followers_mode(self):
         active_recordings = {}  # follower -> Thread
+        scheduler = LiveStatusScheduler(
+            self.automatic_interval * TimeOut.ONE_MINUTE,
+            max_dormant_factor=self.dormant_factor,
+        )
 
-        while True:
-            try:
-                followers = self.tiktok.get_followers_list(self.sec_uid)
-
-                for follower in followers:
-                    if follower in active_recordings:
-                        if not active_recordings[follower].is_alive():
-                            logger.info(f"Recording of @{follower} finished.")
-                            del active_recordings[follower]
-                        else:
-                            continue
-
-                    try:
-                        room_id = self.tiktok.get_room_id_from_user(follower)
-
-                        if not room_id or not self.tiktok.is_room_alive(room_id):
-                            continue
-
-                        logger.info(f"@{follower} is live. Starting recording...")
-
-                        thread = Thread(
-                            target=self.start_recording,
-                            args=(follower, room_id),
-                            daemon=True,
-                        )
-                        thread.start()
-                        active_recordings[follower] = thread
+        from core.followers_sync import FollowersSync
 
-                        time.sleep(2.5)
+        # the list is refreshed in the background, checks run on the saved one
+        followers = FollowersSync(
+            self.tiktok,
+            self.sec_uid,
+            interval=self.automatic_interval * TimeOut.ONE_MINUTE,
+            full_sync=self.followers_full_sync * TimeOut.ONE_MINUTE,
+            page_size=self.followers_page_size,
+            changed=self._wake,
+        )
+        followers.start()
 
-                    except TikTokRecorderError as e:
-                        logger.error(f"Error while processing @{follower}: {e}")
-                        continue
+        def on_live(user, room_id):
+            if user not in active_recordings:
+                self._on_live_event(user, room_id)
+                scheduler.add(user)
 
-                    except Exception as e:
-                        logger.error(
-                            f"Unexpected error processing @{follower}: {e}",
-                            exc_info=True,
+        watcher = self._start_watcher(lambda: scheduler.users, on_live)
+        self._probe_pool = ThreadPoolExecutor(
+            self.probe_workers, thread_name_prefix="probe"
+        )
+        try:
+            self._followers_loop(scheduler, followers, active_recordings)
+        finally:
+            followers.stop()
+            self._probe_pool.shutdown(cancel_futures=True)
+            if watcher is not None:
+                watcher.stop()
+
+    def _followers_loop(self, scheduler, followers, active_recordings):
+        while True:
+            try:
+                added, removed = followers.changes()
+                self._sync_followers(scheduler, added, removed, active_recordings)
+
+                for follower, thread in list(active_recordings.items()):
+                    if not thread.is_alive():
+                        logger.info(f"Recording of @{follower} finished.")
+                        del active_recordings[follower]
+                        if follower in scheduler:
+                            scheduler.add(follower)
+
+                due = scheduler.pop_due()
+                if due:
+                    elapsed = self._check_followers(scheduler, due, active_recordings)
+                    logger.debug(f"Cache stats: {self.tiktok.cache_stats()}")
+                    logger.debug(f"Connection stats: {self.tiktok.connection_stats()}")
+                    logger.debug(f"Proxy stats: {self.tiktok.proxy_stats()}")
+                    logger.debug(f"Quality stats: {self.tiktok.quality_stats()}")
+
+                    next_check = scheduler.next_due_in()
+                    if next_check is not None:
+                        logger.info(
+                            f"Checked {len(due)} followers in {elapsed:.1f} seconds. "
+                            f"Next check in {next_check / TimeOut.ONE_MINUTE:.1f} "
+                            "minutes...\n"
                         )
-                        continue
 
-                print()
-                logger.info(
-                    f"Waiting {self.automatic_interval} minutes for the next check..."
-                )
-                time.sleep(self.automatic_interval * TimeOut.ONE_MINUTE)
+                next_check = scheduler.next_due_in()
+                wait = TimeOut.ONE_MINUTE if next_check is None else next_check
+                followers.wait(max(1, min(wait, TimeOut.ONE_MINUTE)))
 
             except (UserLiveError, LiveNotFound) as ex:
                 logger.info(ex)
@@ -173,9 +295,135 @@ class TikTokRecorder:
                 logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
                 time.sleep(TimeOut.CONNECTION_CLOSED * TimeOut.ONE_MINUTE)
 
+    def _start_watcher(self, users, on_live) -> LiveWatcher | None:
+        """
+        Listens to the live event feed, if one is configured.
+        """
+        if not self.watch_url:
+            return None
+
+        watcher = LiveWatcher(self.watch_url, users, on_live)
+        watcher.start()
+        logger.info("Listening to the live event feed, polling kept as fallback.")
+        return watcher
+
+    def _on_live_event(self, user, room_id) -> None:
+        # spares the room id lookup of the check that follows
+        if room_id:
+            self.tiktok.room_id_cache.set(user, str(room_id))
+        self._wake.set()
+
+    def _wait(self, timeout: float) -> None:
+        """
+        Sleeps until the timeout or a live event.
+        """
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    @staticmethod
+    def _sync_followers(scheduler, added, removed, active_recordings):
+        """
+        Tracks new followers in the scheduler and forgets unfollowed ones.
+        """
+        for follower in added:
+            if follower not in scheduler and follower not in active_recordings:
+                scheduler.add(follower)
+
+        for follower in removed:
+            scheduler.remove(follower)
+
+    def _check_followers(self, scheduler, due, active_recordings):
+        """
+        Resolves the room ids of the due followers concurrently and checks
+        them in batches as they come, so that a live starts recording
+        without waiting for the whole round. Returns the round duration.
+        """
+        start = time.monotonic()
+        futures = {
+            self._probe_pool.submit(self._resolve_room_id, follower): follower
+            for follower in due
+        }
+
+        room_ids = {}  # follower -> room_id
+        batch_start = None
+        for future in as_completed(futures):
+            follower = futures[future]
+            room_id = future.result()
+            if not room_id:
+                scheduler.report(follower, is_live=False)
+                continue
+
+            room_ids[follower] = room_id
+            batch_start = batch_start or time.monotonic()
+            if (
+                len(room_ids) >= CHECK_ALIVE_BATCH
+                or time.monotonic() - batch_start >= CHECK_ALIVE_DELAY
+            ):
+                self._check_rooms(scheduler, room_ids, active_recordings)
+                room_ids, batch_start = {}, None
+
+        if room_ids:
+            self._check_rooms(scheduler, room_ids, active_recordings)
+
+        return time.monotonic() - start
+
+    def _resolve_room_id(self, follower) -> str | None:
+        # runs in the probe pool
+        try:
+            room_id = self.tiktok.get_room_id_from_user(follower)
+            return str(room_id) if room_id else None
+
+        except TikTokRecorderError as e:
+            logger.error(f"Error while processing @{follower}: {e}")
+
+        except Exception as e:
+            logger.error(
+                f"Unexpected error processing @{follower}: {e}",
+                exc_info=True,
+            )
+
+        return None
+
+    def _check_rooms(self, scheduler, room_ids, active_recordings):
+        """
+        Checks a batch of rooms with a single request and starts recording
+        the live ones. If the request fails, its followers are checked
+        again after CHECK_RETRY_DELAY.
+        """
+        try:
+            alive_rooms = self.tiktok.check_rooms_alive(list(room_ids.values()))
+        except Exception as ex:
+            logger.error(
+                f"Unable to check {len(room_ids)} followers, retrying in "
+                f"{CHECK_RETRY_DELAY} seconds: {ex}"
+            )
+            for follower in room_ids:
+                scheduler.add(follower, delay=CHECK_RETRY_DELAY)
+            return
+
+        for follower, room_id in room_ids.items():
+            if not alive_rooms.get(room_id):
+                if scheduler.was_live(follower):
+                    self.tiktok.invalidate_room_id(follower)
+                scheduler.report(follower, is_live=False)
+                continue
+
+            logger.info(f"@{follower} is live. Starting recording...")
+            scheduler.report(follower, is_live=True, room_id=room_id)
+
+            thread = Thread(
+                target=self.start_recording,
+                args=(follower, room_id),
+                daemon=True,
+            )
+            thread.start()
+            active_recordings[follower] = thread
+
     def _build_output_path(self, user: str) -> str:
+        # with a live remux the recording is written straight to its final name
+        suffix = "_flv.mp4" if self.remux == "post" else ".mp4"
         filename = (
-            f"TK_{user}_{time.strftime('%Y.%m.%d_%H-%M-%S', time.localtime())}_flv.mp4"
+            f"TK_{user}_{time.strftime('%Y.%m.%d_%H-%M-%S', time.localtime())}{suffix}"
         )
         if self.output:
             return str(Path(self.output) / filename)
@@ -185,69 +433,267 @@ class TikTokRecorder:
         """
         Start recording live
         """
-        live_url = self.tiktok.get_live_url(room_id)
-        if not live_url:
+        detected_at = time.perf_counter()
+        live_urls = self.tiktok.get_live_urls(room_id, user, protocol=self.protocol)
+        if not live_urls:
             raise LiveNotFound(TikTokError.RETRIEVE_LIVE_URL)
 
-        output = self._build_output_path(user)
+        # the room was just found live: connect while the output is prepared
+        prefetch = None
+        if self.protocol == "flv":
+            prefetch = StreamPrefetch(
+                lambda: self.tiktok.open_live_stream(live_urls[0])
+            )
+        RECORDINGS.inc()
+        ACTIVE_RECORDINGS.inc()
+        try:
+            output = self._build_output_path(user)
+
+            if self.duration:
+                logger.info(f"Started recording for {self.duration} seconds ")
+            else:
+                logger.info("Started recording...")
+
+            logger.info("[PRESS CTRL + C ONCE TO STOP]")
+            out_file = self._open_output(output)
+            # HLS segments are concatenated as they are
+            stitcher = None
+            if self.protocol == "flv":
+                stitcher = FlvStitcher(out_file, name=f"@{user}")
+            with out_file, StreamWriter(stitcher or out_file) as writer:
+                # read at collection time, the chunk path is not slowed down
+                untrack = RECORDED_BYTES.track(lambda: writer.bytes_written, user=user)
+                try:
+                    self._record(user, room_id, live_urls, writer, stitcher, prefetch)
+                finally:
+                    untrack()
+        finally:
+            ACTIVE_RECORDINGS.dec()
+            RECORDING_TIME.observe(time.perf_counter() - detected_at)
+            if prefetch is not None:
+                prefetch.close()
+            if self.tiktok.quality_policy is not None:
+                stats = self.tiktok.quality_stats().get(user, {})
+                if stats.get("kbps") is not None:
+                    logger.info(
+                        f"@{user}: recorded in {stats['quality']} quality "
+                        f"at {stats['kbps']} kbps"
+                    )
+                self.tiktok.quality_policy.release(user)
 
-        if self.duration:
-            logger.info(f"Started recording for {self.duration} seconds ")
-        else:
-            logger.info("Started recording...")
+        if prefetch is not None and prefetch.first_byte_at is not None:
+            FIRST_BYTE.observe(prefetch.first_byte_at - detected_at)
+            logger.info(
+                f"@{user}: first byte "
+                f"{(prefetch.first_byte_at - detected_at) * 1000:.0f} ms "
+                "after the live was found"
+            )
 
-        buffer_size = 512 * 1024  # 512 KB buffer
-        buffer = bytearray()
+        # segments were handed off as soon as they were closed
+        if not isinstance(out_file, SegmentWriter):
+            self._finalize(output, out_file)
 
-        logger.info("[PRESS CTRL + C ONCE TO STOP]")
-        with open(output, "wb") as out_file:
-            stop_recording = False
-            while not stop_recording:
-                try:
-                    if not self.tiktok.is_room_alive(room_id):
+    def _record(self, user, room_id, live_urls, writer, stitcher, prefetch=None):
+        """
+        Copies the live into the writer, reconnecting as soon as the stream
+        breaks for as long as the room is live. With `redundant`, the main
+        and backup CDN edges are pulled at once; with the HLS protocol, the
+        playlist is followed instead.
+        """
+        redundant = self.redundant
+        if redundant and len(live_urls) < 2:
+            logger.info(f"@{user}: no backup CDN edge, recording from one edge.")
+        start_time = time.time()
+        failures = 0  # reconnections in a row without data
+        disconnected_at = None  # last data received before a reconnection
+        stop_recording = False
+        reconnecting = False
+        hls = None  # one per recording, to go on from its last segment
+        while not stop_recording:
+            written = writer.bytes_written
+            response, data = None, b""
+            try:
+                if prefetch is not None:
+                    pending, prefetch = prefetch, None
+                    response, data = pending.take()
+                elif reconnecting:
+                    # only a reconnection needs to check that the live goes on
+                    if not self.tiktok.is_room_alive(room_id, throttle=False):
                         logger.info("User is no longer live. Stopping recording.")
                         break
 
-                    start_time = time.time()
-                    for chunk in self.tiktok.download_live_stream(live_url):
-                        buffer.extend(chunk)
-                        if len(buffer) >= buffer_size:
-                            out_file.write(buffer)
-                            buffer.clear()
-
-                        elapsed_time = time.time() - start_time
-                        if self.duration and elapsed_time >= self.duration:
-                            stop_recording = True
-                            break
+                    # the pull URL may have expired with the connection, and
+                    # the quality may change (but the native remuxer cannot
+                    # change the decoder configuration)
+                    RECONNECTS.inc(user=user)
+                    if stitcher is not None:
+                        stitcher.reconnect()
+                    disconnected_at = disconnected_at or writer.last_data_at
+                    live_urls = (
+                        self.tiktok.get_live_urls(
+                            room_id,
+                            user,
+                            switch=self.remux != "native",
+                            protocol=self.protocol,
+                        )
+                        or live_urls
+                    )
+                reconnecting = True
+
+                def should_stop():
+                    nonlocal disconnected_at
+                    resumed_at = writer.last_data_at
+                    if disconnected_at is not None and resumed_at > disconnected_at:
+                        gap = (resumed_at - disconnected_at) * 1000
+                        STREAM_GAPS.observe(gap / 1000)
+                        logger.info(
+                            f"@{user}: stream resumed after a {gap:.0f} ms gap."
+                        )
+                        disconnected_at = None
 
-                except ConnectionError:
-                    if self.mode == Mode.AUTOMATIC:
-                        logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
-                        time.sleep(TimeOut.CONNECTION_CLOSED * TimeOut.ONE_MINUTE)
+                    return self._should_stop(start_time) or self._should_switch(
+                        user, writer
+                    )
 
-                except (RequestException, HTTPException) as ex:
-                    logger.warning(f"Network hiccup, retrying: {ex}")
-                    time.sleep(2)
+                if self.protocol == "hls":
+                    if hls is None:
+                        from utils.hls_stream import HlsStream
 
-                except KeyboardInterrupt:
+                        hls = HlsStream(
+                            self.tiktok.open_live_stream,
+                            live_urls[0],
+                            workers=self.hls_workers,
+                            name=f"@{user}",
+                        )
+                    else:
+                        hls.switch(live_urls[0])
+                    stopped = hls.copy(writer, should_stop)
+                elif redundant and len(live_urls) > 1:
+                    from utils.redundant_stream import RedundantStream
+
+                    merger = RedundantStream(
+                        self.tiktok.open_live_stream, live_urls[:2], name=f"@{user}"
+                    )
+                    first = (response, data) if response is not None else None
+                    stopped = merger.copy(writer, should_stop, first=first)
+                    logger.debug(f"@{user}: redundant capture stats {merger.stats()}")
+                else:
+                    if response is None:
+                        response = self.tiktok.open_live_stream(live_urls[0])
+                    writer.write(data)
+                    with response:
+                        stopped = writer.copy(response, should_stop=should_stop)
+
+                # a quality switch only ends the connection
+                stop_recording = stopped and self._should_stop(start_time)
+
+                if self._stop_event.is_set():
                     logger.info("Recording stopped by user.")
-                    stop_recording = True
 
-                except Exception as ex:
-                    logger.error(
-                        f"Unexpected error during recording: {ex}",
-                        exc_info=True,
-                    )
-                    stop_recording = True
+            except (ConnectionError, RequestException, HTTPException) as ex:
+                logger.warning(f"Network hiccup, reconnecting: {ex}")
 
-                finally:
-                    if buffer:
-                        out_file.write(buffer)
-                        buffer.clear()
-                    out_file.flush()
+            except UnsupportedStreamError as ex:
+                logger.warning(f"@{user}: {ex}, recording from one edge.")
+                redundant = False
+
+            except KeyboardInterrupt:
+                logger.info("Recording stopped by user.")
+                stop_recording = True
 
+            except Exception as ex:
+                logger.error(
+                    f"Unexpected error during recording: {ex}",
+                    exc_info=True,
+                )
+                stop_recording = True
+
+            finally:
+                writer.flush()
+                if stitcher is not None:
+                    stitcher.flush()
+
+            # reconnect at once, unless the last attempts brought nothing
+            if stop_recording or writer.bytes_written > written:
+                failures = 0
+            else:
+                delay = min(RECONNECT_DELAY * 2**failures, MAX_RECONNECT_DELAY)
+                failures += 1
+                self._stop_event.wait(delay)
+
+    def _finalize(self, output: str, out_file):
+        """
+        Hands a finished recording (or segment) over to the post-processor,
+        which converts and uploads it in the background.
+        """
         logger.info(f"Recording finished: {Path(output).resolve()}\n")
-        VideoManagement.convert_flv_to_mp4(output, self.bitrate)
+
+        if self.remux == "post":
+            self.post_processor.convert(output, self.bitrate, upload=self.use_telegram)
+            return
+
+        # checked before the conversion of a fallback can create it
+        if self.use_telegram and Path(output).exists():
+            self.post_processor.upload(output)
+
+        if self.remux == "native" and out_file.flv_file:
+            # the FLV part is uploaded once its conversion finished
+            self.post_processor.convert(out_file.flv_file, upload=self.use_telegram)
+
+    def _open_output(self, output: str):
+        max_bytes = self.segment_size * 1024 * 1024 if self.segment_size else None
+        if self.use_telegram:
+            from upload.telegram import FREE_USER_MAX_FILE_SIZE
+
+            # leave room for the GOP that ends a segment
+            limit = int(FREE_USER_MAX_FILE_SIZE * 0.95)
+            max_bytes = min(max_bytes or limit, limit)
+
+        # segments are cut at FLV keyframes: an HLS recording is uploaded
+        # whole, split by the uploader if needed
+        if self.protocol == "hls" or (not self.segment_minutes and not max_bytes):
+            return self._open_file(output)
+
+        def open_segment(index):
+            path = self._segment_path(output, index)
+            return path, self._open_file(path)
+
+        return SegmentWriter(
+            open_segment,
+            on_segment=self._finalize,
+            max_seconds=self.segment_minutes * 60 if self.segment_minutes else None,
+            max_bytes=max_bytes,
+        )
+
+    def _segment_path(self, output: str, index: int) -> str:
+        suffix = "_flv.mp4" if self.remux == "post" else ".mp4"
+        return f"{output.removesuffix(suffix)}_part{index:03d}{suffix}"
+
+    def _open_file(self, output: str):
+        if self.remux == "pipe":
+            input_format = "mpegts" if self.protocol == "hls" else "flv"
+            return LiveRemuxer(output, self.bitrate, input_format)
+        if self.remux == "native":
+            return NativeRemuxer(output)
+        return open(output, "wb")
+
+    def _should_switch(self, user, writer) -> bool:
+        """
+        Feeds the quality policy with the throughput of the stream and tells
+        whether it should be reopened at another quality.
+        """
+        policy = self.tiktok.quality_policy
+        if policy is None:
+            return False
+
+        policy.update(user, writer.bytes_written)
+        return self.remux != "native" and policy.should_switch(user)
+
+    def _should_stop(self, start_time: float) -> bool:
+        if self.duration and time.time() - start_time >= self.duration:
+            return True
+
+        return self._stop_event.is_set()
 
     def check_country_blacklisted(self):
         is_blacklisted = self.tiktok.is_country_blacklisted()
@@ -264,3 +710,11 @@ class TikTokRecorder:
             raise TikTokRecorderError(TikTokError.COUNTRY_BLACKLISTED_FOLLOWERS_MODE)
 
         return is_blacklisted
+
+    def stop(self):
+        """
+        Ask the active recordings of this recorder to stop gracefully.
+        Used when recordings run in worker threads, which never receive
+        the KeyboardInterrupt.
+        """
+        self._stop_event.set()
@@ -0,0 +1,55 @@
+import asyncio
+
+from http_utils.http_client import HttpClient
+from utils.utils import is_termux
+
+
+class AsyncHttpClient(HttpClient):
+    """
+    Non-blocking counterpart of HttpClient used by the asyncio engine.
+
+    On Termux curl_cffi is not available, so the blocking requests
+    session is run in the default executor instead.
+    """
+
+    def __init__(self, proxy=None, cookies=None, max_clients=10, http2=False):
+        self.max_clients = max_clients
+        self._threaded = is_termux()
+        super().__init__(proxy, cookies, pool_size=max_clients, http2=http2)
+
+    def configure_session(self) -> None:
+        if self._threaded:
+            super().configure_session()
+            return
+
+        from curl_cffi import AsyncSession
+
+        self.req_stream = self._requests_session()
+        self.req = AsyncSession(**self._curl_options(), max_clients=self.max_clients)
+        self._configure(self.req)
+
+        self.check_proxy()
+
+    def check_proxy(self) -> None:
+        # blocking network I/O: done by the first request, off the event loop
+        self._proxy_checked = False
+        self.proxy_usable = self.proxy is None
+
+    async def get(self, url: str, **kwargs):
+        if not self._proxy_checked:
+            await asyncio.to_thread(HttpClient.check_proxy, self)
+            self._proxy_checked = True
+
+        if self._threaded:
+            return await asyncio.to_thread(self.req.get, url, **kwargs)
+
+        response = await self.req.get(url, **kwargs)
+        self._count(response)
+        return response
+
+    async def close(self) -> None:
+        if self._threaded:
+            self.req.close()
+            return
+
+        await self.req.close()
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+
+from http_utils.http_client import POOL_SIZE, HttpClient
+
+
+class HttpClientPool:
+    """
+    HttpClients shared by every TikTokAPI of the process, one per proxy and
+    cookie jar. Their sessions keep the connections alive, so the polls of
+    all recorders reuse them instead of opening new ones.
+    """
+
+    _shared = None
+
+    def __init__(self, pool_size: int = POOL_SIZE, http2: bool = False):
+        self.pool_size = pool_size
+        self.http2 = http2
+
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._clients = {}  # (proxy, cookies) -> HttpClient
+        self.created = 0
+        self.reused = 0
+
+    @classmethod
+    def shared(cls, pool_size: int = POOL_SIZE, http2: bool = False):
+        """
+        Pool of this process, created with the settings of the first call.
+        """
+        # the connections of a forked parent cannot be shared
+        if cls._shared is None or cls._shared._pid != os.getpid():
+            cls._shared = cls(pool_size, http2)
+        return cls._shared
+
+    def get(self, proxy=None, cookies=None) -> HttpClient:
+        key = (proxy, json.dumps(cookies or {}, sort_keys=True))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+
+            client = HttpClient(proxy, cookies, self.pool_size, self.http2)
+            self._clients[key] = client
+            self.created += 1
+            return client
+
+    def stats(self) -> dict:
+        """
+        Returns the clients created and reused, and the requests and
+        connections of all of them.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            stats = {"created": self.created, "reused": self.reused}
+
+        stats["requests"] = stats["connections"] = 0
+        for client in clients:
+            for name, value in client.stats().items():
+                stats[name] += value
+        return stats
@@ -1,17 +1,29 @@
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from utils.enums import StatusCode
 from utils.logger_manager import logger
 from utils.utils import is_termux
 
+POOL_SIZE = 10  # kept-alive connections per host
+
+# proxy -> whether it answered, tested once per process
+_proxy_checks = {}
+_proxy_locks = {}  # proxy -> lock held while it is tested
+_proxy_lock = threading.Lock()
+
 
 class HttpClient:
-    def __init__(self, proxy=None, cookies=None):
+    def __init__(self, proxy=None, cookies=None, pool_size=POOL_SIZE, http2=False):
         self.req = None
         self.req_stream = requests
 
         self.proxy = proxy
         self.cookies = cookies
+        self.pool_size = pool_size
+        self.http2 = http2
         self.headers = {
             "Sec-Ch-Ua": '"Not/A)Brand";v="8", "Chromium";v="126"',
             "Sec-Ch-Ua-Mobile": "?0",
@@ -29,40 +41,123 @@ class HttpClient:
             "Origin": "https://www.tiktok.com",
         }
 
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._connections = 0  # opened by the curl session
+
         self.configure_session()
 
     def configure_session(self) -> None:
-        self.req_stream = requests.Session()
+        self.req_stream = self._requests_session()
 
         if is_termux():
             self.req = self.req_stream
         else:
-            from curl_cffi import Session, CurlSslVersion, CurlOpt
+            from curl_cffi import Session
+
+            self.req = Session(**self._curl_options())
+            self._configure(self.req)
+            self._count_requests(self.req)
 
-            self.req = Session(
-                impersonate="chrome136",
-                http_version="v1",
-                curl_options={CurlOpt.SSLVERSION: CurlSslVersion.TLSv1_2},
-            )
+        self.check_proxy()
 
-        self.req.headers.update(self.headers)
-        self.req_stream.headers.update(self.headers)
+    def _requests_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self._configure(session)
+        self._count_requests(session)
+        return session
 
+    def _curl_options(self) -> dict:
+        from curl_cffi import CurlInfo, CurlOpt, CurlSslVersion
+
+        return {
+            "impersonate": "chrome136",
+            "http_version": "v2" if self.http2 else "v1",
+            "curl_options": {
+                CurlOpt.SSLVERSION: CurlSslVersion.TLSv1_2,
+                CurlOpt.MAXCONNECTS: self.pool_size,
+            },
+            "curl_infos": [CurlInfo.NUM_CONNECTS],
+        }
+
+    def _configure(self, session) -> None:
+        session.headers.update(self.headers)
         if self.cookies is not None:
-            self.req.cookies.update(self.cookies)
-            self.req_stream.cookies.update(self.cookies)
+            session.cookies.update(self.cookies)
 
-        self.check_proxy()
+    def _count_requests(self, session) -> None:
+        request = session.request
+
+        def counted(*args, **kwargs):
+            response = request(*args, **kwargs)
+            self._count(response)
+            return response
+
+        session.request = counted
+
+    def _count(self, response) -> None:
+        infos = getattr(response, "infos", None) or {}
+        with self._lock:
+            self._requests += 1
+            self._connections += sum(infos.values())
+
+    def stats(self) -> dict:
+        """
+        Returns the number of requests sent and of connections opened.
+        Every request beyond the connections reused a kept-alive one.
+        """
+        adapters = {}  # the requests sessions count their own connections
+        for session in (self.req, self.req_stream):
+            for adapter in getattr(session, "adapters", {}).values():
+                adapters[id(adapter)] = adapter
+
+        connections = self._connections
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            connections += sum(pools[key].num_connections for key in pools.keys())
+
+        return {"requests": self._requests, "connections": connections}
 
     def check_proxy(self) -> None:
-        if self.proxy is None:
-            return
+        self.proxy_usable = self.proxy is None or proxy_usable(self.proxy)
+        if self.proxy is not None and self.proxy_usable:
+            self.req.proxies.update({"http": self.proxy, "https": self.proxy})
 
-        logger.info(f"Testing {self.proxy}...")
-        proxies = {"http": self.proxy, "https": self.proxy}
 
+def proxy_usable(proxy: str) -> bool:
+    """
+    Tests the proxy the first time it is seen in this process.
+    """
+    with _proxy_lock:
+        if proxy in _proxy_checks:
+            return _proxy_checks[proxy]
+        lock = _proxy_locks.setdefault(proxy, threading.Lock())
+
+    # only the callers of this proxy wait for its test
+    with lock:
+        if proxy not in _proxy_checks:
+            _proxy_checks[proxy] = _test_proxy(proxy)
+        return _proxy_checks[proxy]
+
+
+def _test_proxy(proxy: str) -> bool:
+    logger.info(f"Testing {proxy}...")
+    proxies = {"http": proxy, "https": proxy}
+
+    try:
         response = requests.get("https://ifconfig.me/ip", proxies=proxies, timeout=10)
+    except requests.RequestException as ex:
+        logger.error(f"Proxy {proxy} unreachable: {ex}")
+        return False
+
+    if response.status_code == StatusCode.OK:
+        logger.info("Proxy set up successfully")
+        return True
 
-        if response.status_code == StatusCode.OK:
-            self.req.proxies.update(proxies)
-            logger.info("Proxy set up successfully")
+    logger.error(f"Proxy {proxy} answered {response.status_code}, not used.")
+    return False
@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+
+from utils.enums import StatusCode
+from utils.logger_manager import logger
+
+SMOOTHING = 0.2  # weight of the last request in the moving averages
+
+
+class ProxyHealth:
+    """
+    Moving averages of the latency and error rate of a proxy.
+    """
+
+    def __init__(self, proxy: str):
+        self.proxy = proxy
+        self.requests = 0
+        self.errors = 0
+        self.waf_hits = 0
+        self.latency = None  # seconds
+        self.error_rate = 0.0
+        self.failures = 0  # in a row
+        self.quarantines = 0  # in a row
+        self.quarantined_until = 0.0
+
+    def score(self) -> float:
+        """
+        Lower is better. A proxy never used scores best, so it gets tried.
+        """
+        return (self.latency or 0.0) * (1 + 4 * self.error_rate)
+
+    def record(self, latency: float | None, failed: bool) -> None:
+        self.requests += 1
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += SMOOTHING * (latency - self.latency)
+        self.error_rate += SMOOTHING * (float(failed) - self.error_rate)
+
+        if failed:
+            self.failures += 1
+        else:
+            self.failures = 0
+            self.quarantines = 0
+
+    def stats(self, now: float) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "waf_hits": self.waf_hits,
+            "latency_ms": None if self.latency is None else round(self.latency * 1e3),
+            "error_rate": round(self.error_rate, 3),
+            "quarantined_s": max(0, round(self.quarantined_until - now)),
+        }
+
+
+class ProxyPool:
+    """
+    Routes the polling requests over a list of proxies.
+
+    Each request goes to the better of two proxies picked at random, which
+    favours the fast and reliable ones while spreading the load over the
+    whole pool. A proxy failing `max_failures` requests in a row (network
+    errors, server errors or WAF pages) is quarantined, for twice as long
+    every time it fails again right after.
+    """
+
+    def __init__(
+        self,
+        proxies: list,
+        max_failures: int = 3,
+        quarantine: float = 60,
+        max_quarantine: float = 60 * 60,
+    ):
+        self.max_failures = max_failures
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+
+        self._proxies = {proxy: ProxyHealth(proxy) for proxy in dict.fromkeys(proxies)}
+        self._lock = threading.Lock()
+
+    def choose(self, exclude=()) -> str | None:
+        """
+        Returns the proxy for the next request, None if all are excluded.
+        """
+        with self._lock:
+            now = time.monotonic()
+            proxies = [
+                health
+                for proxy, health in self._proxies.items()
+                if proxy not in exclude
+            ]
+            if not proxies:
+                return None
+
+            healthy = [health for health in proxies if health.quarantined_until <= now]
+            if not healthy:
+                # better a proxy about to be released than none at all
+                health = min(proxies, key=lambda h: h.quarantined_until)
+                return health.proxy
+
+            candidates = random.sample(healthy, min(2, len(healthy)))
+            return min(candidates, key=ProxyHealth.score).proxy
+
+    def report(self, proxy: str, response, latency: float) -> None:
+        """
+        Records the outcome of a request sent through `proxy`.
+        """
+        status = response.status_code
+        waf = status in (StatusCode.FORBIDDEN, StatusCode.TOO_MANY_REQUESTS) or (
+            b"Please wait" in response.content
+        )
+        error = status >= StatusCode.SERVER_ERROR
+        self._record(proxy, latency, error=error, waf=waf)
+
+    def report_error(self, proxy: str) -> None:
+        """
+        Records a request through `proxy` that got no response.
+        """
+        self._record(proxy, None, error=True)
+
+    def _record(self, proxy, latency, error=False, waf=False) -> None:
+        with self._lock:
+            health = self._proxies.get(proxy)
+            if health is None:
+                return
+
+            health.errors += error
+            health.waf_hits += waf
+            health.record(latency, failed=error or waf)
+
+            if health.failures >= self.max_failures:
+                self._quarantine(health, "WAF blocked" if waf else "failing")
+
+    def _quarantine(self, health: ProxyHealth, reason: str) -> None:
+        duration = min(self.quarantine * 2**health.quarantines, self.max_quarantine)
+        health.quarantines += 1
+        health.failures = 0
+        health.quarantined_until = time.monotonic() + duration
+        logger.warning(
+            f"Proxy {health.proxy} {reason}, quarantined for {duration:g} seconds."
+        )
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of every proxy.
+        """
+        with self._lock:
+            now = time.monotonic()
+            return {proxy: health.stats(now) for proxy, health in self._proxies.items()}
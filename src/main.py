@@ -1,6 +1,7 @@
 import sys
 import os
 import multiprocessing
+import threading
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -10,12 +11,49 @@ def record_user(config):
     from utils.logger_manager import logger
 
     try:
+        start_metrics(config.metrics_port)
         TikTokRecorder(config).run()
     except Exception as e:
         logger.error(f"{e}", exc_info=True)
+    finally:
+        wait_post_processing()
 
 
-def _build_config(args, mode, cookies, user=None):
+def start_metrics(port):
+    """
+    Serves the metrics of this process, if a port was given.
+    """
+    if port is None:
+        return
+
+    from utils.metrics import MetricsServer
+
+    MetricsServer(port).start()
+
+
+def wait_post_processing():
+    """
+    Lets the conversions and uploads of this process finish. A second
+    Ctrl-C leaves them to be resumed at the next start.
+    """
+    from core.post_processor import PostProcessor
+
+    try:
+        PostProcessor.shutdown_shared()
+    except KeyboardInterrupt:
+        print("\n[!] Pending conversions and uploads will resume at next start.")
+        PostProcessor.shutdown_shared(wait=False)
+
+
+def _build_config(
+    args,
+    mode,
+    cookies,
+    user=None,
+    rate_limit=None,
+    bandwidth=None,
+    metrics_port=None,
+):
     from utils.recorder_config import RecorderConfig
 
     return RecorderConfig(
@@ -24,20 +62,89 @@ def _build_config(args, mode, cookies, user=None):
         room_id=args.room_id,
         mode=mode,
         automatic_interval=args.automatic_interval,
+        dormant_factor=args.dormant_factor,
+        followers_page_size=args.followers_page_size,
+        followers_full_sync=args.followers_full_sync,
+        probe_workers=args.probe_workers,
+        watch_url=args.watch_url,
         cookies=cookies,
         proxy=args.proxy,
         output=args.output,
         duration=args.duration,
         use_telegram=args.telegram,
         bitrate=args.bitrate,
+        remux=args.remux,
+        segment_minutes=args.segment_minutes,
+        segment_size=args.segment_size,
+        redundant=args.redundant,
+        protocol=args.protocol,
+        hls_workers=args.hls_workers,
+        bandwidth=bandwidth or args.bandwidth,
+        priorities=args.priority,
+        convert_workers=args.convert_workers,
+        upload_workers=args.upload_workers,
+        rate_limit=rate_limit or args.rate_limit,
+        cache_file=args.cache_file,
+        http_pool_size=args.http_pool_size,
+        http2=args.http2,
+        metrics_port=metrics_port or args.metrics_port,
+        control_port=args.control_port,
+        cluster_db=args.cluster_db if args.cluster == "worker" else None,
+        worker_name=args.worker_name,
     )
 
 
+def run_engine(args, mode, cookies):
+    from core.async_engine import AsyncRecorderEngine
+
+    users = args.user if isinstance(args.user, list) else [args.user]
+    configs = [_build_config(args, mode, cookies, user=user) for user in users if user]
+    # a daemon may start without users
+    template = _build_config(args, mode, cookies)
+    start_metrics(args.metrics_port)
+    AsyncRecorderEngine(configs, template=template).run()
+
+
+def run_coordinator(args):
+    from core.cluster import Coordinator, LeaseTable
+
+    users = args.user if isinstance(args.user, list) else [args.user]
+    start_metrics(args.metrics_port)
+    coordinator = Coordinator(LeaseTable(args.cluster_db), users)
+    try:
+        coordinator.run()
+    except KeyboardInterrupt:
+        print("\n[!] Ctrl-C detected. The workers keep their users.")
+
+
 def run_recordings(args, mode, cookies):
-    if isinstance(args.user, list):
+    if args.cluster == "coordinator":
+        run_coordinator(args)
+    elif args.control_port is not None or args.cluster == "worker":
+        run_engine(args, mode, cookies)
+    elif isinstance(args.user, list) and args.engine == "asyncio":
+        run_engine(args, mode, cookies)
+    elif isinstance(args.user, list):
         processes = []
-        for user in args.user:
-            config = _build_config(args, mode, cookies, user=user)
+        # each process polls on its own: split the request budget among them,
+        # and the bandwidth budget by priority
+        rate_limit = args.rate_limit / len(args.user)
+        priorities = args.priority or {}
+        shares = sum(priorities.get(user, 1) for user in args.user)
+        for index, user in enumerate(args.user):
+            bandwidth = None
+            if args.bandwidth:
+                bandwidth = args.bandwidth * priorities.get(user, 1) / shares
+            config = _build_config(
+                args,
+                mode,
+                cookies,
+                user=user,
+                rate_limit=rate_limit,
+                bandwidth=bandwidth,
+                # every process serves its own metrics
+                metrics_port=args.metrics_port + index if args.metrics_port else None,
+            )
             p = multiprocessing.Process(target=record_user, args=(config,))
             p.start()
             processes.append(p)
@@ -59,12 +166,23 @@ def run_recordings(args, mode, cookies):
         record_user(config)
 
 
+def check_update_in_background():
+    from utils.logger_manager import logger
+    from check_updates import check_updates
+
+    try:
+        if check_updates(install=False):
+            logger.info("The update will be installed at the next start.\n")
+    except Exception as ex:
+        logger.warning(f"Update check failed: {ex}")
+
+
 def main():
     from utils.args_handler import validate_and_parse_args
     from utils.utils import read_cookies
     from utils.logger_manager import logger
     from utils.custom_exceptions import TikTokRecorderError
-    from check_updates import check_updates
+    from check_updates import install_staged_update
 
     try:
         # validate and parse command line arguments
@@ -72,17 +190,30 @@ def main():
 
         # check for updates
         if args.update_check is True:
-            logger.info("Checking for updates...\n")
-            if check_updates():
+            if install_staged_update():
+                logger.info("Update installed, please restart the program.\n")
                 exit()
+
+            # downloaded in the background, the recordings start right away
+            threading.Thread(
+                target=check_update_in_background, name="update-check", daemon=True
+            ).start()
         else:
             logger.info("Skipped update check\n")
 
         # read cookies from the config file
         cookies = read_cookies()
 
+        # finish the conversions and uploads interrupted by the last exit
+        from core.post_processor import PostProcessor
+
+        PostProcessor.shared(args.convert_workers, args.upload_workers).resume()
+
         # run the recordings based on the parsed arguments
-        run_recordings(args, mode, cookies)
+        try:
+            run_recordings(args, mode, cookies)
+        finally:
+            wait_post_processing()
 
     except TikTokRecorderError as ex:
         logger.error(f"Application Error: {ex}")
@@ -1,87 +1,299 @@
 import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import deque
 from pathlib import Path
 
 from telethon import TelegramClient
+from telethon.errors import FilePartMissingError
+from telethon.tl.functions.upload import SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import InputFile, InputFileBig
 
 from utils.logger_manager import logger
 from utils.utils import read_telegram_config
+from utils.video_management import VideoManagement
 
 
 FREE_USER_MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024
 PREMIUM_USER_MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024
 
+PART_SIZE = 512 * 1024  # the largest part accepted by Telegram
+BIG_FILE_SIZE = 10 * 1024 * 1024  # larger files are uploaded as big files
+UPLOAD_WORKERS = 4
+
+CAPTION = (
+    "🎥 <b>Video recorded via "
+    '<a href="https://github.com/Michele0303/'
+    'tiktok-live-recorder">'
+    "TikTok Live Recorder</a></b>"
+)
+
+
+class UploadState:
+    """
+    Parts of a file already sent to Telegram, saved next to the file so
+    that an interrupted upload resumes where it stopped. For a file too
+    large for the account, the split files already sent as messages.
+    """
+
+    SAVE_EVERY = 32  # parts
+
+    def __init__(
+        self,
+        file_path: str,
+        size: int,
+        file_id: int,
+        done=(),
+        split_size=None,
+        split_sent=(),
+    ):
+        self.path = f"{file_path}.upload.json"
+        self.size = size
+        self.file_id = file_id
+        self.done = set(done)
+        self.split_size = split_size  # max size the file was split for
+        self.split_sent = set(split_sent)  # numbers of the split files sent
+        self._unsaved = 0
+
+    @classmethod
+    def load(cls, file_path: str, size: int) -> "UploadState":
+        try:
+            data = json.loads(Path(f"{file_path}.upload.json").read_text())
+            if data["size"] == size and data["part_size"] == PART_SIZE:
+                return cls(
+                    file_path,
+                    size,
+                    data["file_id"],
+                    data["done"],
+                    data.get("split_size"),
+                    data.get("split_sent", ()),
+                )
+        except (OSError, ValueError, KeyError):
+            pass
+
+        return cls(file_path, size, random.getrandbits(63))
+
+    def mark_done(self, part: int) -> None:
+        self.done.add(part)
+        self._unsaved += 1
+        if self._unsaved >= self.SAVE_EVERY:
+            self.save()
+
+    def save(self) -> None:
+        data = {
+            "size": self.size,
+            "part_size": PART_SIZE,
+            "file_id": self.file_id,
+            "done": sorted(self.done),
+            "split_size": self.split_size,
+            "split_sent": sorted(self.split_sent),
+        }
+        try:
+            Path(f"{self.path}.tmp").write_text(json.dumps(data))
+            os.replace(f"{self.path}.tmp", self.path)
+            self._unsaved = 0
+        except OSError as ex:
+            logger.warning(f"Unable to save the upload progress: {ex}")
+
+    def remove(self) -> None:
+        Path(self.path).unlink(missing_ok=True)
+
 
 class Telegram:
-    def __init__(self):
+    def __init__(self, workers: int = UPLOAD_WORKERS):
         config = read_telegram_config()
 
         self.api_id = config["api_id"]
         self.api_hash = config["api_hash"]
         self.chat_id = config["chat_id"]
+        self.workers = workers
 
         self.client = TelegramClient(
             "tiktok_live_recorder_session",
             api_id=self.api_id,
             api_hash=self.api_hash,
         )
+        self._is_premium = None
 
-    def upload(self, file_path: str):
+    def upload(self, file_path: str) -> bool:
         """
         Upload a file to the user's Saved Messages via Telethon.
         """
 
         async def _upload():
             try:
-                await self.client.connect()
+                return await self.upload_async(file_path)
+            finally:
+                await self.close()
 
-                if not await self.client.is_user_authorized():
-                    await self.client.start()
+        return asyncio.run(_upload())
 
-                me = await self.client.get_me()
-                is_premium = me.premium
-                max_size = (
-                    PREMIUM_USER_MAX_FILE_SIZE
-                    if is_premium
-                    else FREE_USER_MAX_FILE_SIZE
-                )
+    async def upload_async(self, file_path: str) -> bool:
+        """
+        Same as upload(), from a running event loop. The connection and the
+        account type are kept for the next files until close() is called.
+        Files larger than the account limit are split and sent in parts.
+        Returns False if the upload failed and may be retried.
+        """
+        try:
+            await self._connect()
+            max_size = await self._max_file_size()
+
+            file_size = Path(file_path).stat().st_size
+            logger.info(
+                f"File to upload: {Path(file_path).name} "
+                f"({round(file_size / (1024 * 1024))} MB)"
+            )
+
+            if file_size <= max_size:
+                await self._send(file_path, CAPTION)
+                logger.info("File successfully uploaded to Telegram.\n")
+                return True
+
+            logger.info("The file is too large for this account, splitting it.")
+            state = UploadState.load(file_path, file_size)
+            if state.split_size != max_size:
+                state.split_size, state.split_sent = max_size, set()
+            parts = await asyncio.to_thread(
+                VideoManagement.split_mp4, file_path, max_size
+            )
+            if not parts:
+                return True  # nothing more can be done with this file
 
-                file_size = Path(file_path).stat().st_size
+            if state.split_sent:
                 logger.info(
-                    f"File to upload: {Path(file_path).name} "
-                    f"({round(file_size / (1024 * 1024))} MB)"
+                    f"Resuming upload: {len(state.split_sent)}/{len(parts)} "
+                    "parts already sent."
                 )
+            for index, part in enumerate(parts, start=1):
+                if index not in state.split_sent:
+                    await self._send(part, f"{CAPTION}\nPart {index}/{len(parts)}")
+                    state.split_sent.add(index)
+                    state.save()
+                os.remove(part)
+
+            state.remove()
+
+            logger.info(
+                f"File successfully uploaded to Telegram in {len(parts)} parts.\n"
+            )
+            return True
+
+        except Exception as e:
+            logger.error(f"Error during Telegram upload: {e}\n", exc_info=True)
+            return False
+
+    async def close(self):
+        await self.client.disconnect()
 
-                if file_size > max_size:
-                    logger.warning(
-                        "The file is too large to be uploaded "
-                        "with this type of account."
+    async def _connect(self) -> None:
+        if self.client.is_connected():
+            return
+
+        await self.client.connect()
+        if not await self.client.is_user_authorized():
+            await self.client.start()
+
+    async def _max_file_size(self) -> int:
+        if self._is_premium is None:
+            me = await self.client.get_me()
+            self._is_premium = bool(me.premium)
+
+        return (
+            PREMIUM_USER_MAX_FILE_SIZE if self._is_premium else FREE_USER_MAX_FILE_SIZE
+        )
+
+    async def _send(self, file_path: str, caption: str) -> None:
+        logger.info(
+            "Uploading video on Telegram... "
+            "This may take a while depending on file size."
+        )
+
+        input_file, state = await self._upload_parts(file_path)
+        try:
+            await self._send_file(input_file, caption)
+        except FilePartMissingError:
+            # the parts of an old attempt expired on the server
+            logger.warning("Upload progress expired, restarting the upload.")
+            state.remove()
+            input_file, state = await self._upload_parts(file_path)
+            await self._send_file(input_file, caption)
+
+        state.remove()
+
+    async def _send_file(self, input_file, caption: str) -> None:
+        await self.client.send_file(
+            entity=self.chat_id,
+            file=input_file,
+            caption=caption,
+            parse_mode="html",
+            force_document=True,
+        )
+
+    async def _upload_parts(self, file_path: str):
+        """
+        Sends the parts of the file with several concurrent requests,
+        skipping the parts sent by a previous attempt.
+        """
+        size = Path(file_path).stat().st_size
+        total_parts = max(1, -(-size // PART_SIZE))
+        is_big = size > BIG_FILE_SIZE
+
+        state = UploadState.load(file_path, size)
+        pending = deque(part for part in range(total_parts) if part not in state.done)
+        if state.done:
+            logger.info(f"Resuming upload: {len(state.done)}/{total_parts} parts sent.")
+
+        async def worker():
+            while pending:
+                part = pending.popleft()
+                data = await asyncio.to_thread(_read_part, file_path, part)
+
+                if is_big:
+                    request = SaveBigFilePartRequest(
+                        state.file_id, part, total_parts, data
                     )
-                    return
+                else:
+                    request = SaveFilePartRequest(state.file_id, part, data)
 
-                logger.info(
-                    "Uploading video on Telegram... "
-                    "This may take a while depending on file size."
-                )
+                if not await self.client(request):
+                    raise RuntimeError(f"Telegram refused part {part}")
+                state.mark_done(part)
 
-                await self.client.send_file(
-                    entity=self.chat_id,
-                    file=file_path,
-                    caption=(
-                        "🎥 <b>Video recorded via "
-                        '<a href="https://github.com/Michele0303/'
-                        'tiktok-live-recorder">'
-                        "TikTok Live Recorder</a></b>"
-                    ),
-                    parse_mode="html",
-                    force_document=True,
-                )
+        tasks = [
+            asyncio.create_task(worker())
+            for _ in range(min(self.workers, len(pending)))
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            state.save()
 
-                logger.info("File successfully uploaded to Telegram.\n")
+        name = Path(file_path).name
+        if is_big:
+            return InputFileBig(state.file_id, total_parts, name), state
 
-            except Exception as e:
-                logger.error(f"Error during Telegram upload: {e}\n", exc_info=True)
+        md5 = await asyncio.to_thread(_md5, file_path)
+        return InputFile(state.file_id, total_parts, name, md5), state
+
+
+def _read_part(file_path: str, part: int) -> bytes:
+    # runs in a thread: opening and reading the file both block
+    with open(file_path, "rb") as file:
+        file.seek(part * PART_SIZE)
+        return file.read(PART_SIZE)
 
-            finally:
-                await self.client.disconnect()
 
-        asyncio.run(_upload())
+def _md5(file_path: str) -> str:
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(PART_SIZE):
+            md5.update(chunk)
+    return md5.hexdigest()
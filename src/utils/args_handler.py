@@ -1,4 +1,5 @@
 import argparse
+import os
 import re
 
 from utils.custom_exceptions import ArgsParseError
@@ -57,12 +58,72 @@ def parse_args():
         action="store",
     )
 
+    parser.add_argument(
+        "-dormant_factor",
+        dest="dormant_factor",
+        help=(
+            "Poll users without lives in the last week up to this many times\n"
+            "less often, stretching the interval by one automatic_interval every\n"
+            "12 offline checks. [Default: 1 (always automatic_interval)]"
+        ),
+        type=int,
+        default=1,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-followers_page_size",
+        dest="followers_page_size",
+        help="Accounts requested per page of the followers list [Default: 30].",
+        type=int,
+        default=30,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-followers_full_sync",
+        dest="followers_full_sync",
+        help=(
+            "Interval in minutes between full reads of the followers list in\n"
+            "followers mode [Default: 360]. In between, only new follows are\n"
+            "read, every automatic_interval minutes."
+        ),
+        type=int,
+        default=360,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-probe_workers",
+        dest="probe_workers",
+        help=(
+            "Followers whose live status is resolved concurrently in followers\n"
+            "mode [Default: 8]. The requests still respect -rate_limit."
+        ),
+        type=int,
+        default=8,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-watch_url",
+        dest="watch_url",
+        help=(
+            "Long-poll endpoint announcing live starts, checked as soon as an\n"
+            "event arrives. Polling keeps running as fallback.\n"
+            "Example: -watch_url http://127.0.0.1:8000/webcast/push/"
+        ),
+        action="store",
+    )
+
     parser.add_argument(
         "-proxy",
         dest="proxy",
         help=(
             "Use HTTP proxy to bypass login restrictions in some countries.\n"
-            "Example: -proxy http://127.0.0.1:8080"
+            "Several proxies can be given, separated by commas or one per line\n"
+            "in a file: the live checks are spread over the healthiest ones.\n"
+            "Example: -proxy http://127.0.0.1:8080 or -proxy proxies.txt"
         ),
         action="store",
     )
@@ -83,6 +144,111 @@ def parse_args():
         action="store",
     )
 
+    parser.add_argument(
+        "-segment_minutes",
+        dest="segment_minutes",
+        help=(
+            "Split the recording into segments of this many minutes, cut at "
+            "keyframes.\n"
+            "Each segment is converted (and uploaded) while recording goes on."
+        ),
+        type=int,
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-segment_size",
+        dest="segment_size",
+        help=(
+            "Split the recording into segments of about this many MB, cut at "
+            "keyframes.\n"
+            "With -telegram, segments never exceed the Telegram upload limit."
+        ),
+        type=int,
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-redundant",
+        dest="redundant",
+        action="store_true",
+        help=(
+            "Pull the live from the main and the backup CDN edge at once and\n"
+            "merge them, so that a stalling edge leaves no gap in the recording.\n"
+            "Downloads the stream about twice."
+        ),
+    )
+
+    parser.add_argument(
+        "-protocol",
+        dest="protocol",
+        help=(
+            "How the live is pulled: (flv, hls) [Default: flv]\n"
+            "[flv] => One long-lived FLV connection.\n"
+            "[hls] => Poll the HLS playlist and download its segments in\n"
+            "         parallel. Records MPEG-TS; cannot be combined with\n"
+            "         -remux native, -segment_minutes, -segment_size or -redundant."
+        ),
+        default="flv",
+        action="store",
+    )
+
+    parser.add_argument(
+        "-hls_workers",
+        dest="hls_workers",
+        help="HLS segments downloaded at once with -protocol hls [Default: 4].",
+        type=int,
+        default=4,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-bandwidth",
+        dest="bandwidth",
+        help=(
+            "Download budget in Mbit/s shared by the recordings. Each stream\n"
+            "is recorded in the best quality that fits, and switched to a\n"
+            "lower or higher one as the others start and end.\n"
+            "[Default: None (always the best quality)]"
+        ),
+        type=float,
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-priority",
+        dest="priority",
+        help=(
+            "Priorities of the users for the -bandwidth budget, higher first.\n"
+            "Users not listed have priority 1. Example: -priority alice:3,bob:2"
+        ),
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-convert_workers",
+        dest="convert_workers",
+        help=("Number of conversions run in parallel in the background [Default: 1]."),
+        type=int,
+        default=1,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-upload_workers",
+        dest="upload_workers",
+        help=(
+            "Number of parts of a file uploaded in parallel to Telegram [Default: 4]."
+        ),
+        type=int,
+        default=4,
+        action="store",
+    )
+
     parser.add_argument(
         "-telegram",
         dest="telegram",
@@ -98,6 +264,137 @@ def parse_args():
         action="store",
     )
 
+    parser.add_argument(
+        "-rate_limit",
+        dest="rate_limit",
+        help=(
+            "Maximum number of requests per second sent to TikTok and tikrec\n"
+            "by the live status checks, shared by all monitored users. [Default: 5]"
+        ),
+        type=float,
+        default=5,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-cache_file",
+        dest="cache_file",
+        help=(
+            "Persist the username/room ID caches to this SQLite file,\n"
+            "so that a restart does not resolve every user again.\n"
+            "Example: -cache_file cache.db"
+        ),
+        action="store",
+    )
+
+    parser.add_argument(
+        "-http_pool_size",
+        dest="http_pool_size",
+        help=(
+            "Number of connections kept alive per host, shared by all the\n"
+            "monitored users of a process. [Default: 10]"
+        ),
+        type=int,
+        default=10,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-http2",
+        dest="http2",
+        action="store_true",
+        help="Send the TikTok API requests over HTTP/2 (not available on Termux).",
+    )
+
+    parser.add_argument(
+        "-metrics_port",
+        dest="metrics_port",
+        help=(
+            "Serve Prometheus metrics on http://127.0.0.1:PORT/metrics.\n"
+            "With the process engine, the recorder of the n-th user uses PORT + n."
+        ),
+        type=int,
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-control_port",
+        dest="control_port",
+        help=(
+            "Run as a daemon controlled on http://127.0.0.1:PORT: users are\n"
+            "added, removed, paused and listed at runtime, with no restart.\n"
+            "Implies -engine asyncio; -user is optional."
+        ),
+        type=int,
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-cluster",
+        dest="cluster",
+        help=(
+            "Share the users among several recorder processes or machines:\n"
+            "(coordinator, worker) [Default: None]\n"
+            "[coordinator] => Assigns the -user list to the live workers with\n"
+            "                 consistent hashing, again when one joins or leaves.\n"
+            "[worker] => Records the users assigned to it, in automatic mode."
+        ),
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-cluster_db",
+        dest="cluster_db",
+        help=(
+            "SQLite file shared by the coordinator and the workers\n"
+            "[Default: cluster.db]."
+        ),
+        default="cluster.db",
+        action="store",
+    )
+
+    parser.add_argument(
+        "-worker_name",
+        dest="worker_name",
+        help=(
+            "Name of this worker in the cluster, kept across restarts so that\n"
+            "it gets the same users back. [Default: hostname-pid]"
+        ),
+        default=None,
+        action="store",
+    )
+
+    parser.add_argument(
+        "-engine",
+        dest="engine",
+        help=(
+            "Engine used when recording multiple users: (process, asyncio) "
+            "[Default: process]\n"
+            "[process] => One process per user.\n"
+            "[asyncio] => All users monitored from a single process and event loop."
+        ),
+        default="process",
+        action="store",
+    )
+
+    parser.add_argument(
+        "-remux",
+        dest="remux",
+        help=(
+            "When the FLV stream is converted to MP4: (post, pipe, native) "
+            "[Default: post]\n"
+            "[post] => Record to FLV, then convert it once the live ends.\n"
+            "[pipe] => Remux to fragmented MP4 with ffmpeg while recording.\n"
+            "[native] => Remux to fragmented MP4 in process, without ffmpeg.\n"
+            "            Cannot be combined with -bitrate."
+        ),
+        default="post",
+        action="store",
+    )
+
     parser.add_argument(
         "-no-update-check",
         dest="update_check",
@@ -113,6 +410,40 @@ def parse_args():
     return args
 
 
+def parse_proxies(value: str) -> list:
+    """
+    Returns the proxies of a comma separated list, or of a file with one
+    proxy per line.
+    """
+    if os.path.isfile(value):
+        with open(value, "r") as f:
+            lines = [line.split("#", 1)[0] for line in f]
+    else:
+        lines = value.split(",")
+
+    return list(dict.fromkeys(line.strip() for line in lines if line.strip()))
+
+
+def parse_priorities(value: str) -> dict:
+    """
+    Returns the user -> priority map of a comma separated list of user:N.
+    """
+    priorities = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+
+        user, _, priority = item.partition(":")
+        try:
+            priorities[user.strip().lstrip("@")] = int(priority)
+        except ValueError:
+            raise ArgsParseError(
+                f"Incorrect priority '{item.strip()}'. Use user:N, e.g. alice:3."
+            )
+
+    return priorities
+
+
 def validate_and_parse_args():
     args = parse_args()
 
@@ -125,7 +456,95 @@ def validate_and_parse_args():
             "Incorrect mode value. Choose between 'manual', 'automatic' or 'followers'."
         )
 
-    if args.mode in ["manual", "automatic"]:
+    if args.engine not in ["process", "asyncio"]:
+        raise ArgsParseError(
+            "Incorrect engine value. Choose between 'process' or 'asyncio'."
+        )
+
+    if args.segment_minutes is not None and args.segment_minutes <= 0:
+        raise ArgsParseError("Segment minutes must be greater than 0.")
+
+    if args.segment_size is not None and args.segment_size <= 0:
+        raise ArgsParseError("Segment size must be greater than 0.")
+
+    if args.convert_workers <= 0:
+        raise ArgsParseError("Convert workers must be greater than 0.")
+
+    if args.upload_workers <= 0:
+        raise ArgsParseError("Upload workers must be greater than 0.")
+
+    if args.proxy:
+        args.proxy = parse_proxies(args.proxy)
+        if not args.proxy:
+            raise ArgsParseError("The proxy list is empty.")
+
+    if args.bandwidth is not None and args.bandwidth <= 0:
+        raise ArgsParseError("Bandwidth must be greater than 0.")
+
+    if args.priority:
+        args.priority = parse_priorities(args.priority)
+
+    if args.metrics_port is not None and not 0 < args.metrics_port < 65536:
+        raise ArgsParseError("Metrics port must be between 1 and 65535.")
+
+    if args.control_port is not None:
+        if not 0 < args.control_port < 65536:
+            raise ArgsParseError("Control port must be between 1 and 65535.")
+        if args.mode == "followers":
+            raise ArgsParseError(
+                "-control_port monitors the users it is given, not followers."
+            )
+        if args.room_id or args.url:
+            raise ArgsParseError("-control_port takes usernames, not room_id or url.")
+
+    if args.cluster is not None:
+        if args.cluster not in ["coordinator", "worker"]:
+            raise ArgsParseError(
+                "Incorrect cluster value. Choose between 'coordinator' or 'worker'."
+            )
+        if args.room_id or args.url:
+            raise ArgsParseError("-cluster takes usernames, not room_id or url.")
+        if args.cluster == "coordinator" and not args.user:
+            raise ArgsParseError("The cluster coordinator needs the -user list.")
+        if args.cluster == "worker":
+            if args.mode != "automatic":
+                raise ArgsParseError("Cluster workers run in automatic mode.")
+            if args.user or args.control_port is not None:
+                raise ArgsParseError(
+                    "The users of a cluster worker come from the coordinator, "
+                    "drop -user and -control_port."
+                )
+
+    if args.http_pool_size <= 0:
+        raise ArgsParseError("HTTP pool size must be greater than 0.")
+
+    if args.remux not in ["post", "pipe", "native"]:
+        raise ArgsParseError(
+            "Incorrect remux value. Choose between 'post', 'pipe' or 'native'."
+        )
+
+    if args.remux == "native" and args.bitrate:
+        raise ArgsParseError("-remux native only copies the stream, drop -bitrate.")
+
+    if args.protocol not in ["flv", "hls"]:
+        raise ArgsParseError("Incorrect protocol value. Choose between 'flv' or 'hls'.")
+
+    if args.hls_workers <= 0:
+        raise ArgsParseError("HLS workers must be greater than 0.")
+
+    if args.protocol == "hls":
+        if args.remux == "native":
+            raise ArgsParseError("-remux native only reads FLV, drop -protocol hls.")
+        if args.segment_minutes or args.segment_size or args.redundant:
+            raise ArgsParseError(
+                "-segment_minutes, -segment_size and -redundant need -protocol flv."
+            )
+
+    if (
+        args.mode in ["manual", "automatic"]
+        and args.control_port is None
+        and args.cluster != "worker"
+    ):
         if not args.user and not args.room_id and not args.url:
             raise ArgsParseError(
                 "Missing URL, username, or room ID. Please provide one of these parameters."
@@ -167,6 +586,21 @@ def validate_and_parse_args():
             "Incorrect automatic_interval value. Must be one minute or more."
         )
 
+    if args.dormant_factor < 1:
+        raise ArgsParseError("Dormant factor must be 1 or more.")
+
+    if args.followers_page_size <= 0:
+        raise ArgsParseError("Followers page size must be greater than 0.")
+
+    if args.followers_full_sync <= 0:
+        raise ArgsParseError("Followers full sync interval must be greater than 0.")
+
+    if args.probe_workers <= 0:
+        raise ArgsParseError("Probe workers must be greater than 0.")
+
+    if args.rate_limit <= 0:
+        raise ArgsParseError("Incorrect rate_limit value. Must be greater than 0.")
+
     if args.mode == "manual":
         mode = Mode.MANUAL
     elif args.mode == "automatic":
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.logger_manager import logger
+
+
+class SQLiteStore:
+    """
+    Persistent backend for TTLCache, so that a restart begins with a warm
+    cache. Several processes can share the same file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, expires REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+
+    def load(self, namespace: str, limit: int) -> list:
+        """
+        Returns the (key, value, expires) entries still valid, oldest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, expires FROM cache "
+                "WHERE namespace = ? AND expires > ? ORDER BY expires DESC LIMIT ?",
+                (namespace, time.time(), limit),
+            ).fetchall()
+        return [(key, json.loads(value), expires) for key, value, expires in rows][::-1]
+
+    def put(self, namespace: str, key: str, value, expires: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires),
+            )
+
+    def put_many(self, namespace: str, entries: list) -> None:
+        """
+        Stores many (key, value, expires) entries in a single transaction.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                [
+                    (namespace, key, json.dumps(value), expires)
+                    for key, value, expires in entries
+                ],
+            )
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            )
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_size: int = 4096,
+        store: SQLiteStore | None = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.store = store
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # key -> (value, expires)
+        self._lock = threading.Lock()
+
+        if store is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        """
+        Returns the cached value, or None when missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value) -> None:
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        if self.store is not None:
+            self._persist(self.store.put, self.name, key, value, expires)
+
+    def set_many(self, items: dict) -> None:
+        expires = time.time() + self.ttl
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        if self.store is not None and items:
+            entries = [(key, value, expires) for key, value in items.items()]
+            self._persist(self.store.put_many, self.name, entries)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return
+
+        if self.store is not None:
+            self._persist(self.store.delete, self.name, key)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _load(self) -> None:
+        try:
+            entries = self.store.load(self.name, self.max_size)
+        except sqlite3.Error as ex:
+            logger.warning(f"Unable to load the {self.name} cache: {ex}")
+            return
+
+        for key, value, expires in entries:
+            self._entries[key] = (value, expires)
+
+    def _persist(self, operation, *args) -> None:
+        # the cache keeps working in memory if the file is not writable
+        try:
+            operation(*args)
+        except sqlite3.Error as ex:
+            logger.warning(f"Unable to update the {self.name} cache: {ex}")
@@ -35,3 +35,15 @@ class NetworkError(TikTokRecorderError):
     """Raised for network-related errors."""
 
     pass
+
+
+class OutputWriteError(TikTokRecorderError):
+    """Raised when the recording cannot be written to its output."""
+
+    pass
+
+
+class UnsupportedStreamError(TikTokRecorderError):
+    """Raised when the native remuxer cannot copy a stream."""
+
+    pass
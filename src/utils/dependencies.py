@@ -1,14 +1,24 @@
-import subprocess
+import hashlib
+import json
+import os
 import platform
+import shutil
+import site
+import subprocess
+import sys
+from importlib.util import find_spec
 from subprocess import SubprocessError
 
 from .logger_manager import logger
 
+# result of the last successful check, valid while its key is unchanged
+DEPENDENCIES_CACHE = "dependencies.json"
+
 
 def check_ffmpeg_binary():
     try:
         subprocess.run(
-            ["ffmpeg"],
+            ["ffmpeg", "-version"],
             stdout=subprocess.DEVNULL,
             stderr=subprocess.STDOUT,
         )
@@ -53,81 +63,55 @@ def install_ffmpeg_binary():
     exit(1)
 
 
+# the libraries are looked up, not imported, as importing them is slow
 def check_distro_library():
-    try:
-        import distro
-
-        _ = distro  # to avoid linting issues
-
+    if find_spec("distro") is not None:
         return True
-    except ModuleNotFoundError:
-        logger.error("distro library is not installed")
-        return False
 
+    logger.error("distro library is not installed")
+    return False
 
-def check_ffmpeg_library():
-    try:
-        import ffmpeg
-
-        _ = ffmpeg  # to avoid linting issues
 
+def check_ffmpeg_library():
+    if find_spec("ffmpeg") is not None:
         return True
-    except ModuleNotFoundError:
-        logger.error("ffmpeg-python library is not installed")
-        return False
 
+    logger.error("ffmpeg-python library is not installed")
+    return False
 
-def check_argparse_library():
-    try:
-        import argparse
-
-        _ = argparse  # to avoid linting issues
 
+def check_argparse_library():
+    if find_spec("argparse") is not None:
         return True
-    except ModuleNotFoundError:
-        logger.error("argparse library is not installed")
-        return False
-
-
-def check_curl_cffi_library():
-    try:
-        from .utils import is_termux
 
-        if is_termux():
-            return True
+    logger.error("argparse library is not installed")
+    return False
 
-        import curl_cffi
 
-        _ = curl_cffi  # to avoid linting issues
+def check_curl_cffi_library():
+    from .utils import is_termux
 
+    if is_termux() or find_spec("curl_cffi") is not None:
         return True
-    except ModuleNotFoundError:
-        logger.error("curl_cffi library is not installed")
-        return False
-
 
-def check_requests_library():
-    try:
-        import requests
+    logger.error("curl_cffi library is not installed")
+    return False
 
-        _ = requests  # to avoid linting issues
 
+def check_requests_library():
+    if find_spec("requests") is not None:
         return True
-    except ModuleNotFoundError:
-        logger.error("requests library is not installed")
-        return False
 
+    logger.error("requests library is not installed")
+    return False
 
-def check_telethon_library():
-    try:
-        import telethon
-
-        _ = telethon  # to avoid linting issues
 
+def check_telethon_library():
+    if find_spec("telethon") is not None:
         return True
-    except ModuleNotFoundError:
-        logger.error("telethon library is not installed")
-        return False
+
+    logger.error("telethon library is not installed")
+    return False
 
 
 def install_requirements():
@@ -147,7 +131,44 @@ def install_requirements():
         exit(1)
 
 
+def _cache_key() -> str:
+    """
+    Changes when the interpreter, the installed packages or the ffmpeg
+    binary change.
+    """
+    parts = [sys.executable, sys.version]
+    ffmpeg = shutil.which("ffmpeg")
+    paths = site.getsitepackages() + [site.getusersitepackages()]
+    for path in [ffmpeg] + paths if ffmpeg else paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _cached_key() -> str | None:
+    try:
+        with open(DEPENDENCIES_CACHE) as file:
+            return json.load(file).get("key")
+    except (OSError, ValueError):
+        return None
+
+
+def _save_key(key: str) -> None:
+    try:
+        with open(DEPENDENCIES_CACHE, "w") as file:
+            json.dump({"key": key}, file)
+    except OSError as ex:
+        logger.debug(f"Unable to cache the dependency check: {ex}")
+
+
 def check_and_install_dependencies():
+    # the libraries and ffmpeg were already found in this environment
+    if _cached_key() == _cache_key():
+        return
+
     logger.info("Checking and Installing dependencies...")
 
     dependencies = [
@@ -165,3 +186,6 @@ def check_and_install_dependencies():
 
     if not check_ffmpeg_binary():
         install_ffmpeg_binary()
+
+    # computed again: installing may have changed it
+    _save_key(_cache_key())
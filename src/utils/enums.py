@@ -25,6 +25,9 @@ class StatusCode(IntEnum):
     OK = 200
     REDIRECT = 302
     MOVED = 301
+    FORBIDDEN = 403
+    TOO_MANY_REQUESTS = 429
+    SERVER_ERROR = 500
 
 
 class Mode(IntEnum):
@@ -0,0 +1,179 @@
+import struct
+from typing import NamedTuple
+
+from utils.custom_exceptions import UnsupportedStreamError
+
+TAG_AUDIO = 8
+TAG_VIDEO = 9
+TAG_SCRIPT = 18
+
+HEADER_SIZE = 9
+TAG_HEADER_SIZE = 11
+PREVIOUS_TAG_SIZE = 4
+
+CODEC_AVC = 7
+SOUND_AAC = 10
+
+AVC_SEQUENCE_HEADER = 0
+AVC_NALU = 1
+AAC_SEQUENCE_HEADER = 0
+
+
+class FlvTag(NamedTuple):
+    type: int
+    timestamp: int  # milliseconds
+    data: bytes
+
+
+class FlvParser:
+    """
+    Incremental FLV demuxer: bytes are fed as they arrive and complete tags
+    are returned, so a file or a live stream never has to fit in memory.
+
+    A new FLV header in the middle of the data (a reconnection appended to
+    the same file) is skipped.
+    """
+
+    def __init__(self):
+        self.has_audio = True
+        self.has_video = True
+        self.header_parsed = False
+
+        self._buffer = bytearray()
+
+    def feed(self, data) -> list:
+        buffer = self._buffer
+        buffer += data
+        tags = []
+        offset = 0
+
+        while True:
+            if buffer[offset : offset + 3] == b"FLV":
+                size = self._parse_header(buffer, offset)
+                if size is None:
+                    break
+                offset += size
+                continue
+
+            if len(buffer) - offset < TAG_HEADER_SIZE:
+                break
+
+            tag_type, size_hi, size_lo, timestamp = struct.unpack_from(
+                ">BBHI", buffer, offset
+            )
+            tag_type &= 0x1F
+            if tag_type not in (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT):
+                raise UnsupportedStreamError(f"Invalid FLV tag type: {tag_type}")
+
+            data_size = size_hi << 16 | size_lo
+            end = offset + TAG_HEADER_SIZE + data_size + PREVIOUS_TAG_SIZE
+            if len(buffer) < end:
+                break
+
+            # 24 bit timestamp followed by its upper 8 bits
+            timestamp = (timestamp >> 8) | ((timestamp & 0xFF) << 24)
+
+            start = offset + TAG_HEADER_SIZE
+            tags.append(
+                FlvTag(tag_type, timestamp, bytes(buffer[start : start + data_size]))
+            )
+            offset = end
+
+        del buffer[:offset]
+        return tags
+
+    def _parse_header(self, buffer, offset: int) -> int | None:
+        """
+        Returns the size of the header and the first PreviousTagSize field,
+        None when more data is needed.
+        """
+        if len(buffer) - offset < HEADER_SIZE:
+            return None
+
+        _, flags, header_size = struct.unpack_from(">4sBI", buffer, offset)
+        if len(buffer) - offset < header_size + PREVIOUS_TAG_SIZE:
+            return None
+
+        if not self.header_parsed:
+            self.has_audio = bool(flags & 0x04)
+            self.has_video = bool(flags & 0x01)
+            self.header_parsed = True
+
+        return header_size + PREVIOUS_TAG_SIZE
+
+
+def parse_video_tag(data: bytes) -> tuple:
+    """
+    Returns (keyframe, packet_type, composition_time, payload) of an
+    H.264 video tag.
+    """
+    frame_type = data[0] >> 4
+    codec_id = data[0] & 0x0F
+    if frame_type & 0x08 or codec_id != CODEC_AVC:
+        raise UnsupportedStreamError(f"Unsupported FLV video codec: {data[0]:#04x}")
+
+    packet_type = data[1]
+    composition_time = int.from_bytes(data[2:5], "big", signed=True)
+    return frame_type == 1, packet_type, composition_time, data[5:]
+
+
+def parse_audio_tag(data: bytes) -> tuple:
+    """
+    Returns (packet_type, payload) of an AAC audio tag.
+    """
+    sound_format = data[0] >> 4
+    if sound_format != SOUND_AAC:
+        raise UnsupportedStreamError(f"Unsupported FLV audio codec: {sound_format}")
+
+    return data[1], data[2:]
+
+
+def flv_header(has_audio=True, has_video=True) -> bytes:
+    """
+    FLV file header followed by the first PreviousTagSize field.
+    """
+    flags = (0x04 if has_audio else 0) | (0x01 if has_video else 0)
+    return struct.pack(">3sBBII", b"FLV", 1, flags, HEADER_SIZE, 0)
+
+
+def serialize_tag(tag: FlvTag, timestamp: int | None = None) -> bytes:
+    timestamp = tag.timestamp if timestamp is None else timestamp
+    size = len(tag.data)
+    header = struct.pack(
+        ">BBHI3x",
+        tag.type,
+        size >> 16,
+        size & 0xFFFF,
+        (timestamp & 0xFFFFFF) << 8 | (timestamp >> 24) & 0xFF,
+    )
+    return b"".join((header, tag.data, struct.pack(">I", TAG_HEADER_SIZE + size)))
+
+
+def is_keyframe(tag: FlvTag) -> bool:
+    """
+    True for a video frame that starts a GOP, with or without enhanced FLV.
+    """
+    return (
+        tag.type == TAG_VIDEO
+        and len(tag.data) > 1
+        and (tag.data[0] >> 4) & 0x07 == 1
+        and not is_sequence_header(tag)
+    )
+
+
+def is_sequence_header(tag: FlvTag) -> bool:
+    """
+    True for the tags carrying the decoder configuration.
+    """
+    if len(tag.data) < 2:
+        return False
+
+    if tag.type == TAG_VIDEO:
+        if tag.data[0] & 0x80:  # enhanced FLV: the packet type is in the low bits
+            return tag.data[0] & 0x0F == 0
+        return tag.data[1] == AVC_SEQUENCE_HEADER
+
+    if tag.type == TAG_AUDIO:
+        return tag.data[0] >> 4 == SOUND_AAC and tag.data[1] == AAC_SEQUENCE_HEADER
+
+    return False
@@ -0,0 +1,402 @@
+import os
+import struct
+
+from utils.flv import (
+    HEADER_SIZE,
+    PREVIOUS_TAG_SIZE,
+    TAG_AUDIO,
+    TAG_HEADER_SIZE,
+    TAG_SCRIPT,
+    TAG_VIDEO,
+    FlvTag,
+    is_keyframe,
+    is_sequence_header,
+)
+from utils.logger_manager import logger
+from utils.stream_writer import writev_all
+
+FRAME_DURATION = 33  # ms, until the stream tells otherwise
+
+
+class FlvStitcher:
+    """
+    File-like sink that joins the FLV streams of successive connections
+    into one continuous stream.
+
+    After reconnect(), the FLV header and metadata of the new connection
+    are dropped, the stream resumes at its first keyframe and its
+    timestamps are shifted to follow the last written tag, so players and
+    remuxers see a single recording. Sequence headers are only repeated
+    when the decoder configuration changed.
+
+    Until the first reconnect the stream is written unchanged, with
+    os.writev when the sink has a file descriptor: only the tag headers
+    are read, and the incomplete last tag is held back so a reconnect
+    can drop it.
+
+    Data that does not start with an FLV header is written unchanged.
+    """
+
+    def __init__(self, sink, name: str = ""):
+        self.sink = sink
+        self.name = name
+
+        self._buffer = bytearray()
+        self._expect_header = True
+        self._header_written = False
+        self._passthrough = False
+        self._has_video = True
+
+        self._resuming = False  # dropping tags until the first keyframe
+        self._offset = 0  # added to the timestamps of the current connection
+        self._last_timestamp = None
+        self._last_video = None
+        self._frame_duration = FRAME_DURATION
+        self._configs = {}  # tag type -> last sequence header
+
+        try:
+            self._fd = sink.fileno()
+        except (AttributeError, OSError):
+            self._fd = None  # not backed by a file descriptor, e.g. a muxer
+
+        self._direct = True  # written unchanged until the first reconnect
+        self._head = bytearray()  # start of the tag being scanned
+        self._need = 3  # bytes of it needed to parse it
+        self._skip = 0  # bytes of the scanned tag still to come
+        self._tag = None  # (end, type) of the scanned tag
+        self._received = 0  # bytes scanned
+        self._complete = 0  # end of the last complete tag scanned
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def reconnect(self) -> None:
+        """
+        Announces that the next data comes from a new connection.
+        An incomplete tag of the previous one is dropped.
+        """
+        if self._passthrough:
+            return
+
+        self._direct = False
+        self._head.clear()
+        self._tag = None
+        self._buffer.clear()
+        self._expect_header = True
+        if self._last_timestamp is not None:
+            self._resuming = True
+
+    def writev(self, views: list) -> None:
+        """
+        Writes a batch of buffers, in a single call while the stream is
+        written unchanged.
+        """
+        if not self._direct:
+            for view in views:
+                self.write(view)
+            return
+
+        start = self._received
+        for view in views:
+            self._scan(view)
+
+        cut = self._complete - start
+        if cut <= 0:
+            # no tag ended in this batch
+            for view in views:
+                self._buffer += view
+            return
+
+        out = [memoryview(self._buffer)] if self._buffer else []
+        tail = bytearray()
+        for view in views:
+            if cut >= len(view):
+                out.append(view)
+                cut -= len(view)
+            else:
+                if cut:
+                    out.append(view[:cut])
+                tail += view[cut:]
+                cut = 0
+
+        if self._fd is None or not hasattr(os, "writev"):
+            for view in out:
+                self.sink.write(view)
+        else:
+            writev_all(self._fd, out)
+        out.clear()
+        self._buffer = tail
+
+    def write(self, data) -> None:
+        if self._direct:
+            self.writev([memoryview(data)])
+            return
+
+        if self._passthrough:
+            self.sink.write(data)
+            return
+
+        buffer = self._buffer
+        buffer += data
+        offset = 0
+        kept = []  # (start, end) ranges of the buffer to write
+
+        while True:
+            if self._expect_header:
+                size = self._header(buffer, offset, kept)
+                if size is None:
+                    break
+                if self._passthrough:
+                    self.sink.write(bytes(buffer[offset:]))
+                    buffer.clear()
+                    return
+                offset += size
+                continue
+
+            if len(buffer) - offset < TAG_HEADER_SIZE:
+                break
+
+            tag_type, size_hi, size_lo = struct.unpack_from(">BBH", buffer, offset)
+            tag_type &= 0x1F
+            end = offset + TAG_HEADER_SIZE + (size_hi << 16 | size_lo)
+            end += PREVIOUS_TAG_SIZE
+            if tag_type not in (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT):
+                logger.warning(
+                    f"{self.name}: invalid FLV tag type {tag_type}, "
+                    "writing the rest of the stream unchanged."
+                )
+                self._passthrough = True
+                self._write(buffer, kept)
+                self.sink.write(bytes(buffer[offset:]))
+                buffer.clear()
+                return
+
+            if len(buffer) < end:
+                break
+
+            if self._keep(buffer, offset, end, tag_type):
+                if kept and kept[-1][1] == offset:
+                    kept[-1] = (kept[-1][0], end)
+                else:
+                    kept.append((offset, end))
+            offset = end
+
+        self._write(buffer, kept)
+        del buffer[:offset]
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+    def close(self) -> None:
+        # an incomplete last tag is not playable
+        self._buffer.clear()
+
+    def _write(self, buffer, kept) -> None:
+        for start, end in kept:
+            self.sink.write(bytes(buffer[start:end]))
+
+    def _scan(self, view) -> None:
+        """
+        Follows the tags of data written unchanged, so the next connection
+        can be stitched after them. Only the tag headers are copied.
+        """
+        position = 0
+        size = len(view)
+        while position < size and not self._passthrough:
+            if not self._skip and not self._head and not self._expect_header:
+                # a tag inside this buffer is read where it is
+                end = position + TAG_HEADER_SIZE + PREVIOUS_TAG_SIZE
+                if end <= size:
+                    tag_type, size_hi, size_lo = struct.unpack_from(
+                        ">BBH", view, position
+                    )
+                    tag_type &= 0x1F
+                    end += size_hi << 16 | size_lo
+                    if end <= size and tag_type in (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT):
+                        self._track(view, position, end, tag_type)
+                        position = end
+                        self._complete = self._received + position
+                        continue
+
+            if self._skip:
+                step = min(self._skip, size - position)
+                self._skip -= step
+            else:
+                step = min(self._need - len(self._head), size - position)
+                self._head += view[position : position + step]
+                if len(self._head) == self._need:
+                    self._parse_head()
+            position += step
+
+            if self._tag is not None and not self._skip:
+                # only complete tags count, an incomplete one is dropped
+                self._track(self._head, 0, *self._tag)
+                self._tag = None
+                self._head.clear()
+                self._need = TAG_HEADER_SIZE
+            if not self._head:
+                self._complete = self._received + position
+
+        self._received += size
+        if self._passthrough:
+            self._complete = self._received
+
+    def _parse_head(self) -> None:
+        """
+        Reads the FLV header or tag collected by _scan(), or asks for more.
+        """
+        head = self._head
+        if self._expect_header:
+            size = self._header(head, 0, [])
+            if size is None:
+                self._need = HEADER_SIZE
+                if len(head) >= HEADER_SIZE:
+                    header_size = struct.unpack_from(">I", head, 5)[0]
+                    self._need = header_size + PREVIOUS_TAG_SIZE
+                return
+        else:
+            tag_type, size_hi, size_lo = struct.unpack_from(">BBH", head)
+            tag_type &= 0x1F
+            if tag_type not in (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT):
+                logger.warning(
+                    f"{self.name}: invalid FLV tag type {tag_type}, "
+                    "writing the rest of the stream unchanged."
+                )
+                self._passthrough = True
+                return
+
+            end = TAG_HEADER_SIZE + (size_hi << 16 | size_lo) + PREVIOUS_TAG_SIZE
+            need = min(end, TAG_HEADER_SIZE + 2)
+            if len(head) < need:
+                self._need = need
+                return
+
+            start = bytes(head[TAG_HEADER_SIZE:need])
+            if len(head) < end and is_sequence_header(FlvTag(tag_type, 0, start)):
+                self._need = end  # kept whole, to compare the next ones
+                return
+
+            self._tag = (end, tag_type)
+            self._skip = end - len(head)
+            return
+
+        head.clear()
+        self._need = TAG_HEADER_SIZE
+
+    def _header(self, buffer, offset: int, kept: list) -> int | None:
+        """
+        Handles the FLV header expected at the start of a connection.
+        Returns its size, None when more data is needed.
+        """
+        available = len(buffer) - offset
+        if available < 3:
+            return None
+
+        if buffer[offset : offset + 3] != b"FLV":
+            self._expect_header = False
+            if not self._header_written:
+                logger.warning(f"{self.name}: not an FLV stream, written unchanged.")
+                self._passthrough = True
+            return 0
+
+        if available < HEADER_SIZE:
+            return None
+        _, flags, header_size = struct.unpack_from(">4sBI", buffer, offset)
+        size = header_size + PREVIOUS_TAG_SIZE
+        if available < size:
+            return None
+
+        self._expect_header = False
+        if not self._header_written:
+            self._has_video = bool(flags & 0x01)
+            self._header_written = True
+            kept.append((offset, offset + size))
+        return size
+
+    def _keep(self, buffer, offset: int, end: int, tag_type: int) -> bool:
+        """
+        Decides whether a tag is written, and rebases its timestamp.
+        """
+        start = offset + TAG_HEADER_SIZE
+        timestamp = buffer[offset + 4] << 16 | buffer[offset + 5] << 8
+        timestamp |= buffer[offset + 6] | buffer[offset + 7] << 24
+        tag = FlvTag(tag_type, timestamp, bytes(buffer[start : min(start + 2, end)]))
+
+        if tag_type == TAG_SCRIPT:
+            # the metadata of a later connection would reset players
+            if self._last_timestamp is not None:
+                return False
+        elif is_sequence_header(tag):
+            config = bytes(buffer[start : end - PREVIOUS_TAG_SIZE])
+            if self._configs.get(tag_type) == config:
+                return False
+            self._configs[tag_type] = config
+        elif self._resuming:
+            # frames before the first keyframe cannot be decoded
+            if self._has_video and not is_keyframe(tag):
+                return False
+            self._resume(timestamp)
+
+        if self._resuming:
+            # configuration changed before the first keyframe
+            rebased = self._last_timestamp
+        else:
+            rebased = max(0, timestamp + self._offset)
+
+        if rebased != timestamp:
+            struct.pack_into(
+                ">BBBB",
+                buffer,
+                offset + 4,
+                (rebased >> 16) & 0xFF,
+                (rebased >> 8) & 0xFF,
+                rebased & 0xFF,
+                (rebased >> 24) & 0xFF,
+            )
+
+        if tag_type == TAG_VIDEO and not is_sequence_header(tag):
+            if self._last_video is not None and 0 < rebased - self._last_video <= 1000:
+                self._frame_duration = rebased - self._last_video
+            self._last_video = rebased
+        if self._last_timestamp is None or rebased > self._last_timestamp:
+            self._last_timestamp = rebased
+        return True
+
+    def _track(self, buffer, offset: int, end: int, tag_type: int) -> None:
+        """
+        Records what _keep() would from a tag written unchanged.
+        """
+        if tag_type == TAG_SCRIPT and self._last_timestamp is not None:
+            return
+
+        high, low, extended = struct.unpack_from(">BHB", buffer, offset + 4)
+        timestamp = extended << 24 | high << 16 | low
+        start = offset + TAG_HEADER_SIZE
+        header = (
+            tag_type != TAG_SCRIPT
+            and end - start > PREVIOUS_TAG_SIZE + 1
+            # cheap test first: a zero packet type or the enhanced FLV bit
+            and (buffer[start + 1] == 0 or buffer[start] & 0x80)
+            and is_sequence_header(
+                FlvTag(tag_type, timestamp, bytes(buffer[start : start + 2]))
+            )
+        )
+
+        if header:
+            self._configs[tag_type] = bytes(buffer[start : end - PREVIOUS_TAG_SIZE])
+        elif tag_type == TAG_VIDEO:
+            if (
+                self._last_video is not None
+                and 0 < timestamp - self._last_video <= 1000
+            ):
+                self._frame_duration = timestamp - self._last_video
+            self._last_video = timestamp
+        if self._last_timestamp is None or timestamp > self._last_timestamp:
+            self._last_timestamp = timestamp
+
+    def _resume(self, timestamp: int) -> None:
+        self._resuming = False
+        self._offset = self._last_timestamp + self._frame_duration - timestamp
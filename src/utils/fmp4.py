@@ -0,0 +1,529 @@
+import struct
+
+from utils.flv import (
+    AAC_SEQUENCE_HEADER,
+    AVC_NALU,
+    AVC_SEQUENCE_HEADER,
+    TAG_AUDIO,
+    TAG_VIDEO,
+    parse_audio_tag,
+    parse_video_tag,
+)
+
+TIMESCALE = 1000  # FLV timestamps are in milliseconds
+VIDEO_TRACK = 1
+AUDIO_TRACK = 2
+
+MAX_FRAGMENT_DURATION = 10_000  # ms, for streams with rare keyframes
+AUDIO_FRAGMENT_DURATION = 1_000  # ms, for streams without video
+MAX_TIMESTAMP_JUMP = 1_000  # ms, a larger step back is a discontinuity
+
+KEYFRAME_FLAGS = 0x02000000  # sample_depends_on = 2
+FRAME_FLAGS = 0x01010000  # sample_depends_on = 1, is_non_sync_sample
+SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050,
+                16000, 12000, 11025, 8000, 7350]  # fmt: skip
+
+MATRIX = struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+
+def box(kind: bytes, *payload: bytes) -> bytes:
+    size = 8 + sum(len(part) for part in payload)
+    return struct.pack(">I4s", size, kind) + b"".join(payload)
+
+
+def full_box(kind: bytes, version: int, flags: int, *payload: bytes) -> bytes:
+    return box(kind, struct.pack(">I", version << 24 | flags), *payload)
+
+
+class _BitReader:
+    def __init__(self, data: bytes):
+        self.value = int.from_bytes(data, "big")
+        self.size = len(data) * 8
+        self.pos = 0
+
+    def bits(self, count: int) -> int:
+        self.pos += count
+        if self.pos > self.size:
+            raise ValueError("Truncated SPS")
+        return (self.value >> (self.size - self.pos)) & ((1 << count) - 1)
+
+    def ue(self) -> int:
+        zeros = 0
+        while not self.bits(1):
+            zeros += 1
+        return (1 << zeros) - 1 + self.bits(zeros)
+
+    def se(self) -> int:
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def avc_dimensions(record: bytes) -> tuple:
+    """
+    Reads the picture size from the first SPS of an AVCDecoderConfigurationRecord.
+    Returns (0, 0) if it cannot be parsed; players then rely on the SPS.
+    """
+    try:
+        sps_size = struct.unpack_from(">H", record, 6)[0]
+        sps = record[8 : 8 + sps_size]
+        # remove the emulation prevention bytes and the NAL header
+        rbsp = sps[1:].replace(b"\x00\x00\x03", b"\x00\x00")
+        return _parse_sps(_BitReader(rbsp))
+    except (ValueError, IndexError, struct.error):
+        return 0, 0
+
+
+def _parse_sps(reader: _BitReader) -> tuple:
+    profile_idc = reader.bits(8)
+    reader.bits(16)  # constraint flags, level_idc
+    reader.ue()  # seq_parameter_set_id
+
+    chroma_format_idc = 1
+    if profile_idc in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+        chroma_format_idc = reader.ue()
+        if chroma_format_idc == 3:
+            reader.bits(1)  # separate_colour_plane_flag
+        reader.ue()  # bit_depth_luma_minus8
+        reader.ue()  # bit_depth_chroma_minus8
+        reader.bits(1)  # qpprime_y_zero_transform_bypass_flag
+        if reader.bits(1):  # seq_scaling_matrix_present_flag
+            for index in range(8 if chroma_format_idc != 3 else 12):
+                if reader.bits(1):
+                    _skip_scaling_list(reader, 16 if index < 6 else 64)
+
+    reader.ue()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = reader.ue()
+    if pic_order_cnt_type == 0:
+        reader.ue()  # log2_max_pic_order_cnt_lsb_minus4
+    elif pic_order_cnt_type == 1:
+        reader.bits(1)  # delta_pic_order_always_zero_flag
+        reader.se()  # offset_for_non_ref_pic
+        reader.se()  # offset_for_top_to_bottom_field
+        for _ in range(reader.ue()):
+            reader.se()
+
+    reader.ue()  # max_num_ref_frames
+    reader.bits(1)  # gaps_in_frame_num_value_allowed_flag
+    width_in_mbs = reader.ue() + 1
+    height_in_map_units = reader.ue() + 1
+    frame_mbs_only = reader.bits(1)
+    if not frame_mbs_only:
+        reader.bits(1)  # mb_adaptive_frame_field_flag
+    reader.bits(1)  # direct_8x8_inference_flag
+
+    width = width_in_mbs * 16
+    height = (2 - frame_mbs_only) * height_in_map_units * 16
+
+    if reader.bits(1):  # frame_cropping_flag
+        left, right, top, bottom = (reader.ue() for _ in range(4))
+        crop_x = 1 if chroma_format_idc in (0, 3) else 2
+        crop_y = (2 - frame_mbs_only) * (2 if chroma_format_idc == 1 else 1)
+        width -= crop_x * (left + right)
+        height -= crop_y * (top + bottom)
+
+    return width, height
+
+
+def _skip_scaling_list(reader: _BitReader, size: int) -> None:
+    last = next_scale = 8
+    for _ in range(size):
+        if next_scale:
+            next_scale = (last + reader.se()) % 256
+        last = next_scale or last
+
+
+def aac_config(record: bytes) -> tuple:
+    """
+    Returns (sample_rate, channels) of an AudioSpecificConfig.
+    """
+    value = int.from_bytes(record[:2], "big")
+    rate_index = (value >> 7) & 0x0F
+    channels = (value >> 3) & 0x0F
+    sample_rate = SAMPLE_RATES[rate_index] if rate_index < len(SAMPLE_RATES) else 0
+    return sample_rate, channels
+
+
+class _Track:
+    def __init__(self, track_id: int, kind: bytes):
+        self.track_id = track_id
+        self.kind = kind
+        self.config = None
+        self.samples = []  # (dts, composition offset, keyframe, data)
+        self.last_duration = 33 if kind == b"vide" else 23
+        self.decode_time = None  # dts of the first sample not written yet
+
+    def duration(self) -> int:
+        if len(self.samples) < 2:
+            return 0
+        return self.samples[-1][0] - self.samples[0][0]
+
+
+class Fmp4Muxer:
+    """
+    Streams H.264/AAC FLV tags into a fragmented MP4 file without re-encoding.
+
+    The init segment (ftyp + moov) is written at the first keyframe, then a
+    moof + mdat fragment per GOP. Only the samples of the current GOP are
+    kept in memory.
+    """
+
+    def __init__(self, file, has_video=True):
+        self.file = file
+        self.has_video = has_video
+
+        self.video = _Track(VIDEO_TRACK, b"vide")
+        self.audio = _Track(AUDIO_TRACK, b"soun")
+        self.tracks = []
+        self.duration = 0
+
+        self._sequence = 0
+        self._base = None  # timestamp mapped to 0
+        self._offset = 0  # added to timestamps after a discontinuity
+        self._last_timestamp = None
+        self._duration_positions = []  # (file offset, struct format)
+
+    @property
+    def started(self) -> bool:
+        return bool(self.tracks)
+
+    def add_tag(self, tag) -> None:
+        if tag.type == TAG_VIDEO:
+            self._add_video(tag)
+        elif tag.type == TAG_AUDIO:
+            self._add_audio(tag)
+
+    def close(self) -> None:
+        """
+        Writes the remaining samples and, if the file is seekable, the total
+        duration in the init segment.
+        """
+        if not self.started:
+            return
+
+        self._write_fragment(final=True)
+        self._write_duration()
+
+    def _timestamp(self, timestamp: int) -> int:
+        timestamp += self._offset
+        last = self._last_timestamp
+        if last is not None and timestamp < last - MAX_TIMESTAMP_JUMP:
+            # the source restarted its clock: continue the timeline
+            self._offset += last - timestamp + self.video.last_duration
+            timestamp = last + self.video.last_duration
+        self._last_timestamp = timestamp if last is None else max(last, timestamp)
+        return timestamp
+
+    def _add_video(self, tag) -> None:
+        if not tag.data:
+            return
+
+        keyframe, packet_type, composition_time, payload = parse_video_tag(tag.data)
+        if packet_type == AVC_SEQUENCE_HEADER:
+            # repeated after a reconnection, the first one is kept
+            if self.video.config is None:
+                self.video.config = payload
+            return
+
+        if packet_type != AVC_NALU or self.video.config is None:
+            return
+
+        timestamp = self._timestamp(tag.timestamp)
+        if not self.started:
+            if not keyframe:
+                return  # not decodable without its keyframe
+            self._start(timestamp)
+
+        if keyframe and self.video.samples:
+            self.video.samples.append((timestamp, composition_time, keyframe, payload))
+            self._write_fragment()
+            return
+
+        self.video.samples.append((timestamp, composition_time, keyframe, payload))
+        if self.video.duration() >= MAX_FRAGMENT_DURATION:
+            self._write_fragment()
+
+    def _add_audio(self, tag) -> None:
+        if len(tag.data) < 2:
+            return
+
+        packet_type, payload = parse_audio_tag(tag.data)
+        if packet_type == AAC_SEQUENCE_HEADER:
+            if self.audio.config is None:
+                self.audio.config = payload
+                if not self.has_video:
+                    self._start(self._timestamp(tag.timestamp))
+            return
+
+        if self.audio.config is None:
+            return
+
+        timestamp = self._timestamp(tag.timestamp)
+        self.audio.samples.append((timestamp, 0, True, payload))
+
+        if self.started:
+            if not self.has_video and self.audio.duration() >= AUDIO_FRAGMENT_DURATION:
+                self._write_fragment()
+            return
+
+        if self.audio.duration() >= MAX_FRAGMENT_DURATION:
+            if self.video.config is None:
+                # the header announced a video track that never came
+                self.has_video = False
+                self._start(self.audio.samples[0][0])
+            else:
+                # waiting for a keyframe, only the audio next to it is kept
+                self.audio.samples = self.audio.samples[len(self.audio.samples) // 2 :]
+
+    def _start(self, timestamp: int) -> None:
+        self._base = timestamp
+
+        if self.video.config is not None:
+            self.tracks.append(self.video)
+        if self.audio.config is not None:
+            self.tracks.append(self.audio)
+            # audio received before the first keyframe has no picture
+            self.audio.samples = [s for s in self.audio.samples if s[0] >= timestamp]
+
+        self.file.write(self._init_segment())
+
+    def _write_fragment(self, final=False) -> None:
+        fragments = []
+        for track in self.tracks:
+            samples = track.samples if final else track.samples[:-1]
+            if not samples:
+                continue
+
+            # the duration of a sample is known once the next one arrives
+            durations = [b[0] - a[0] for a, b in zip(track.samples, track.samples[1:])]
+            durations = [max(0, d) for d in durations[: len(samples)]]
+            if len(durations) < len(samples):
+                durations.append(track.last_duration)
+            track.last_duration = durations[-1] or track.last_duration
+
+            if track.decode_time is None:
+                track.decode_time = max(0, samples[0][0] - self._base)
+            fragments.append((track, samples, durations, track.decode_time))
+
+            track.decode_time += sum(durations)
+            track.samples = [] if final else track.samples[-1:]
+            self.duration = max(self.duration, track.decode_time)
+
+        if fragments:
+            self.file.write(self._fragment(fragments))
+
+    def _fragment(self, fragments: list) -> bytes:
+        self._sequence += 1
+
+        # the moof size does not depend on the data offsets: build it once to
+        # measure it, then again with the real offsets
+        moof = self._moof(fragments, [0] * len(fragments))
+        offsets = []
+        offset = len(moof) + 8
+        for _, samples, _, _ in fragments:
+            offsets.append(offset)
+            offset += sum(len(sample[3]) for sample in samples)
+        moof = self._moof(fragments, offsets)
+
+        payload = [sample[3] for _, samples, _, _ in fragments for sample in samples]
+        mdat_size = 8 + sum(len(data) for data in payload)
+        return b"".join([moof, struct.pack(">I4s", mdat_size, b"mdat"), *payload])
+
+    def _moof(self, fragments: list, offsets: list) -> bytes:
+        trafs = []
+        for (track, samples, durations, decode_time), offset in zip(fragments, offsets):
+            entries = b"".join(
+                struct.pack(
+                    ">IIIi",
+                    duration,
+                    len(data),
+                    KEYFRAME_FLAGS if keyframe else FRAME_FLAGS,
+                    composition_offset,
+                )
+                for (_, composition_offset, keyframe, data), duration in zip(
+                    samples, durations
+                )
+            )
+            trafs.append(
+                box(
+                    b"traf",
+                    # default-base-is-moof
+                    full_box(b"tfhd", 0, 0x020000, struct.pack(">I", track.track_id)),
+                    full_box(b"tfdt", 1, 0, struct.pack(">Q", decode_time)),
+                    # data offset, duration, size, flags, composition offset
+                    full_box(
+                        b"trun",
+                        1,
+                        0x000F01,
+                        struct.pack(">Ii", len(samples), offset),
+                        entries,
+                    ),
+                )
+            )
+
+        mfhd = full_box(b"mfhd", 0, 0, struct.pack(">I", self._sequence))
+        return box(b"moof", mfhd, *trafs)
+
+    def _init_segment(self) -> bytes:
+        ftyp = box(b"ftyp", b"isom", struct.pack(">I", 0x200), b"isomiso6avc1mp41")
+
+        mvhd = full_box(
+            b"mvhd",
+            0,
+            0,
+            struct.pack(">IIII", 0, 0, TIMESCALE, 0),
+            struct.pack(">IH10x", 0x10000, 0x100),
+            MATRIX,
+            bytes(24),
+            struct.pack(">I", len(self.tracks) + 1),
+        )
+        mehd = full_box(b"mehd", 1, 0, struct.pack(">Q", 0))
+        trex = [
+            full_box(b"trex", 0, 0, struct.pack(">5I", track.track_id, 1, 0, 0, 0))
+            for track in self.tracks
+        ]
+        traks = [self._trak(track) for track in self.tracks]
+        mvex = box(b"mvex", mehd, *trex)
+        moov = box(b"moov", mvhd, *traks, mvex)
+
+        # remember where the durations are, to fill them in on close
+        try:
+            start = self.file.tell()
+        except (AttributeError, OSError):
+            start = None
+
+        if start is not None:
+            # box headers, version and flags, then the fields before the duration
+            mvhd_duration = start + len(ftyp) + 8 + 8 + 4 + 12
+            mehd_duration = start + len(ftyp) + len(moov) - len(mvex) + 8 + 8 + 4
+            self._duration_positions = [(mvhd_duration, ">I"), (mehd_duration, ">Q")]
+
+        return ftyp + moov
+
+    def _trak(self, track: _Track) -> bytes:
+        is_video = track.kind == b"vide"
+        width, height = avc_dimensions(track.config) if is_video else (0, 0)
+
+        tkhd = full_box(
+            b"tkhd",
+            0,
+            0x3,  # enabled, in movie
+            struct.pack(">IIIII", 0, 0, track.track_id, 0, 0),
+            struct.pack(">8xHHH2x", 0, 0, 0 if is_video else 0x100),
+            MATRIX,
+            struct.pack(">II", width << 16, height << 16),
+        )
+        mdhd = full_box(
+            b"mdhd", 0, 0, struct.pack(">IIIIHH", 0, 0, TIMESCALE, 0, 0x55C4, 0)
+        )
+        name = b"VideoHandler\x00" if is_video else b"SoundHandler\x00"
+        hdlr = full_box(b"hdlr", 0, 0, struct.pack(">I4s12x", 0, track.kind), name)
+
+        if is_video:
+            media_header = full_box(b"vmhd", 0, 1, bytes(8))
+            sample_entry = box(
+                b"avc1",
+                struct.pack(
+                    ">6xH16xHHIIIH", 1, width, height, 0x480000, 0x480000, 0, 1
+                ),
+                bytes(32),
+                struct.pack(">Hh", 0x18, -1),
+                box(b"avcC", track.config),
+            )
+        else:
+            sample_rate, channels = aac_config(track.config)
+            media_header = full_box(b"smhd", 0, 0, bytes(4))
+            sample_entry = box(
+                b"mp4a",
+                struct.pack(">6xH8xHHII", 1, channels, 16, 0, sample_rate << 16),
+                self._esds(track),
+            )
+
+        dinf = box(
+            b"dinf",
+            full_box(b"dref", 0, 0, struct.pack(">I", 1), full_box(b"url ", 0, 1)),
+        )
+        stbl = box(
+            b"stbl",
+            full_box(b"stsd", 0, 0, struct.pack(">I", 1), sample_entry),
+            full_box(b"stts", 0, 0, bytes(4)),
+            full_box(b"stsc", 0, 0, bytes(4)),
+            full_box(b"stsz", 0, 0, bytes(8)),
+            full_box(b"stco", 0, 0, bytes(4)),
+        )
+        minf = box(b"minf", media_header, dinf, stbl)
+        return box(b"trak", tkhd, box(b"mdia", mdhd, hdlr, minf))
+
+    @staticmethod
+    def _esds(track: _Track) -> bytes:
+        def descriptor(tag: int, *payload: bytes) -> bytes:
+            size = sum(len(part) for part in payload)
+            return struct.pack(">B3sB", tag, b"\x80\x80\x80", size) + b"".join(payload)
+
+        decoder_config = descriptor(
+            0x04,
+            struct.pack(">BB3sII", 0x40, 0x15, bytes(3), 0, 0),  # AAC audio stream
+            descriptor(0x05, track.config),
+        )
+        es = descriptor(
+            0x03,
+            struct.pack(">HB", track.track_id, 0),
+            decoder_config,
+            descriptor(0x06, b"\x02"),
+        )
+        return full_box(b"esds", 0, 0, es)
+
+    def _write_duration(self) -> None:
+        if not self._duration_positions:
+            return
+
+        try:
+            end = self.file.tell()
+            for position, fmt in self._duration_positions:
+                self.file.seek(position)
+                self.file.write(struct.pack(fmt, self.duration))
+            self.file.seek(end)
+        except (AttributeError, OSError):
+            pass  # not seekable, e.g. a pipe
+
+
+def mp4_duration(path: str) -> float:
+    """
+    Duration in seconds read from the mvhd box of an MP4 file, 0 if unknown.
+    """
+    with open(path, "rb") as file:
+        end = file.seek(0, 2)
+        position = 0
+        # the top level boxes are walked without reading the media data
+        while position + 8 <= end:
+            file.seek(position)
+            size, kind = struct.unpack(">I4s", file.read(8))
+            header = 8
+            if size == 1:
+                size = struct.unpack(">Q", file.read(8))[0]
+                header = 16
+            elif size == 0:
+                size = end - position
+
+            if kind == b"moov":
+                return _moov_duration(file.read(min(size - header, 1024 * 1024)))
+            if size < header:
+                break
+            position += size
+
+    return 0.0
+
+
+def _moov_duration(moov: bytes) -> float:
+    position = 0
+    while position + 8 <= len(moov):
+        size, kind = struct.unpack_from(">I4s", moov, position)
+        if kind == b"mvhd":
+            if moov[position + 8] == 1:
+                timescale, duration = struct.unpack_from(">IQ", moov, position + 28)
+            else:
+                timescale, duration = struct.unpack_from(">II", moov, position + 20)
+            return duration / timescale if timescale else 0.0
+        if size < 8:
+            break
+        position += size
+    return 0.0
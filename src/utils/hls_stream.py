@@ -0,0 +1,266 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.client import HTTPException
+from typing import NamedTuple
+from urllib.parse import urljoin
+
+from requests import RequestException
+
+from utils.logger_manager import logger
+
+RETRIES = 3  # attempts per segment and per playlist reload, after the first
+RETRY_DELAY = 0.5  # seconds, doubled after every failed attempt
+TIMEOUT = 10  # seconds per request
+STALE_PLAYLISTS = 3  # target durations without new segments before giving up
+
+
+class HlsSegment(NamedTuple):
+    sequence: int
+    duration: float
+    url: str
+
+
+class HlsPlaylist(NamedTuple):
+    target_duration: float
+    segments: list
+    init_url: str | None  # EXT-X-MAP
+    ended: bool
+    variants: list  # (bandwidth, url) of a master playlist
+
+
+def parse_playlist(text: str, base_url: str) -> HlsPlaylist:
+    """
+    Parses a master or media M3U8 playlist. Relative URIs are resolved
+    against `base_url`.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise ValueError("Not an M3U8 playlist")
+
+    target_duration = 2.0
+    sequence = 0
+    duration = 0.0
+    bandwidth = None
+    init_url = None
+    ended = False
+    segments = []
+    variants = []
+
+    for line in lines[1:]:
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            target_duration = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",", 1)[0])
+        elif line.startswith("#EXT-X-STREAM-INF:"):
+            attributes = _attributes(line.split(":", 1)[1])
+            bandwidth = int(attributes.get("BANDWIDTH", 0))
+        elif line.startswith("#EXT-X-MAP:"):
+            uri = _attributes(line.split(":", 1)[1]).get("URI")
+            init_url = urljoin(base_url, uri) if uri else None
+        elif line.startswith("#EXT-X-ENDLIST"):
+            ended = True
+        elif not line.startswith("#"):
+            url = urljoin(base_url, line)
+            if bandwidth is not None:
+                variants.append((bandwidth, url))
+                bandwidth = None
+            else:
+                segments.append(HlsSegment(sequence, duration, url))
+                sequence += 1
+
+    return HlsPlaylist(target_duration, segments, init_url, ended, variants)
+
+
+def _attributes(text: str) -> dict:
+    # quoted values may hold commas: CODECS="avc1.4d401f,mp4a.40.2"
+    return {
+        key: value.strip('"')
+        for key, value in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', text)
+    }
+
+
+class HlsStream:
+    """
+    Records a live HLS playlist: the playlist is polled and its new
+    segments are downloaded by a pool of `workers` connections, then
+    written in playlist order.
+
+    A segment is retried on its own, so a slow or failing download delays
+    the output without stalling the others, and a short stall is caught up
+    from the segments still listed by the playlist.
+    """
+
+    def __init__(self, get, playlist_url: str, workers: int = 4, name: str = ""):
+        self.playlist_url = playlist_url
+        self.workers = workers
+        self.name = name
+
+        self.fetched = 0
+        self.retries = 0
+        self.lost = 0
+
+        self._get = get  # (url, timeout) -> response
+        self._init_url = None
+        self._last_sequence = None  # last segment queued
+
+    def copy(self, writer, should_stop=None) -> bool:
+        """
+        Writes the segments into `writer` until the playlist ends or cannot
+        be loaded anymore. Called again on the same stream, it goes on from
+        the last segment written.
+        Returns True if it stopped because should_stop() returned True.
+        """
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix="hls")
+        pending = {}  # sequence -> future of the segment data, in order
+        stale_since = time.monotonic()
+        try:
+            while True:
+                playlist = self._reload()
+                if playlist is None:
+                    break
+
+                if self._queue(playlist, pending, pool, writer):
+                    stale_since = time.monotonic()
+                elif time.monotonic() - stale_since > (
+                    STALE_PLAYLISTS * playlist.target_duration
+                ):
+                    logger.warning(f"{self.name}: the HLS playlist stopped moving.")
+                    break
+
+                # reloading every half target duration catches new segments early
+                interval = max(0.5, playlist.target_duration / 2)
+                if self._write_ready(pending, writer, interval, should_stop):
+                    return True
+
+                if playlist.ended:
+                    break
+
+            # the segments already queued were downloaded or are on their way
+            return self._write_ready(pending, writer, None, should_stop)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            if pending:
+                # not written: fetched again by the next copy if still listed
+                self._last_sequence = next(iter(pending)) - 1
+            logger.info(
+                f"{self.name}: {self.fetched} HLS segments, "
+                f"{self.retries} retries, {self.lost} lost."
+            )
+
+    def switch(self, playlist_url: str) -> None:
+        """
+        Follows another playlist of the same live, e.g. after a reconnection
+        or at another quality. Renditions share their media sequence
+        numbers, so the segments already written are skipped.
+        """
+        self.playlist_url = playlist_url
+
+    def _reload(self) -> HlsPlaylist | None:
+        """
+        Loads the media playlist, following a master playlist to its best
+        variant. Returns None after RETRIES failures.
+        """
+        for attempt in range(RETRIES + 1):
+            try:
+                playlist = self._load(self.playlist_url)
+                if playlist.variants:
+                    self.playlist_url = max(playlist.variants)[1]
+                    playlist = self._load(self.playlist_url)
+                return playlist
+
+            except (RequestException, HTTPException, OSError, ValueError) as ex:
+                if attempt == RETRIES:
+                    logger.warning(f"{self.name}: unable to load the playlist: {ex}")
+                    return None
+                time.sleep(RETRY_DELAY * 2**attempt)
+
+    def _load(self, url: str) -> HlsPlaylist:
+        with self._get(url, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            return parse_playlist(response.text, response.url or url)
+
+    def _queue(self, playlist, pending, pool, writer) -> bool:
+        """
+        Submits the segments not seen yet. Returns True if there were any.
+        """
+        segments = playlist.segments
+        if not segments:
+            return False
+
+        if playlist.init_url and playlist.init_url != self._init_url:
+            # fMP4 segments need their initialization section first
+            self._write_ready(pending, writer, None, None)
+            data = self._fetch(playlist.init_url)
+            if data is None:
+                return False
+            writer.write(data)
+            self._init_url = playlist.init_url
+
+        last = self._last_sequence
+        if last is not None and segments[-1].sequence < last - len(segments):
+            logger.info(f"{self.name}: the HLS playlist restarted.")
+            last = None
+        if last is not None and segments[0].sequence > last + 1:
+            missed = segments[0].sequence - last - 1
+            self.lost += missed
+            logger.warning(f"{self.name}: {missed} HLS segments expired unfetched.")
+
+        new = [s for s in segments if last is None or s.sequence > last]
+        for segment in new:
+            pending[segment.sequence] = pool.submit(self._fetch, segment.url)
+            self._last_sequence = segment.sequence
+        return bool(new)
+
+    def _fetch(self, url: str) -> bytes | None:
+        # runs in the pool
+        for attempt in range(RETRIES + 1):
+            try:
+                with self._get(url, timeout=TIMEOUT) as response:
+                    response.raise_for_status()
+                    data = response.content
+                self.fetched += 1
+                return data
+
+            except (RequestException, HTTPException, OSError) as ex:
+                if attempt == RETRIES:
+                    logger.warning(f"{self.name}: HLS segment lost: {ex}")
+                    return None
+                self.retries += 1
+                time.sleep(RETRY_DELAY * 2**attempt)
+
+    def _write_ready(self, pending, writer, timeout, should_stop) -> bool:
+        """
+        Writes the downloaded segments at the head of the queue, for up to
+        `timeout` seconds (None: until the queue is empty).
+        Returns True if should_stop() returned True.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            while pending:
+                sequence, future = next(iter(pending.items()))
+                if not future.done():
+                    break
+                del pending[sequence]
+                data = future.result()
+                if data is None:
+                    self.lost += 1
+                else:
+                    writer.write(data)
+
+            if should_stop is not None and should_stop():
+                return True
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            if not pending:
+                if remaining is None:
+                    return False
+                time.sleep(min(remaining, 0.2))
+                continue
+
+            head = next(iter(pending.values()))
+            wait([head], timeout=0.2 if remaining is None else min(remaining, 0.2))
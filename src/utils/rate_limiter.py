@@ -0,0 +1,49 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the number of requests sent per second.
+
+    A single instance is shared by every poller of the process, both
+    threads (acquire) and coroutines (acquire_async). Callers reserve
+    their tokens up front, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """
+        Takes the tokens and returns how long the caller must wait for them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: int = 1) -> None:
+        delay = self._reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int = 1) -> None:
+        # already loaded by the asyncio engine, kept off the threaded startup
+        import asyncio
+
+        delay = self._reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
@@ -10,9 +10,32 @@ class RecorderConfig:
     user: str | None = None
     room_id: str | None = None
     automatic_interval: int = 5
+    dormant_factor: int = 1
+    followers_page_size: int = 30
+    followers_full_sync: int = 360
+    probe_workers: int = 8
+    watch_url: str | None = None
     cookies: dict | None = None
-    proxy: str | None = None
+    proxy: list[str] | None = None
     output: str | None = None
     duration: int | None = None
     use_telegram: bool = False
     bitrate: str | None = None
+    remux: str = "post"
+    segment_minutes: int | None = None
+    segment_size: int | None = None
+    redundant: bool = False
+    protocol: str = "flv"
+    hls_workers: int = 4
+    bandwidth: float | None = None  # Mbit/s
+    priorities: dict | None = None
+    convert_workers: int = 1
+    upload_workers: int = 4
+    rate_limit: float | None = None
+    cache_file: str | None = None
+    http_pool_size: int = 10
+    http2: bool = False
+    metrics_port: int | None = None
+    control_port: int | None = None
+    cluster_db: str | None = None  # set for the workers of a cluster only
+    worker_name: str | None = None
@@ -0,0 +1,295 @@
+import queue
+import threading
+import time
+
+from utils.custom_exceptions import UnsupportedStreamError
+from utils.flv import (
+    TAG_SCRIPT,
+    FlvParser,
+    flv_header,
+    is_sequence_header,
+    serialize_tag,
+)
+from utils.logger_manager import logger
+from utils.stream_writer import body_reader
+
+STALL_SECONDS = 2  # an edge without data for longer is stalled
+MAX_SKEW = 10_000  # ms, edges further apart do not relay the same stream
+RETRY_DELAY = 0.5  # seconds, doubled after every connection without data
+MAX_RETRY_DELAY = 30
+
+
+class _Edge:
+    """
+    A CDN edge, read by its own thread.
+    """
+
+    def __init__(self, index: int, url: str):
+        self.index = index
+        self.url = url
+        self.name = "main" if index == 0 else "backup"
+
+        self.thread = None
+        self.response = None
+        self.parser = None
+        self.synced = False  # its clock was compared with the output
+        self.disabled = False
+        self.failures = 0
+        self.retry_at = None
+        self.last_data = 0.0
+        self.stalled_since = None
+
+        self.bytes = 0
+        self.tags = 0
+        self.written = 0  # tags delivered before the other edges
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.reconnects = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def stats(self) -> dict:
+        return {
+            "bytes": self.bytes,
+            "tags": self.tags,
+            "written_tags": self.written,
+            "stalls": self.stalls,
+            "stalled_s": round(self.stalled_seconds, 1),
+            "reconnects": self.reconnects,
+            "disabled": self.disabled,
+        }
+
+
+class RedundantStream:
+    """
+    Pulls the same live from several CDN edges at once and merges them into
+    one FLV stream.
+
+    Every edge is read and demuxed by its own thread. A tag is written the
+    first time any edge delivers it, recognised by its type and timestamp,
+    so the output follows whichever edge is ahead and goes on without a gap
+    while another one stalls. An edge that drops is reopened as long as the
+    others keep the recording going; copy() returns once all are down.
+
+    The edges must relay the same origin stream: an edge whose timestamps
+    are unrelated to the output is dropped.
+    """
+
+    def __init__(self, open_stream, urls: list, name: str = ""):
+        self.name = name
+        self.written = 0
+        self.duplicates = 0
+        self.bytes_written = 0
+
+        self._open_stream = open_stream
+        self._edges = [_Edge(index, url) for index, url in enumerate(urls)]
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._unsupported = None
+
+        self._header_written = False
+        self._metadata_written = False
+        self._configs = {}  # tag type -> sequence header data
+        self._last = {}  # tag type -> (timestamp, sizes of the tags written at it)
+
+    def copy(self, writer, should_stop=None, first=None) -> bool:
+        """
+        Writes the merged stream into `writer` until every edge is down.
+        `first` is the (response, data read so far) of the main edge, when
+        it is already open.
+        Returns True if it stopped because should_stop() returned True.
+        """
+        for edge in self._edges:
+            if edge.index == 0 and first is not None:
+                self._start(edge, *first)
+            else:
+                self._start(edge)
+
+        try:
+            while True:
+                if should_stop is not None and should_stop():
+                    return True
+
+                try:
+                    edge, tags = self._queue.get(timeout=0.2)
+                except queue.Empty:
+                    pass
+                else:
+                    self._merge(edge, tags, writer)
+
+                if not self._supervise() and self._queue.empty():
+                    if self._unsupported is not None and not self.written:
+                        raise self._unsupported
+                    return False
+        finally:
+            self._stop.set()
+            for edge in self._edges:
+                if edge.response is not None:
+                    edge.response.close()
+            logger.info(f"{self.name}: {self.summary()}")
+
+    def stats(self) -> dict:
+        received = sum(edge.bytes for edge in self._edges)
+        return {
+            "written_tags": self.written,
+            "duplicate_tags": self.duplicates,
+            "bytes_written": self.bytes_written,
+            "bytes_received": received,
+            "bandwidth_overhead": round(received / max(1, self.bytes_written) - 1, 3),
+            "edges": {edge.name: edge.stats() for edge in self._edges},
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        edges = ", ".join(
+            f"{name} {edge['written_tags']} tags first, {edge['stalls']} stalls"
+            for name, edge in stats["edges"].items()
+        )
+        return (
+            f"redundant capture: {edges}, "
+            f"{stats['bandwidth_overhead']:.0%} extra download."
+        )
+
+    def _start(self, edge: _Edge, response=None, data=b"") -> None:
+        edge.retry_at = None
+        edge.synced = False
+        edge.stalled_since = None
+        edge.last_data = time.monotonic()
+        edge.parser = FlvParser()
+        edge.response = response
+        edge.thread = threading.Thread(
+            target=self._read, args=(edge, response, data), daemon=True
+        )
+        edge.thread.start()
+
+    def _read(self, edge: _Edge, response, data) -> None:
+        try:
+            if response is None:
+                response = edge.response = self._open_stream(edge.url)
+            if data:
+                self._feed(edge, data)
+
+            readinto = body_reader(response)
+            chunk = bytearray(64 * 1024)
+            view = memoryview(chunk)
+            while not self._stop.is_set() and not edge.disabled:
+                read = readinto(chunk)
+                if not read:
+                    break
+                self._feed(edge, view[:read])
+
+        except UnsupportedStreamError as ex:
+            logger.warning(f"{self.name}: {ex}, {edge.name} edge dropped.")
+            self._unsupported = ex
+            edge.disabled = True
+
+        except Exception as ex:
+            if not self._stop.is_set():
+                logger.debug(f"{self.name}: {edge.name} edge lost: {ex}")
+
+        finally:
+            if response is not None:
+                response.close()
+
+    def _feed(self, edge: _Edge, data) -> None:
+        now = time.monotonic()
+        if edge.stalled_since is not None:
+            edge.stalled_seconds += now - edge.stalled_since
+            edge.stalled_since = None
+        edge.last_data = now
+        edge.failures = 0
+        edge.bytes += len(data)
+
+        tags = edge.parser.feed(data)
+        if tags:
+            self._queue.put((edge, tags))
+
+    def _supervise(self) -> bool:
+        """
+        Tracks stalls and reopens the dropped edges.
+        Returns False once every edge is down.
+        """
+        now = time.monotonic()
+        alive = [edge for edge in self._edges if edge.alive]
+
+        for edge in self._edges:
+            if edge.disabled:
+                continue
+
+            if edge.alive:
+                if edge.stalled_since is None and now - edge.last_data > STALL_SECONDS:
+                    edge.stalled_since = edge.last_data
+                    edge.stalls += 1
+                    logger.debug(f"{self.name}: {edge.name} edge stalled.")
+                continue
+
+            # an edge is only reopened while another one keeps the output going
+            if not alive:
+                continue
+            if edge.retry_at is None:
+                delay = min(RETRY_DELAY * 2**edge.failures, MAX_RETRY_DELAY)
+                edge.failures += 1
+                edge.retry_at = now + delay
+            elif now >= edge.retry_at:
+                edge.reconnects += 1
+                self._start(edge)
+                alive.append(edge)
+
+        return bool(alive)
+
+    def _merge(self, edge: _Edge, tags: list, writer) -> None:
+        out = []
+        if not self._header_written:
+            out.append(flv_header(edge.parser.has_audio, edge.parser.has_video))
+            self._header_written = True
+
+        for tag in tags:
+            edge.tags += 1
+            if edge.disabled or not self._is_new(edge, tag):
+                self.duplicates += 1
+                continue
+
+            out.append(serialize_tag(tag))
+            edge.written += 1
+            self.written += 1
+
+        data = b"".join(out)
+        if data:
+            writer.write(data)
+            self.bytes_written += len(data)
+
+    def _is_new(self, edge: _Edge, tag) -> bool:
+        if tag.type == TAG_SCRIPT:
+            new = not self._metadata_written
+            self._metadata_written = True
+            return new
+
+        if is_sequence_header(tag):
+            if self._configs.get(tag.type) == tag.data:
+                return False
+            self._configs[tag.type] = tag.data
+            return True
+
+        if not edge.synced:
+            edge.synced = True
+            latest = max((last for last, _ in self._last.values()), default=None)
+            if latest is not None and abs(tag.timestamp - latest) > MAX_SKEW:
+                logger.warning(
+                    f"{self.name}: the {edge.name} edge does not relay the same "
+                    "stream, dropped."
+                )
+                edge.disabled = True
+                return False
+
+        last = self._last.get(tag.type)
+        if last is None or tag.timestamp > last[0]:
+            self._last[tag.type] = (tag.timestamp, {len(tag.data)})
+            return True
+
+        # tags sharing a timestamp are told apart by their size
+        if tag.timestamp == last[0] and len(tag.data) not in last[1]:
+            last[1].add(len(tag.data))
+            return True
+        return False
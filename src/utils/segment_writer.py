@@ -0,0 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.custom_exceptions import UnsupportedStreamError
+from utils.flv import (
+    TAG_AUDIO,
+    TAG_SCRIPT,
+    FlvParser,
+    flv_header,
+    is_keyframe,
+    is_sequence_header,
+    serialize_tag,
+)
+from utils.logger_manager import logger
+
+MAX_TIMESTAMP_JUMP = 1_000  # ms, a larger step back is a new stream
+
+
+class SegmentWriter:
+    """
+    File-like sink that splits the FLV stream into standalone segments.
+
+    A segment is cut at the first keyframe after `max_seconds` of media or
+    `max_bytes` of data, and when the source restarts its clock. Each
+    segment starts with the FLV header, the metadata and the decoder
+    configuration, and its timestamps start at zero, so it can be finalized
+    on its own while the recording goes on.
+
+    `open_segment(index)` returns the (path, sink) of a new segment and
+    `on_segment(path, sink)` is called once the sink is closed. Closing a
+    sink may wait for ffmpeg, so finished segments are closed in order by
+    a worker thread while the stream goes on into the next one.
+    """
+
+    def __init__(self, open_segment, on_segment, max_seconds=None, max_bytes=None):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.index = 0
+
+        self._open_segment = open_segment
+        self._on_segment = on_segment
+        self._parser = FlvParser()
+        self._passthrough = False
+
+        self._metadata = None
+        self._configs = {}  # tag type -> sequence header tag
+        self._path = None
+        self._sink = None
+        self._start = 0  # timestamp mapped to 0 in the current segment
+        self._last_timestamp = None
+        self._bytes = 0
+        self._new_stream = False
+        self._finisher = None  # closes the finished segments
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, data) -> None:
+        if self._passthrough:
+            self._sink.write(data)
+            return
+
+        try:
+            tags = self._parser.feed(data)
+        except UnsupportedStreamError as ex:
+            tags = []
+            self._start_passthrough(ex)
+
+        for tag in tags:
+            self._write_tag(tag)
+
+    def flush(self) -> None:
+        if self._sink is not None:
+            self._sink.flush()
+
+    def close(self) -> None:
+        """
+        Finishes the last segment and waits for all of them to be closed.
+        """
+        self._finish_segment()
+        if self._finisher is not None:
+            self._finisher.shutdown(wait=True)
+            self._finisher = None
+
+    def _write_tag(self, tag) -> None:
+        last = self._last_timestamp
+        if last is not None and tag.timestamp < last - MAX_TIMESTAMP_JUMP:
+            self._new_stream = True  # the source restarted its clock
+        self._last_timestamp = tag.timestamp
+
+        if tag.type == TAG_SCRIPT:
+            self._metadata = tag
+        elif is_sequence_header(tag):
+            self._configs[tag.type] = tag
+            if self._sink is not None and not self._new_stream:
+                self._write(tag)
+            return
+
+        if self._is_cut_point(tag) and self._should_cut(tag):
+            self._next_segment(tag.timestamp)
+
+        # frames of a new stream before its first keyframe are not decodable
+        if self._sink is not None and not self._new_stream:
+            self._write(tag)
+
+    def _is_cut_point(self, tag) -> bool:
+        if self._parser.has_video:
+            return is_keyframe(tag)
+        return tag.type == TAG_AUDIO
+
+    def _should_cut(self, tag) -> bool:
+        if self._sink is None or self._new_stream:
+            return True
+
+        if self.max_bytes and self._bytes >= self.max_bytes:
+            return True
+
+        elapsed = tag.timestamp - self._start
+        return bool(self.max_seconds) and elapsed >= self.max_seconds * 1000
+
+    def _next_segment(self, timestamp: int) -> None:
+        self._finish_segment()
+
+        self.index += 1
+        self._path, self._sink = self._open_segment(self.index)
+        self._start = timestamp
+        self._bytes = 0
+        self._new_stream = False
+
+        header = flv_header(self._parser.has_audio, self._parser.has_video)
+        self._sink.write(header)
+        self._bytes += len(header)
+        for tag in (self._metadata, *self._configs.values()):
+            if tag is not None:
+                self._write(tag, timestamp=0)
+
+    def _write(self, tag, timestamp=None) -> None:
+        if timestamp is None:
+            timestamp = max(0, tag.timestamp - self._start)
+        data = serialize_tag(tag, timestamp)
+        self._sink.write(data)
+        self._bytes += len(data)
+
+    def _finish_segment(self) -> None:
+        if self._sink is None:
+            return
+
+        path, sink = self._path, self._sink
+        self._path = self._sink = None
+        if self._finisher is None:
+            self._finisher = ThreadPoolExecutor(1, thread_name_prefix="segments")
+        self._finisher.submit(self._close_segment, path, sink)
+
+    def _close_segment(self, path, sink) -> None:
+        # runs in the finisher thread
+        try:
+            sink.close()
+            self._on_segment(path, sink)
+        except Exception as ex:
+            logger.error(f"Unable to finish the segment {path}: {ex}", exc_info=True)
+
+    def _start_passthrough(self, error) -> None:
+        # the stream cannot be split anymore: keep it as it is
+        logger.warning(f"{error}, segmenting disabled for this recording.")
+        self._passthrough = True
+        if self._sink is None:
+            self.index += 1
+            self._path, self._sink = self._open_segment(self.index)
+        self._sink.write(bytes(self._parser._buffer))
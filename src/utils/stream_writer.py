@@ -0,0 +1,278 @@
+import os
+import queue
+import threading
+import time
+from http.client import HTTPException
+
+import urllib3
+from requests.exceptions import ChunkedEncodingError
+
+from utils.custom_exceptions import OutputWriteError
+
+
+def body_reader(response):
+    """
+    Returns a readinto() function for the body of a streamed response.
+    """
+    raw = response.raw
+    readinto = raw.readinto
+
+    # urllib3's readinto reads into a temporary bytes object and copies it.
+    # Without content encoding the underlying http.client response can
+    # receive straight into our buffer.
+    fp = getattr(raw, "_fp", None)
+    if hasattr(fp, "readinto") and not response.headers.get("Content-Encoding"):
+        readinto = fp.readinto
+
+    def _readinto(buffer):
+        # raise the same errors as response.iter_content
+        try:
+            return readinto(buffer)
+        except (OSError, HTTPException, urllib3.exceptions.HTTPError) as ex:
+            raise ChunkedEncodingError(ex) from ex
+
+    return _readinto
+
+
+class StreamPrefetch:
+    """
+    Opens a live stream in a background thread and keeps its first bytes
+    in memory, so that the connection is set up while the output file is
+    being prepared.
+
+    take() hands over the response and the bytes read so far; the rest of
+    the body is then read from the response as usual.
+    """
+
+    def __init__(self, open_stream, max_bytes=8 * 1024 * 1024, read_size=64 * 1024):
+        self.max_bytes = max_bytes
+        self.read_size = read_size
+        self.first_byte_at = None  # time.perf_counter() of the first byte
+
+        self._open_stream = open_stream
+        self._response = None
+        self._chunks = []
+        self._error = None
+        self._handoff = threading.Event()
+        self._thread = threading.Thread(target=self._prefetch, daemon=True)
+        self._thread.start()
+
+    def take(self):
+        """
+        Returns (response, buffered bytes). Errors met while opening the
+        stream are raised here.
+        """
+        self._handoff.set()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+        response, self._response = self._response, None
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return response, data
+
+    def close(self) -> None:
+        """
+        Drops the stream if it was not taken.
+        """
+        self._handoff.set()
+        self._thread.join()
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def _prefetch(self) -> None:
+        try:
+            self._response = self._open_stream()
+            readinto = body_reader(self._response)
+
+            # read at least the first chunk, for the time to first byte
+            buffered = 0
+            while buffered < self.max_bytes and not (
+                self._handoff.is_set() and buffered
+            ):
+                chunk = bytearray(self.read_size)
+                read = readinto(chunk)
+                if not read:
+                    break
+
+                if self.first_byte_at is None:
+                    self.first_byte_at = time.perf_counter()
+                self._chunks.append(memoryview(chunk)[:read])
+                buffered += read
+
+        except Exception as ex:
+            self._error = ex
+
+
+class StreamWriter:
+    """
+    Copies a live HTTP body to a file without creating a Python object
+    per network chunk.
+
+    The body is read with readinto() straight into a ring of preallocated
+    buffers. Full buffers are handed to a background thread that writes
+    every pending buffer with a single os.writev call, so the network
+    read of the next buffer overlaps the disk write of the previous one.
+    """
+
+    def __init__(self, file, buffer_size=512 * 1024, buffers=4, read_size=64 * 1024):
+        self.file = file
+        self.read_size = min(read_size, buffer_size)
+        self.bytes_written = 0
+        self.last_data_at = None  # time.monotonic() of the last data received
+
+        self._buffers = [memoryview(bytearray(buffer_size)) for _ in range(buffers)]
+        self._free = queue.Queue()
+        self._filled = queue.Queue()
+        for index in range(buffers):
+            self._free.put(index)
+
+        try:
+            self._fd = file.fileno()
+        except (AttributeError, OSError):
+            self._fd = None  # not backed by a file descriptor, e.g. a muxer
+
+        self._error = None
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def copy(self, response, should_stop=None) -> bool:
+        """
+        Copies the response body until EOF.
+        Returns True if it stopped because should_stop() returned True.
+        """
+        readinto = body_reader(response)
+
+        while True:
+            index = self._take_free_buffer()
+            buffer = self._buffers[index]
+            filled = 0
+            eof = stopped = False
+
+            try:
+                while filled < len(buffer):
+                    read = readinto(buffer[filled : filled + self.read_size])
+                    if not read:
+                        eof = True
+                        break
+
+                    filled += read
+                    self.last_data_at = time.monotonic()
+                    if should_stop is not None and should_stop():
+                        stopped = True
+                        break
+            finally:
+                # hand off what was read even if the connection broke
+                if filled:
+                    self._filled.put((index, filled))
+                else:
+                    self._free.put(index)
+
+            if eof or stopped:
+                return stopped
+
+    def write(self, data) -> None:
+        """
+        Queues bytes that do not come from a response, e.g. a prefetched chunk.
+        """
+        view = memoryview(data)
+        if view:
+            self.last_data_at = time.monotonic()
+        while view:
+            index = self._take_free_buffer()
+            size = min(len(view), len(self._buffers[index]))
+            self._buffers[index][:size] = view[:size]
+            self._filled.put((index, size))
+            view = view[size:]
+
+    def flush(self) -> None:
+        """
+        Waits until every queued buffer has been written.
+        Write errors are raised by the next copy() or write().
+        """
+        self._filled.join()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._filled.join()
+            self._filled.put(None)
+            self._thread.join()
+
+    def _take_free_buffer(self) -> int:
+        while True:
+            self._raise_error()
+            try:
+                return self._free.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise OutputWriteError(
+                f"Unable to write the recording: {self._error}"
+            ) from self._error
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._filled.get()
+            pending = [item]
+            # gather everything already queued into a single write
+            while item is not None:
+                try:
+                    item = self._filled.get_nowait()
+                except queue.Empty:
+                    break
+                pending.append(item)
+
+            done = pending[-1] is None
+            if done:
+                pending.pop()
+
+            try:
+                if self._error is None and pending:
+                    self._write([self._buffers[i][:size] for i, size in pending])
+            except Exception as ex:
+                self._error = ex
+            finally:
+                for index, _ in pending:
+                    self._free.put(index)
+                    self._filled.task_done()
+                if done:
+                    self._filled.task_done()
+
+            if done:
+                return
+
+    def _write(self, views: list) -> None:
+        self.bytes_written += sum(len(view) for view in views)
+
+        if hasattr(self.file, "writev"):
+            # e.g. a stitcher, which picks how to write the batch
+            self.file.writev(views)
+        elif self._fd is None or not hasattr(os, "writev"):
+            for view in views:
+                self.file.write(view)
+        else:
+            writev_all(self._fd, views)
+
+
+def writev_all(fd: int, views: list) -> None:
+    """
+    Writes every buffer to a file descriptor with os.writev.
+    """
+    while views:
+        written = os.writev(fd, views)
+        # writev may be partial on pipes: drop what was written
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if views and written:
+            views[0] = views[0][written:]
@@ -1,5 +1,7 @@
 import json
 import os
+from contextlib import contextmanager
+from functools import lru_cache
 
 from utils.enums import Info
 
@@ -31,9 +33,11 @@ def read_telegram_config():
         return json.load(f)
 
 
+@lru_cache(maxsize=None)
 def is_termux() -> bool:
     """
-    Checks if the script is running in Termux.
+    Checks if the script is running in Termux. Cached, as every HTTP
+    client asks.
 
     Returns:
         bool: True if running in Termux, False otherwise.
@@ -66,3 +70,30 @@ def is_linux() -> bool:
     import platform
 
     return platform.system().lower() == "linux"
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Holds an exclusive lock on `path`.lock, shared with the other
+    processes using the same file. Blocks until the lock is free.
+    """
+    with open(f"{path}.lock", "a+b") as lock:
+        if is_windows():
+            import msvcrt
+
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
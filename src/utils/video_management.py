@@ -1,10 +1,213 @@
+import glob
 import os
+import threading
 import time
+from collections import deque
 from pathlib import Path
 
-import ffmpeg
-
+from utils.custom_exceptions import UnsupportedStreamError
+from utils.flv import (
+    TAG_SCRIPT,
+    FlvParser,
+    flv_header,
+    is_sequence_header,
+    serialize_tag,
+)
+from utils.fmp4 import Fmp4Muxer, mp4_duration
 from utils.logger_manager import logger
+from utils.metrics import REGISTRY
+
+CONVERSIONS = REGISTRY.counter(
+    "video_conversions_total",
+    "Recordings converted to MP4, by method and result.",
+    ("method", "result"),
+)
+CONVERSION_TIME = REGISTRY.histogram(
+    "video_conversion_seconds",
+    "Time spent converting a recording to MP4, by method.",
+    ("method",),
+)
+
+
+class LiveRemuxer:
+    """
+    File-like sink that pipes the stream (FLV, or MPEG-TS with
+    `input_format="mpegts"`) into a long-running ffmpeg, which writes a
+    fragmented MP4 while the live is being recorded.
+    The file is playable as soon as the stream ends: there is no second
+    pass over the recording and no intermediate FLV file.
+    """
+
+    def __init__(self, output_file, bitrate=None, input_format="flv"):
+        # imported when needed, to keep it out of the start of the program
+        import ffmpeg
+
+        self.output_file = output_file
+
+        output_args = {
+            "c": "copy",
+            "f": "mp4",
+            "movflags": "+frag_keyframe+empty_moov+default_base_moof",
+        }
+        if bitrate:
+            output_args["b:v"] = bitrate
+            del output_args["c"]
+            output_args["c:v"] = "libx264"
+            output_args["c:a"] = "copy"
+
+        self.process = (
+            ffmpeg.input("pipe:0", f=input_format)
+            .output(output_file, **output_args)
+            .global_args("-loglevel", "error")
+            .overwrite_output()
+            .run_async(pipe_stdin=True, pipe_stderr=True)
+        )
+
+        # keep the tail of stderr, and never let a full pipe block ffmpeg
+        self._stderr = deque(maxlen=20)
+        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def fileno(self) -> int:
+        return self.process.stdin.fileno()
+
+    def write(self, data) -> None:
+        self.process.stdin.write(data)
+
+    def flush(self) -> None:
+        try:
+            self.process.stdin.flush()
+        except OSError:
+            pass  # ffmpeg exited, reported by close()
+
+    def close(self) -> bool:
+        """
+        Ends the stream and waits for ffmpeg to finalize the file.
+        """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+        self.process.wait()
+        self._stderr_thread.join()
+
+        if self.process.returncode != 0:
+            stderr = b"".join(self._stderr).decode(errors="replace")
+            logger.error(f"ffmpeg remux failed: {stderr}")
+            return False
+
+        return True
+
+    def _read_stderr(self) -> None:
+        for line in self.process.stderr:
+            self._stderr.append(line)
+
+
+class NativeRemuxer:
+    """
+    File-like sink that remuxes the FLV stream to a fragmented MP4 in
+    process, without spawning ffmpeg.
+
+    Only H.264/AAC can be copied. For anything else the stream is written
+    unchanged to `flv_file`, which is left to ffmpeg once the live ends.
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.flv_file = None
+
+        self._file = open(output_file, "wb")
+        self._parser = FlvParser()
+        self._muxer = None
+        self._prefix = bytearray()  # data received before the init segment
+        self._metadata = None
+        self._configs = {}  # tag type -> sequence header tag, for a fallback
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, data) -> None:
+        if self.flv_file is not None:
+            self._file.write(data)
+            return
+
+        if self._muxer is None or not self._muxer.started:
+            self._prefix += data
+        elif self._prefix:
+            self._prefix = bytearray()
+
+        try:
+            tags = self._parser.feed(data)
+        except UnsupportedStreamError as ex:
+            # nothing was consumed: the parser kept the data from the last tag
+            self._fall_back(ex, [])
+            return
+
+        if self._muxer is None and self._parser.header_parsed:
+            self._muxer = Fmp4Muxer(self._file, has_video=self._parser.has_video)
+        for index, tag in enumerate(tags):
+            try:
+                self._muxer.add_tag(tag)
+            except UnsupportedStreamError as ex:
+                self._fall_back(ex, tags[index:])
+                return
+
+            if tag.type == TAG_SCRIPT:
+                self._metadata = tag
+            elif is_sequence_header(tag):
+                self._configs[tag.type] = tag
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+
+        if self.flv_file is None and self._muxer is not None:
+            self._muxer.close()
+        self._file.close()
+
+    def _fall_back(self, error, tags) -> None:
+        """
+        Writes the rest of the stream unchanged to `flv_file`: `tags`, the
+        tags not remuxed, then the data the parser did not consume yet.
+        """
+        if self._muxer is not None and self._muxer.started:
+            # keep what was remuxed, the rest goes to a standalone FLV file
+            self._muxer.close()
+            self._file.close()
+            self.flv_file = self.output_file.removesuffix(".mp4") + "_2_flv.mp4"
+            timestamp = tags[0].timestamp if tags else 0
+            parts = [flv_header(self._parser.has_audio, self._parser.has_video)]
+            for tag in (self._metadata, *self._configs.values()):
+                if tag is not None:
+                    parts.append(serialize_tag(tag, timestamp))
+            parts.extend(serialize_tag(tag) for tag in tags)
+            parts.append(bytes(self._parser._buffer))
+            data = b"".join(parts)
+        else:
+            # everything received so far, header included
+            self._file.close()
+            os.remove(self.output_file)
+            self.flv_file = self.output_file.removesuffix(".mp4") + "_flv.mp4"
+            data = bytes(self._prefix)
+
+        logger.warning(f"{error}, recording the FLV stream for ffmpeg instead.")
+        self._prefix = bytearray()
+        self._parser._buffer.clear()
+        self._file = open(self.flv_file, "wb")
+        self._file.write(data)
 
 
 class VideoManagement:
@@ -23,9 +226,10 @@ class VideoManagement:
         return False
 
     @staticmethod
-    def convert_flv_to_mp4(file, bitrate=None):
+    def convert_flv_to_mp4(file, bitrate=None) -> str | None:
         """
-        Convert the video from flv format to mp4 format
+        Convert the video from flv format to mp4 format.
+        Returns the MP4 file, None if the conversion failed.
         """
         logger.info("Converting {} to MP4 format...".format(file))
 
@@ -33,28 +237,114 @@ class VideoManagement:
             logger.error(
                 f"File {file} is still locked after waiting. Skipping conversion."
             )
-            return
+            return None
 
-        try:
-            output_args = {
-                "c": "copy",
-                "y": "-y",
-            }
-            output_file = file.replace("_flv.mp4", ".mp4")
+        output_file = file.replace("_flv.mp4", ".mp4")
 
-            if bitrate:
-                output_args["b:v"] = bitrate
-                del output_args["c"]
-                output_args["c:v"] = "libx264"
-                output_args["c:a"] = "copy"
+        # a plain copy does not need an ffmpeg process
+        start = time.perf_counter()
+        if not bitrate and VideoManagement.remux_flv_to_mp4(file, output_file):
+            CONVERSIONS.inc(method="native", result="ok")
+            CONVERSION_TIME.observe(time.perf_counter() - start, method="native")
+        else:
+            import ffmpeg
 
-            ffmpeg.input(file).output(output_file, **output_args).run(quiet=True)
+            start = time.perf_counter()
+            try:
+                output_args = {
+                    "c": "copy",
+                    "y": "-y",
+                }
 
-        except ffmpeg.Error as e:
-            logger.error(
-                f"ffmpeg conversion failed: {e.stderr.decode() if hasattr(e, 'stderr') else str(e)}"
-            )
-            return
+                if bitrate:
+                    output_args["b:v"] = bitrate
+                    del output_args["c"]
+                    output_args["c:v"] = "libx264"
+                    output_args["c:a"] = "copy"
+
+                ffmpeg.input(file).output(output_file, **output_args).run(quiet=True)
+
+            except ffmpeg.Error as e:
+                CONVERSIONS.inc(method="ffmpeg", result="error")
+                logger.error(
+                    f"ffmpeg conversion failed: {e.stderr.decode() if hasattr(e, 'stderr') else str(e)}"
+                )
+                return None
+
+            CONVERSIONS.inc(method="ffmpeg", result="ok")
+            CONVERSION_TIME.observe(time.perf_counter() - start, method="ffmpeg")
 
         os.remove(file)
         logger.info(f"Finished converting {Path(output_file).resolve()}\n")
+        return output_file
+
+    @staticmethod
+    def remux_flv_to_mp4(file, output_file, chunk_size=1024 * 1024) -> bool:
+        """
+        Copies an H.264/AAC FLV file to a fragmented MP4 in process, reading
+        it chunk by chunk. Returns False, leaving no output, if the stream
+        cannot be copied natively.
+        """
+        parser = FlvParser()
+        muxer = None
+
+        try:
+            with open(file, "rb") as src, open(output_file, "wb") as dst:
+                while chunk := src.read(chunk_size):
+                    tags = parser.feed(chunk)
+                    if muxer is None and parser.header_parsed:
+                        muxer = Fmp4Muxer(dst, has_video=parser.has_video)
+                    for tag in tags:
+                        muxer.add_tag(tag)
+
+                if muxer is None or not muxer.started:
+                    raise UnsupportedStreamError("No media found in the FLV stream")
+                muxer.close()
+
+        except UnsupportedStreamError as ex:
+            logger.info(f"{ex}, converting with ffmpeg.")
+            os.remove(output_file)
+            return False
+
+        return True
+
+    @staticmethod
+    def split_mp4(file, max_size) -> list:
+        """
+        Splits an MP4 at keyframes into parts smaller than max_size bytes.
+        Returns the parts, an empty list if it could not be split.
+        """
+        size = os.path.getsize(file)
+        duration = mp4_duration(file)
+        if not duration:
+            logger.error(f"Unable to split {file}: unknown duration.")
+            return []
+
+        # parts end at the next keyframe: aim below the limit
+        segment_time = max(1.0, duration * max_size * 0.9 / size)
+        stem = file.removesuffix(".mp4")
+        logger.info(f"Splitting {file} into parts of {segment_time:.0f} seconds...")
+
+        import ffmpeg
+
+        try:
+            ffmpeg.input(file).output(
+                f"{stem}_split%03d.mp4",
+                c="copy",
+                map=0,
+                f="segment",
+                segment_time=segment_time,
+                reset_timestamps=1,
+            ).overwrite_output().run(quiet=True)
+        except ffmpeg.Error as e:
+            logger.error(f"ffmpeg split failed: {e.stderr.decode()}")
+            return []
+
+        parts = sorted(glob.glob(f"{glob.escape(stem)}_split[0-9][0-9][0-9].mp4"))
+        if any(os.path.getsize(part) > max_size for part in parts):
+            logger.error(f"Unable to split {file} below {max_size} bytes.")
+            for part in parts:
+                os.remove(part)
+            return []
+
+        return parts